@@ -13,12 +13,11 @@
 # In[1]:
 
 
-import numpy as np
-import pandas as pd
 import sys
 import os
 import datetime
 import configparser #added on 13-10-2020 to ensure defaults/constants are read from config file instead of hardcoding. Easier to customize
+import profiler #--profile stage timers
 
 
 # ## How to define Risk?
@@ -44,6 +43,9 @@ ORBConfig = config['ORBScanner']
 RISK = ORBConfig.getint('risk') #defining max risk per trade. If running as script, allow a commandline input/config file to set this
 NUM_BUY_STOCKS = ORBConfig.getint('numoflongstocks') #DEFAULT MAX STOCKS TO BUY
 NUM_SELL_STOCKS = ORBConfig.getint('numofshortstocks') #DEFAULT MAX STOCKS TO SHORT
+LOWER_PRICE_LIMIT = ORBConfig.getfloat('lowerPriceLimit', 30) #Stocks with OPEN price outside this band have liquidity/slippage issues
+UPPER_PRICE_LIMIT = ORBConfig.getfloat('upperPriceLimit', 3000)
+MIN_RANGE_PERCENT = ORBConfig.getfloat('minRangePercent', 0) #Range high (low) at least this % above (below) PREV CLOSE
 
 
 # ## Stock Selection
@@ -81,6 +83,31 @@ today = datetime.date.today().strftime('%d-%b-%Y')
 FILE_NAME = FOLDER_NAME + PREFIX_CSV + today + '.csv' #csv filename. This should ideally be commandline input for script
 
 # print('# debug sys.argv',sys.argv)
+
+#-h or --help prints the usage before anything is loaded or asked for
+if len(sys.argv) > 1 and sys.argv[1] in ('-h', '--help'):
+	print('''usage: NSE-ORB.py [FILE | D | W] [NUM_LONG] [NUM_SHORT] [RISK] [--profile[=REPORT]]
+
+Opening range breakout scan of an NSE market watch CSV snapshot in {0}
+
+  FILE       market watch CSV file name in the scanner folder. Default is {1}
+  D          the default file name, to give the other arguments
+  W          watch mode: re-scan every new snapshot in the scanner folder
+  NUM_LONG   number of ORB long stocks (and short stocks if NUM_SHORT is not given). Default is {2}
+  NUM_SHORT  number of ORB short stocks. Default is {3}
+  RISK       risk per trade. Default is {4}
+  --profile  report the time, rows and memory of each stage as JSON (to REPORT if given)'''.format(
+		FOLDER_NAME, PREFIX_CSV + today + '.csv', NUM_BUY_STOCKS, NUM_SELL_STOCKS, RISK))
+	sys.exit()
+
+import orbScanner #scanning and position size calculation. Importable so that it can be reused without running this script
+
+#--profile (or --profile=FILE) anywhere in the arguments reports the time, rows and memory of each stage as JSON
+for arg in sys.argv[1:]:
+	if arg == '--profile' or arg.startswith('--profile='):
+		sys.argv.remove(arg)
+		profiler.enable(arg.partition('=')[2] or None)
+		break
  
 if len(sys.argv) > 1: # filename provided as CLI argument
 	if sys.argv[1].upper() != 'D': #if D then take default filename but include additional arguments as CLI.
@@ -93,6 +120,12 @@ if len(sys.argv) > 3: #number of stocks to sell given as separate value from num
 if len(sys.argv) > 4:
 	RISK = int(sys.argv[4])
 
+#Watch mode: W as first argument keeps re-scanning new snapshots in the scanner folder. Added to avoid re-running the script on every refresh
+if len(sys.argv) > 1 and sys.argv[1].upper() == 'W':
+	orbScanner.watchSnapshots(FOLDER_NAME, PREFIX_CSV, RISK, NUM_BUY_STOCKS, NUM_SELL_STOCKS, ORBConfig.getint('pollinterval', 5),
+		LOWER_PRICE_LIMIT, UPPER_PRICE_LIMIT, MIN_RANGE_PERCENT)
+	sys.exit()
+
 #Sanity Check for CSV File name
 while True:
 	if not os.path.exists(FILE_NAME):
@@ -108,232 +141,33 @@ while True:
 # In[4]:
 
 
-#We need to use thousands=',' parameter as CSV columns have number with comma. Else pandas will treat float numbers as object
-df = pd.read_csv(FILE_NAME,thousands=',')
-
-
-# In[5]:
-
-
-#Rename columns to keep it cleaning. Column names from NSE website has \n and other characters. keeping it simple
-df.columns = ['SYMBOL','OPEN', 'HIGH', 'LOW', 'PREV CLOSE', 'LTP', 'CHNG',
-       '%CHNG', 'VOLUME', 'VALUE', '52W H', '52W L',
-       '365 D', '30 D']
-
-
-# In[6]:
-
-
-#unwanted columns to drop. We don't need these to for either scanning candidate stocks or calculating position size
-cols_to_drop = ['CHNG',
-       'VOLUME', 'VALUE', '52W H', '52W L',
-       '365 D', '30 D','LTP','%CHNG']
-
-
-# In[7]:
-
-
-df.head()
-
-
-# In[8]:
-
-
-df.drop(columns=cols_to_drop,inplace=True)
-
-
-# In[9]:
-
-
-df.head()
-
-
-# In[10]:
-
-
-df.set_index('SYMBOL',inplace=True) #set stock symbol as index
-
-
-# In[11]:
-
-
-df.head()
-
-
-# In[12]:
-
-
-#drop stocks with open price < 30 or > 3000. These stocks have liquidity/slippage issues
-df_todrop = df[(df['OPEN'] > 3000) | (df['OPEN'] < 30)]
-
-
-# In[13]:
-
-
-print('Dropping {} stocks with OPEN price > 3000 or < 30 '.format(len(df_todrop)))
-# print(df_todrop['OPEN'])
-
-
-# In[14]:
-
-
-df.drop(df_todrop.index,inplace = True)
-
-#SANITY CHECK. To drop any stocks where high == Low to avoid infinity position size.
-#Bug fix done on 12-10-2020
-if len(df[df['HIGH']==df['LOW']]) > 0:
-    bad_df = df[ df['HIGH'] == df['LOW'] ]
-    print ('ALERT: {} stock/stocks with HIGH = LOW'.format(len(bad_df)))
-    print( bad_df )
-    for stock in bad_df.index:
-        print('Dropping {} from today\'s list'.format(stock))
-    df.drop(bad_df.index, inplace = True)
-
-
-
-# In[15]:
-
-
-#calculate gap up/down open percentage and set a new column to store these values
-df['%GAP'] = round((df['OPEN'] - df['PREV CLOSE']) / df['PREV CLOSE'] * 100,2)
-
-
-# In[16]:
-
-
-df.head()
-
-
-# In[17]:
-
-
-print('Number of stocks Gapped Up Open for the day: {}'.format(len(df[df['%GAP'] >0])))
-print('Number of stocks Gapped Down Open for the day: {}'.format(len(df[df['%GAP'] <0])))
-
-
-# For stocks that have **gapped-up**, calculate the price difference between our timeframe's **Range High** and **Previous Day Close** price as percentage change with respect to Previous Day Close price.
-
-# In[18]:
-
-
-#Finding range high price difference (in percentage) from previous day close price for gap-up stocks only
-df.loc[df['%GAP'] > 0,'%RANGE HIGH GP'] = round(( df['HIGH'] - df['PREV CLOSE'] ) / df['PREV CLOSE'] * 100,2)
-
-
-# In[19]:
-
-
-df.head()
-
-
-# For stocks that have **gapped-down**, calculate the price difference between our timeframe's **Range Low** and **Previous Day Close** price as percentage change with respect to Previous Day Close price.
-
-# In[20]:
-
-
-#Finding range low price difference (in percentage) from previous day close price for gap-down stocks only
-df.loc[df['%GAP'] < 0,'%RANGE LOW GD'] = round(( df['PREV CLOSE'] - df['LOW'] ) / df['PREV CLOSE'] * 100,2)
-
-
-# In[21]:
-
-
-df.head()
-
-
-# In[22]:
-
-
-df[ (df['%GAP'] > 0) & (df['%RANGE HIGH GP'] > 1) ] #gapup stocks with range high > 1% from prev close
-
-
-# In[23]:
-
-
-df[ ( df['%GAP'] < 0 ) & (df['%RANGE LOW GD'] > 1 ) ] #gapdown stocks with prev close > 1% from range low
-
-
-# In[24]:
-
-
-df.loc[df['%GAP'] < 0,'%GAP'] = abs(df['%GAP']) #Coverting GAP down to abslute value for sorting and selecting top 5 stocks
+#Load the market watch CSV. Column names from NSE website are renamed and unwanted columns dropped (see orbScanner.loadMarketWatch)
+with profiler.stage('read market watch'):
+	df = orbScanner.loadMarketWatch(FILE_NAME)
+	profiler.rows(len(df))
 
 
 # ### Position Size Calculation
+# * Drop stocks with OPEN price > 3000 or < 30. These stocks have liquidity/slippage issues.
+# * For stocks that have **gapped-up**, calculate the price difference between our timeframe's **Range High** and **Previous Day Close** price as percentage change with respect to Previous Day Close price.
+# * For stocks that have **gapped-down**, calculate the price difference between our timeframe's **Range Low** and **Previous Day Close** price as percentage change with respect to Previous Day Close price.
 # * Get the top 5 gap up stocks with respect today's range High.
 # * Get the top 5 gap down stocks with respect today's range Low.
 # * Calculate the Position size for these 10 stocks.
 # * **Position size = Max Risk amount in a trade / Range**
 # > RISK set by us individually. Range is **High - LOW**
 
-# In[25]:
-
-
-#find top 5(default) gapup stocks with respect to range high - prev close price change and calculate position size
-df.loc[df.nlargest(NUM_BUY_STOCKS,['%RANGE HIGH GP','%GAP']).index ,'PSIZE']= round((RISK / (df['HIGH'] - df['LOW'])))
-
-
-# In[26]:
-
-
-#find top 5(default) gapdown stocks with respect to prev close - range low price change and calculate position size
-df.loc[df.nlargest(NUM_SELL_STOCKS,['%RANGE LOW GD','%GAP']).index,'PSIZE'] = round((RISK / (df['HIGH'] - df['LOW'])))
-
-
-# Drop all the other stocks except for these 10 stocks.
-
-# In[27]:
-
-
-df.dropna(thresh=7,inplace= True) #drop other stocks except for these 10 stocks to trade for the day
-
-
-# * Position size is calculated by default as **Float** number.
-# * Convert the column for Position size into **Integer**
-
-# In[28]:
-
-
-df['PSIZE']=df['PSIZE'].astype(int) #convert position size from float to int
-
-
-# In[29]:
-
-
-df['PSIZE']
-
-def displayStockPositionSize(s):
-	print('{0:<10}{1:>5}'.format('STOCKS','QTY'))
-	print('-'*15)
-	#print('debug: type(s)',type(s))
-	for stock in s.index:
-		name = stock
-		#print('debug:', s[stock])
-		qty = s[stock]
-		print('{0:<10}{1:>5}'.format(stock,qty))
-	return
-
+# In[5]:
 
-# In[30]:
 
-if len(df.loc[(df['PSIZE'] > 0) & df['%RANGE HIGH GP'].notna(), 'PSIZE']) > 0:
-	print('------BUY------')
-	series_buy = df.loc[(df['PSIZE'] > 0) & df['%RANGE HIGH GP'].notna(), 'PSIZE']
-	displayStockPositionSize(series_buy)
-	#print(df.loc[(df['PSIZE'] > 0) & df['%RANGE HIGH GP'].notna(), 'PSIZE'].to_frame())
-else:
-	print('No Stocks for ORB Long')
+with profiler.stage('scan'):
+	longDF, shortDF = orbScanner.scanORB(df, RISK, NUM_BUY_STOCKS, NUM_SELL_STOCKS, LOWER_PRICE_LIMIT, UPPER_PRICE_LIMIT,
+		minRangePercent=MIN_RANGE_PERCENT)
+	profiler.rows(len(df))
 
-# In[31]:
 
-if len(df.loc[(df['PSIZE'] > 0) & df['%RANGE LOW GD'].notna(), 'PSIZE']) == 0:
-	print('No Stocks for ORB SHORT Sell')
-else:
-	print('-----SELL------')
-	series_sell = df.loc[(df['PSIZE'] > 0) & df['%RANGE LOW GD'].notna(), 'PSIZE']
-	displayStockPositionSize(series_sell)
-	#print(df.loc[(df['PSIZE'] > 0) & df['%RANGE LOW GD'].notna(), 'PSIZE'].to_frame())
-# print(df.loc[(df['PSIZE'] > 0) & df['%RANGE LOW GD'].notna(),['%GAP','%RANGE LOW GD','PSIZE']])
+# In[6]:
 
 
-# In[ ]:
\ No newline at end of file
+with profiler.stage('display'):
+	orbScanner.displayCandidates(longDF, shortDF)
@@ -0,0 +1,173 @@
+"""
+Deterministic synthetic market data for the benchmarks.
+
+Generates, for a scale (see SCALES), a workspace laid out like the data folders in config.ini:
+
+    config.ini                                  copy of the repository config.ini
+    data/scanner/cmDDMMMYYYYbhav.csv            one bhavcopy per session (random walk OHLC)
+    data/scanner/MW-SECURITIES-IN-F&O-<day>.csv market watch snapshot of the last session
+    data/daily/FO.json                          F&O list of all the generated symbols
+    data/daily/orders.csv                       Kite orders of today (entry and exit fills of MIS trades)
+    data/daily/trades.csv                       trades for the brokerage calculator (buy, sell, qty, delta)
+
+The same scale and seed always give the same files. Only the orders.csv date is today, as
+kiteOrders.getOrders reads only today's orders.
+
+Usage:
+    python benchmarks/generateData.py -s small [-w /tmp/nse-benchmarks]
+"""
+import numpy as np
+import pandas as pd
+import os
+import csv
+import json
+import shutil
+import argparse
+import tempfile
+from datetime import date
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#symbols: F&O segment size up to a full exchange. sessions: 10 years at the large scale. fills: orders.csv rows
+SCALES = {
+    'small': {'symbols': 150, 'sessions': 20, 'fills': 2000},
+    'medium': {'symbols': 2000, 'sessions': 250, 'fills': 100000},
+    'large': {'symbols': 10000, 'sessions': 2500, 'fills': 1000000},
+}
+
+LAST_SESSION = '2021-03-31'
+MARKET_WATCH_PREFIX = 'MW-SECURITIES-IN-F&O-'
+
+def getWorkspace(workDir, scale):
+    '''Returns the workspace directory of a scale'''
+    return os.path.join(workDir, scale)
+
+def getSymbols(count):
+    '''Returns count symbols. Example: STK00001'''
+    return ['STK{:05d}'.format(index + 1) for index in range(count)]
+
+def getSessions(count, lastSession=LAST_SESSION):
+    '''Returns the last count weekdays up to lastSession as datetime64[D], oldest first'''
+    return np.busday_offset(lastSession, -np.arange(count)[::-1], roll='backward')
+
+def generatePrices(rng, nSymbols, nSessions):
+    '''Returns a dictionary of OPEN, HIGH, LOW, CLOSE, PREVCLOSE (symbols, sessions) arrays and TOTTRDQTY
+    of a daily random walk with gaps and shadows'''
+    start = np.exp(rng.uniform(np.log(20), np.log(5000), size=(nSymbols, 1)))
+    close = start * np.exp(np.cumsum(rng.normal(0, 0.02, size=(nSymbols, nSessions + 1)), axis=1))
+    prevClose, close = close[:, :-1], close[:, 1:]
+    open_ = prevClose * (1 + rng.normal(0, 0.005, size=close.shape))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, size=close.shape)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, size=close.shape)))
+    prices = {'OPEN': open_, 'HIGH': high, 'LOW': low, 'CLOSE': close, 'PREVCLOSE': prevClose}
+    prices = {field: np.round(values, 2) for field, values in prices.items()}
+    prices['TOTTRDQTY'] = rng.integers(1000, 5000000, size=close.shape)
+    return prices
+
+def writeBhavcopies(folderName, symbols, sessions, prices, bhavPrefix='cm', bhavSuffix='bhav'):
+    '''Writes one bhavcopy CSV per session in the NSE column layout'''
+    for index, session in enumerate(sessions.astype(object)):
+        timestamp = session.strftime('%d-%b-%Y').upper()
+        bhavDF = pd.DataFrame({'SYMBOL': symbols, 'SERIES': 'EQ',
+            'OPEN': prices['OPEN'][:, index], 'HIGH': prices['HIGH'][:, index], 'LOW': prices['LOW'][:, index],
+            'CLOSE': prices['CLOSE'][:, index], 'LAST': prices['CLOSE'][:, index], 'PREVCLOSE': prices['PREVCLOSE'][:, index],
+            'TOTTRDQTY': prices['TOTTRDQTY'][:, index],
+            'TOTTRDVAL': np.round(prices['TOTTRDQTY'][:, index] * prices['CLOSE'][:, index], 2),
+            'TIMESTAMP': timestamp, 'TOTALTRADES': prices['TOTTRDQTY'][:, index] // 50, 'ISIN': 'INE000000000', '': ''})
+        fileName = bhavPrefix + session.strftime('%d%b%Y').upper() + bhavSuffix + '.csv'
+        bhavDF.to_csv(os.path.join(folderName, fileName), index=False)
+
+def writeMarketWatch(fileName, symbols, prices):
+    '''Writes an NSE live market watch CSV of the last session. Numbers are quoted with thousands separators'''
+    with open(fileName, 'w', newline='') as csvfile:
+        csvwriter = csv.writer(csvfile, quoting=csv.QUOTE_ALL)
+        csvwriter.writerow(['SYMBOL \n', 'OPEN \n', 'HIGH \n', 'LOW \n', 'PREV. CLOSE \n', 'LTP \n', 'CHNG \n', '%CHNG \n',
+            'VOLUME \n(shares)', 'VALUE \n(Rs Crores)', '52W H \n', '52W L \n', '365 D % CHNG \n', '30 D % CHNG \n'])
+        for index, symbol in enumerate(symbols):
+            open_, high, low = prices['OPEN'][index, -1], prices['HIGH'][index, -1], prices['LOW'][index, -1]
+            prevClose, close = prices['PREVCLOSE'][index, -1], prices['CLOSE'][index, -1]
+            change = close - prevClose
+            csvwriter.writerow([symbol] + ['{:,.2f}'.format(value) for value in (open_, high, low, prevClose, close, change)]
+                + ['{:.2f}'.format(change / prevClose * 100), '{:,}'.format(int(prices['TOTTRDQTY'][index, -1])),
+                '{:.2f}'.format(close * prices['TOTTRDQTY'][index, -1] / 1e7),
+                '{:,.2f}'.format(high * 1.5), '{:,.2f}'.format(low * 0.5), '12.50', '-1.25'])
+
+def writeOrders(fileName, symbols, nFills, rng, day=None):
+    '''Writes a Kite orders.csv of day (today if None) with nFills fills: an entry and an exit fill
+    per MIS trade, entries between 09:15 and 14:00 and exits before 15:20'''
+    day = (day or date.today()).isoformat()
+    nTrades = nFills // 2
+    names = np.asarray(symbols)[rng.integers(0, len(symbols), size=nTrades)]
+    isLong = rng.random(nTrades) < 0.5
+    qty = rng.integers(1, 500, size=nTrades)
+    entryPrice = np.round(rng.uniform(30, 3000, size=nTrades), 2)
+    exitPrice = np.round(entryPrice * (1 + rng.normal(0, 0.01, size=nTrades)), 2)
+    entryTime = rng.integers(9 * 3600 + 15 * 60, 14 * 3600, size=nTrades)
+    exitTime = entryTime + rng.integers(60, 15 * 3600 + 20 * 60 - entryTime)
+    def toTime(seconds):
+        return ['{0} {1:02d}:{2:02d}:{3:02d}'.format(day, value // 3600, value // 60 % 60, value % 60) for value in seconds.tolist()]
+    ordersDF = pd.DataFrame({
+        'Time': toTime(entryTime) + toTime(exitTime),
+        'Type': np.concatenate([np.where(isLong, 'BUY', 'SELL'), np.where(isLong, 'SELL', 'BUY')]),
+        'Instrument': np.concatenate([names, names]),
+        'Product': 'MIS',
+        'Qty.': ['{0}/{0}'.format(value) for value in np.concatenate([qty, qty]).tolist()],
+        'Avg. price': np.concatenate([entryPrice, exitPrice]),
+        'Status': 'COMPLETE'})
+    ordersDF.sort_values('Time', kind='stable').to_csv(fileName, index=False)
+
+def writeTrades(fileName, nTrades, rng):
+    '''Writes a trades CSV for brokerageCalculator.py --csv with intraday, BTST and delivery trades'''
+    buy = np.round(rng.uniform(30, 3000, size=nTrades), 2)
+    tradesDF = pd.DataFrame({'buy': buy, 'sell': np.round(buy * (1 + rng.normal(0, 0.02, size=nTrades)), 2),
+        'qty': rng.integers(1, 500, size=nTrades), 'delta': rng.choice([0, 0, 0, 1, 3, 30], size=nTrades)})
+    tradesDF.to_csv(fileName, index=False)
+
+def generate(workDir, scale, seed=42, force=False):
+    '''Generates the workspace of a scale in workDir (skipped if it is already complete unless force).
+    Returns the workspace directory'''
+    sizes = SCALES[scale]
+    workspace = getWorkspace(workDir, scale)
+    marker = os.path.join(workspace, 'generated.json')
+    settings = dict(sizes, seed=seed, lastSession=LAST_SESSION)
+    if not force and os.path.exists(marker):
+        with open(marker) as markerFile:
+            if json.load(markerFile) == settings:
+                return workspace
+    if os.path.exists(workspace):
+        shutil.rmtree(workspace)
+    scannerDir = os.path.join(workspace, 'data', 'scanner')
+    dailyDir = os.path.join(workspace, 'data', 'daily')
+    os.makedirs(scannerDir)
+    os.makedirs(dailyDir)
+    shutil.copy(os.path.join(REPO_DIR, 'config.ini'), os.path.join(workspace, 'config.ini'))
+
+    rng = np.random.default_rng(seed)
+    symbols = getSymbols(sizes['symbols'])
+    sessions = getSessions(sizes['sessions'])
+    print('Generating {0} bhavcopies of {1} symbols in {2}'.format(len(sessions), len(symbols), workspace))
+    prices = generatePrices(rng, len(symbols), len(sessions))
+    writeBhavcopies(scannerDir, symbols, sessions, prices)
+    lastDay = sessions[-1].astype(object).strftime('%d-%b-%Y')
+    writeMarketWatch(os.path.join(scannerDir, MARKET_WATCH_PREFIX + lastDay + '.csv'), symbols, prices)
+    with open(os.path.join(dailyDir, 'FO.json'), 'w') as jsonfile:
+        json.dump({symbol: 1 for symbol in symbols}, jsonfile)
+    print('Generating {} Kite order fills'.format(sizes['fills']))
+    writeOrders(os.path.join(dailyDir, 'orders.csv'), symbols, sizes['fills'], rng)
+    writeTrades(os.path.join(dailyDir, 'trades.csv'), sizes['fills'] // 2, rng)
+    with open(marker, 'w') as markerFile:
+        json.dump(settings, markerFile)
+    return workspace
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic market data for the benchmarks')
+    parser.add_argument('-s', '--scale', choices=list(SCALES), default='small', help='Data size. Default is %(default)s')
+    parser.add_argument('-w', '--workdir', default=os.path.join(tempfile.gettempdir(), 'nse-benchmarks'),
+        help='Folder for the generated workspaces. Default is %(default)s')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed. Default is %(default)s')
+    parser.add_argument('-f', '--force', action='store_true', default=False, help='Regenerate even if the workspace exists')
+    args = parser.parse_args()
+    print('Workspace:', generate(args.workdir, args.scale, args.seed, args.force))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""
+Benchmark suite for the scanners, the Kite orders journal and the brokerage calculator.
+
+Each stage runs in its own Python process inside a generated workspace (see generateData.py),
+so its peak memory (peak resident set size, reset after the stage setup) is not inflated by the
+stages before it. Every run is appended as JSON lines to a results file with the git commit, so
+runs of different commits can be compared with --compare.
+
+Stages:
+    marketwatch-load    orbScanner.loadMarketWatch of the market watch CSV (not cached)
+    marketwatch-cached  orbScanner.loadMarketWatch of the market watch CSV from the parsed cache
+    orb-scan            NSE-ORB.py: load and orbScanner.scanORB
+    bhav-import         bhavStore.importFolder of every bhavcopy CSV into an empty store
+    candles-day         candlePatterns.scanPatterns of the last session (nseCandlestickScanner single day)
+    candles-range       nseCandlestickScanner.scanDateRange of every session
+    candles-weekly      ohlcPanel.getTimeframePanel of weekly candles with an empty cache
+    live-ticks          liveTicks.processTicks of 2 simulated minutes of ticks (5 per stock per second)
+    kite-orders         kiteOrders.getOrders of orders.csv
+    brokerage-batch     brokerageCalculator.readTradesCSV and getChargesBatch of trades.csv
+
+Usage:
+    python benchmarks/runBenchmarks.py -s small [-o benchmarks/results.jsonl] [--compare OLD.jsonl]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+import generateData
+import profiler
+
+def getBhavFiles():
+    '''Returns the sessions (dates) and bhavcopy paths of the workspace, oldest first'''
+    files = [fname for fname in os.listdir('data/scanner/') if fname.startswith('cm') and fname.endswith('bhav.csv')]
+    days = sorted((datetime.strptime(fname[2:11], '%d%b%Y').date(), fname) for fname in files)
+    return [day for day, fname in days], ['data/scanner/' + fname for day, fname in days]
+
+def getMarketWatchFile():
+    return os.path.join('data/scanner/', [fname for fname in os.listdir('data/scanner/')
+        if fname.startswith(generateData.MARKET_WATCH_PREFIX)][0])
+
+def prepareStore():
+    '''Imports the bhavcopies into the workspace store if a previous stage has not'''
+    import bhavStore
+    if len(bhavStore.listDays('data/store/')) < 1:
+        bhavStore.importFolder('data/store/', 'data/scanner/')
+
+#each stage has a setup (not measured) and a run returning the number of rows processed
+def setupMarketWatch():
+    import marketWatch
+    shutil.rmtree(os.path.join('data/scanner/', marketWatch.CACHE_FOLDER), ignore_errors=True)
+    return getMarketWatchFile()
+
+def setupMarketWatchCached():
+    import marketWatch
+    fileName = getMarketWatchFile()
+    marketWatch.loadMarketWatch(fileName)
+    marketWatch.MEMORY_CACHE.clear()
+    return fileName
+
+def runMarketWatch(fileName):
+    import orbScanner
+    return len(orbScanner.loadMarketWatch(fileName))
+
+def runORBScan(fileName):
+    import orbScanner
+    df = orbScanner.loadMarketWatch(fileName)
+    orbScanner.scanORB(df, 100, 5, 5, verbose=False)
+    return len(df)
+
+def setupBhavImport():
+    shutil.rmtree('data/store/', ignore_errors=True)
+    return None
+
+def runBhavImport(context):
+    import bhavStore
+    return len(bhavStore.importFolder('data/store/', 'data/scanner/'))
+
+def setupCandlesDay():
+    prepareStore()
+    import bhavStore
+    return bhavStore.listDays('data/store/')[-2:]
+
+def runCandlesDay(days):
+    import bhavStore
+    import candlePatterns
+    prevDay, day = days
+    df = bhavStore.readBhavDay('data/store/', day, fields=['OPEN','HIGH','LOW','CLOSE','PREVCLOSE'])
+    prevDF = bhavStore.readBhavDay('data/store/', prevDay, fields=['OPEN','HIGH','LOW'])
+    df['PREVOPEN'], df['PREVHIGH'], df['PREVLOW'] = prevDF['OPEN'], prevDF['HIGH'], prevDF['LOW']
+    candlePatterns.scanPatterns(df, candlePatterns.getPatterns(sides=('BULLISH','BEARISH'), maxBars=2))
+    return len(df)
+
+def setupCandlesRange():
+    prepareStore()
+    return getBhavFiles()
+
+def runCandlesRange(context):
+    import candlePatterns
+    import nseCandlestickScanner
+    days, bhavFiles = context
+    matrix = nseCandlestickScanner.scanDateRange(days, bhavFiles, 'data/store/',
+        patterns=candlePatterns.getPatterns(sides=('BULLISH','BEARISH')), lookback=2, workers=1)
+    return len(matrix)
+
+def setupCandlesWeekly():
+    prepareStore()
+    shutil.rmtree('data/store/W', ignore_errors=True)
+    import bhavStore
+    days = bhavStore.listDays('data/store/')
+    return days[0], days[-1]
+
+def runCandlesWeekly(context):
+    import ohlcPanel
+    panel = ohlcPanel.getTimeframePanel('data/store/', context[0], context[1], 'W')
+    return panel['data'].shape[0] * panel['data'].shape[1]
+
+def setupLiveTicks():
+    import liveTicks
+    import orbScanner
+    prevClose = orbScanner.loadMarketWatch(getMarketWatchFile())['PREV CLOSE']
+    start = datetime(2021, 3, 31, 9, 15, tzinfo=timezone.utc).timestamp()
+    engine = liveTicks.newEngine(prevClose, 100, 5, 5, rangeWindow=1, timezone='UTC')
+    return engine, list(liveTicks.simulateTicks(prevClose, start, 2, 5 * len(prevClose), seed=1))
+
+def runLiveTicks(context):
+    import liveTicks
+    engine, batches = context
+    for ticks in batches:
+        liveTicks.processTicks(engine, ticks)
+    return engine['ticks']
+
+def setupKiteOrders():
+    return None
+
+def runKiteOrders(context):
+    import kiteOrders
+    return len(kiteOrders.getOrders())
+
+def setupBrokerage():
+    return 'data/daily/trades.csv'
+
+def runBrokerage(fileName):
+    import brokerageCalculator
+    trades, rows = brokerageCalculator.readTradesCSV(fileName)
+    brokerageCalculator.getChargesBatch(trades['buy'], trades['sell'], trades['qty'], trades['delta'])
+    return len(rows)
+
+STAGES = {
+    'marketwatch-load': (setupMarketWatch, runMarketWatch),
+    'marketwatch-cached': (setupMarketWatchCached, runMarketWatch),
+    'orb-scan': (setupMarketWatch, runORBScan),
+    'bhav-import': (setupBhavImport, runBhavImport),
+    'candles-day': (setupCandlesDay, runCandlesDay),
+    'candles-range': (setupCandlesRange, runCandlesRange),
+    'candles-weekly': (setupCandlesWeekly, runCandlesWeekly),
+    'live-ticks': (setupLiveTicks, runLiveTicks),
+    'kite-orders': (setupKiteOrders, runKiteOrders),
+    'brokerage-batch': (setupBrokerage, runBrokerage),
+}
+
+def runStage(stage, workspace):
+    '''Runs one stage in this process (called in the child process). Returns the measurement'''
+    os.chdir(workspace)
+    setup, run = STAGES[stage]
+    context = setup()
+    profiler.resetPeakRSS()
+    baseline = profiler.getPeakRSS()
+    start = time.perf_counter()
+    rows = run(context)
+    seconds = time.perf_counter() - start
+    return {'stage': stage, 'seconds': round(seconds, 4), 'rows': rows, 'peakMB': profiler.getPeakRSS(), 'baselineMB': baseline}
+
+def measureStage(stage, workspace, repeat=1):
+    '''Runs a stage repeat times, each in a fresh process. Returns the fastest run'''
+    best = None
+    for count in range(repeat):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--stage', stage, '-w', workspace],
+            capture_output=True, text=True)
+        lines = [line for line in output.stdout.splitlines() if line.startswith('{')]
+        if output.returncode != 0 or len(lines) < 1:
+            print('Stage {0} failed:\n{1}'.format(stage, output.stderr.strip()))
+            return None
+        result = json.loads(lines[-1])
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+def getCommit():
+    '''Returns the short git commit of the repository (with + if there are local changes), or None'''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+    return commit + ('+' if dirty else '') if commit else None
+
+def loadResults(fileName):
+    '''Returns the last result of each (scale, stage) in a results file'''
+    results = {}
+    with open(fileName) as resultsFile:
+        for line in resultsFile:
+            if line.strip():
+                result = json.loads(line)
+                results[(result['scale'], result['stage'])] = result
+    return results
+
+def displayResults(results, baseline=None):
+    print('{0:<18}{1:>10}{2:>12}{3:>10}{4:>12}'.format('STAGE', 'ROWS', 'SECONDS', 'PEAK MB', 'VS BASE'))
+    print('-' * 62)
+    for result in results:
+        change = ''
+        old = baseline.get((result['scale'], result['stage'])) if baseline else None
+        if old and old['seconds'] > 0:
+            change = '{:+.1f}%'.format((result['seconds'] - old['seconds']) / old['seconds'] * 100)
+        peak = '-' if result['peakMB'] is None else '{:.1f}'.format(result['peakMB'])
+        print('{0:<18}{1:>10}{2:>12.3f}{3:>10}{4:>12}'.format(result['stage'], result['rows'], result['seconds'], peak, change))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scanners, orders journal and brokerage calculator')
+    parser.add_argument('-s', '--scale', choices=list(generateData.SCALES), default='small', help='Data size. Default is %(default)s')
+    parser.add_argument('-w', '--workdir', default=os.path.join(tempfile.gettempdir(), 'nse-benchmarks'),
+        help='Folder for the generated workspaces. Default is %(default)s')
+    parser.add_argument('-t', '--stages', default=','.join(STAGES), help='Comma separated stages to run. Default is all')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='Runs per stage. The fastest is kept. Default is %(default)s')
+    parser.add_argument('-o', '--output', default=os.path.join(BENCHMARK_DIR, 'results.jsonl'),
+        help='Append the results to this JSON lines file. Default is %(default)s')
+    parser.add_argument('--compare', default=None, metavar='FILE', help='Show the change in time against the results in FILE')
+    parser.add_argument('--stage', default=None, help=argparse.SUPPRESS) #run one stage in this process
+    args = parser.parse_args()
+
+    if args.stage:
+        print(json.dumps(runStage(args.stage, args.workdir)))
+        return
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    for stage in stages:
+        if stage not in STAGES:
+            print('Unknown stage {0}. Stages: {1}'.format(stage, ', '.join(STAGES)))
+            return
+    workspace = generateData.generate(args.workdir, args.scale)
+    baseline = loadResults(args.compare) if args.compare else None
+    run = {'commit': getCommit(), 'time': datetime.now().isoformat(timespec='seconds'), 'scale': args.scale,
+        'python': platform.python_version(), 'machine': platform.machine()}
+    results = []
+    for stage in stages:
+        print('Running', stage)
+        result = measureStage(stage, workspace, args.repeat)
+        if result is not None:
+            results.append(dict(run, **result))
+    print()
+    displayResults(results, baseline)
+    if args.output and len(results) > 0:
+        with open(args.output, 'a') as resultsFile:
+            for result in results:
+                resultsFile.write(json.dumps(result) + '\n')
+        print('Results appended to', args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Checks of the concurrent bhavcopy downloader (getMarketData.py) against a local http.server
+stand-in for the NSE archive, so no request leaves the machine.
+
+The stand-in serves generated bhavcopy zips (see generateData.py) at the archive paths
+{YYYY}/{MMM}/cm{DD}{MMM}{YYYY}bhav.csv.zip. It answers 503 to the first request of a flaky day
+and 404 to every request of a missing day, and counts the requests of every path.
+
+Checked:
+    a 503 is retried and the bhavcopy is then written
+    a 404 fails at once, without retries, and the day is reported as failed
+    the zips are parsed straight into the bhavcopy store partitions, nothing else is written
+    only the sessions of the trading calendar are requested, so holidays are not failures
+
+Usage:
+    python benchmarks/testMarketData.py [-v]
+"""
+import os
+import io
+import sys
+import shutil
+import zipfile
+import tempfile
+import threading
+import unittest
+import numpy as np
+from datetime import date
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+import generateData
+import getMarketData
+import bhavStore
+import tradingCalendar
+
+SESSIONS = generateData.getSessions(5, '2021-03-12') #08-Mar-2021 to 12-Mar-2021
+HOLIDAY = date(2021, 3, 11) #not served. Only the calendar keeps it from being requested
+FLAKY = date(2021, 3, 9) #503 on the first request
+MISSING = date(2021, 3, 10) #404 on every request
+
+def getArchivePath(day):
+    '''Returns the path of the bhavcopy zip of day on the archive'''
+    return '/{0}/{1}/cm{2}bhav.csv.zip'.format(day.year, day.strftime('%b').upper(), day.strftime('%d%b%Y').upper())
+
+def getArchive(folderName):
+    '''Generates the bhavcopies of SESSIONS into folderName. Returns the zip content of each
+    archive path (except the missing day and the holiday) and the CSV file of each day'''
+    os.makedirs(folderName)
+    generateData.writeBhavcopies(folderName, generateData.getSymbols(20), SESSIONS,
+        generateData.generatePrices(np.random.default_rng(7), 20, len(SESSIONS)))
+    archive = {}
+    bhavFiles = {}
+    for day in SESSIONS.astype(object):
+        fileName = 'cm' + day.strftime('%d%b%Y').upper() + 'bhav.csv'
+        bhavFiles[day] = os.path.join(folderName, fileName)
+        if day in (MISSING, HOLIDAY):
+            continue
+        content = io.BytesIO()
+        with zipfile.ZipFile(content, 'w') as zfile:
+            zfile.write(bhavFiles[day], fileName)
+        archive[getArchivePath(day)] = content.getvalue()
+    return archive, bhavFiles
+
+def getHandler(archive, requests, failOnce):
+    '''Returns the request handler class of the archive stand-in'''
+    lock = threading.Lock()
+    class ArchiveHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                requests[self.path] = requests.get(self.path, 0) + 1
+                count = requests[self.path]
+            if self.path in failOnce and count == 1:
+                status, body = 503, b''
+            elif self.path in archive:
+                status, body = 200, archive[self.path]
+            else:
+                status, body = 404, b''
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    return ArchiveHandler
+
+class MarketDataTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.workDir = tempfile.mkdtemp(prefix='nse-marketdata-')
+        cls.archive, cls.bhavFiles = getArchive(os.path.join(cls.workDir, 'source'))
+        cls.requests = {}
+        cls.server = HTTPServer(('127.0.0.1', 0), getHandler(cls.archive, cls.requests, {getArchivePath(FLAKY)}))
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.baseURL = 'http://127.0.0.1:{}/'.format(cls.server.server_address[1])
+        cls.calendar = tradingCalendar.buildCalendar('2021-01-01', '2021-12-31', [HOLIDAY])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.workDir)
+
+    def setUp(self):
+        self.requests.clear()
+
+    def fetch(self, **kwargs):
+        return getMarketData.fetchBhavcopyRange(SESSIONS[0].astype(object), SESSIONS[-1].astype(object), self.calendar,
+            baseURL=self.baseURL, workers=2, retries=2, backoff=0.01, **kwargs)
+
+    def testFolderDownload(self):
+        folderName = os.path.join(self.workDir, 'scanner')
+        failed = self.fetch(folderName=folderName)
+        self.assertEqual(failed, [MISSING])
+        self.assertEqual(self.requests[getArchivePath(FLAKY)], 2) #503 retried once
+        self.assertEqual(self.requests[getArchivePath(MISSING)], 1) #404 not retried
+        self.assertNotIn(getArchivePath(HOLIDAY), self.requests)
+        for day, bhavFile in self.bhavFiles.items():
+            fileName = os.path.join(folderName, os.path.basename(bhavFile))
+            if day in (MISSING, HOLIDAY):
+                self.assertFalse(os.path.exists(fileName))
+                continue
+            with open(bhavFile, 'rb') as expected, open(fileName, 'rb') as written:
+                self.assertEqual(expected.read(), written.read())
+        self.assertEqual(sorted(os.listdir(folderName)), sorted(os.path.basename(self.bhavFiles[day])
+            for day in self.bhavFiles if day not in (MISSING, HOLIDAY)))
+
+    def testStoreDownload(self):
+        folderName = os.path.join(self.workDir, 'unused')
+        storeDir = os.path.join(self.workDir, 'store')
+        failed = self.fetch(folderName=folderName, storeDir=storeDir)
+        self.assertEqual(failed, [MISSING])
+        self.assertFalse(os.path.exists(folderName))
+        fetched = [day for day in self.bhavFiles if day not in (MISSING, HOLIDAY)]
+        self.assertEqual(bhavStore.listDays(storeDir), [day.isoformat() for day in fetched])
+        for day in fetched:
+            expected = bhavStore.readBhavCSV(self.bhavFiles[day]).set_index('SYMBOL')
+            stored = bhavStore.readBhavDay(storeDir, day.isoformat(), fields=['OPEN','HIGH','LOW','CLOSE'])
+            np.testing.assert_allclose(stored.to_numpy(), expected.loc[stored.index, ['OPEN','HIGH','LOW','CLOSE']].to_numpy())
+        #a second run finds every stored day and only asks for the missing one again
+        self.requests.clear()
+        self.assertEqual(self.fetch(folderName=folderName, storeDir=storeDir), [MISSING])
+        self.assertEqual(list(self.requests), [getArchivePath(MISSING)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,258 @@
+"""
+Columnar local store of NSE bhavcopies.
+
+Each bhavcopy CSV (or zip, read without extracting it) is converted once into a partition directory per day
+(<store>/YYYY/YYYY-MM-DD/) of NumPy .npy files that are read back with memory mapping:
+
+    symbols.npy   sorted unique symbols of the day (the symbol codes index into it)
+    code.npy      int32 symbol code of each row
+    series.npy    series names (EQ, BE, ...) in the order the rows are stored
+    offsets.npy   row offsets of each series. Rows of series[i] are offsets[i]:offsets[i+1]
+    OPEN.npy, HIGH.npy, LOW.npy, CLOSE.npy, LAST.npy, PREVCLOSE.npy   float32 prices
+    TOTTRDQTY.npy int64 traded quantity
+    sources.json  optional. Stamps of the partitions a derived partition was built from (see ohlcPanel)
+
+Rows are sorted by series and then by symbol code, so a series is a contiguous slice and the
+rows of a list of symbols are found with a binary search. Only those rows are read from disk.
+float32 keeps prices exactly to the paisa for prices below 1 lakh. readBhavDay rounds the prices
+back to 2 decimals.
+
+Usage:
+    python bhavStore.py --import data/scanner/          (import cm*bhav.csv and cm*bhav.csv.zip files)
+    python bhavStore.py --from 2021-03-01 --to 2021-03-31 -s SBIN -s INFY
+"""
+import numpy as np
+import pandas as pd
+import os
+import re
+import json
+import shutil
+import zipfile
+import argparse
+import configparser
+from datetime import datetime
+
+PRICE_FIELDS = ['OPEN','HIGH','LOW','CLOSE','LAST','PREVCLOSE']
+BHAV_COLUMNS = ['SYMBOL','SERIES'] + PRICE_FIELDS + ['TOTTRDQTY','TIMESTAMP']
+
+def getPartitionPath(storeDir, day):
+    '''Returns the partition directory for day (date or YYYY-MM-DD string)'''
+    day = str(day)[:10]
+    return os.path.join(storeDir, day[:4], day)
+
+def hasDay(storeDir, day):
+    '''Returns True if the bhavcopy of day is in the store'''
+    return os.path.exists(os.path.join(getPartitionPath(storeDir, day), 'offsets.npy'))
+
+def listDays(storeDir, fromDay=None, toDay=None):
+    '''Returns the days (YYYY-MM-DD strings) in the store from fromDay to toDay, both inclusive'''
+    days = []
+    if not os.path.exists(storeDir):
+        return days
+    for year in os.listdir(storeDir):
+        if not re.fullmatch(r'\d{4}', year):
+            continue
+        for day in os.listdir(os.path.join(storeDir, year)):
+            if not re.fullmatch(r'\d{4}-\d{2}-\d{2}', day) or not hasDay(storeDir, day):
+                continue
+            if (fromDay and day < str(fromDay)) or (toDay and day > str(toDay)):
+                continue
+            days.append(day)
+    return sorted(days)
+
+def getDayStamp(storeDir, day):
+    '''Returns the write time (ns) of the partition of day. It changes every time the day is imported'''
+    return os.stat(os.path.join(getPartitionPath(storeDir, day), 'offsets.npy')).st_mtime_ns
+
+def readSources(storeDir, day):
+    '''Returns the sources saved with the partition of day, or None if it has none'''
+    fileName = os.path.join(getPartitionPath(storeDir, day), 'sources.json')
+    if not os.path.exists(fileName):
+        return None
+    with open(fileName) as jsonfile:
+        return json.load(jsonfile)
+
+def removeDay(storeDir, day):
+    '''Deletes the partition of day if it is in the store'''
+    path = getPartitionPath(storeDir, day)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+def writeBhavDay(storeDir, day, bhavDF, sources=None):
+    '''Writes the bhavcopy DataFrame (columns as in the NSE CSV) of day to the store,
+    replacing the partition if it exists. sources (JSON serializable) is saved with it if given.
+    Returns the partition path'''
+    symbols = bhavDF['SYMBOL'].astype(str).str.strip().to_numpy(dtype=str)
+    series = bhavDF['SERIES'].astype(str).str.strip().to_numpy(dtype=str)
+    uniqueSymbols, codes = np.unique(symbols, return_inverse=True)
+    uniqueSeries, seriesCodes = np.unique(series, return_inverse=True)
+    order = np.lexsort((codes, seriesCodes))
+    counts = np.bincount(seriesCodes, minlength=len(uniqueSeries))
+
+    path = getPartitionPath(storeDir, day)
+    tmpPath = path + '.tmp'
+    if os.path.exists(tmpPath):
+        shutil.rmtree(tmpPath)
+    os.makedirs(tmpPath)
+    np.save(os.path.join(tmpPath, 'symbols.npy'), uniqueSymbols)
+    np.save(os.path.join(tmpPath, 'code.npy'), codes[order].astype(np.int32))
+    np.save(os.path.join(tmpPath, 'series.npy'), uniqueSeries)
+    np.save(os.path.join(tmpPath, 'offsets.npy'), np.concatenate(([0], np.cumsum(counts))).astype(np.int64))
+    for field in PRICE_FIELDS:
+        if field in bhavDF.columns:
+            np.save(os.path.join(tmpPath, field + '.npy'), bhavDF[field].to_numpy(dtype=np.float32)[order])
+    if 'TOTTRDQTY' in bhavDF.columns:
+        np.save(os.path.join(tmpPath, 'TOTTRDQTY.npy'), bhavDF['TOTTRDQTY'].to_numpy(dtype=np.int64)[order])
+    if sources is not None:
+        with open(os.path.join(tmpPath, 'sources.json'), 'w') as jsonfile:
+            json.dump(sources, jsonfile)
+    #swap in the complete partition so readers never see a half written day
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmpPath, path)
+    return path
+
+def getBhavDay(bhavDF, bhavFile=''):
+    '''Returns the trading day (YYYY-MM-DD) of a bhavcopy from its TIMESTAMP column
+    or the ddMMMyyyy date in its file name'''
+    if 'TIMESTAMP' in bhavDF.columns and len(bhavDF) > 0:
+        return datetime.strptime(str(bhavDF['TIMESTAMP'].iloc[0]).strip(), '%d-%b-%Y').strftime('%Y-%m-%d')
+    match = re.search(r'(\d{2}[A-Za-z]{3}\d{4})', os.path.basename(bhavFile))
+    return datetime.strptime(match.group(1), '%d%b%Y').strftime('%Y-%m-%d')
+
+def readBhavCSV(bhavFile):
+    '''Reads the columns kept by the store from a bhavcopy CSV file (or file object)'''
+    return pd.read_csv(bhavFile, usecols=lambda column: column.strip() in BHAV_COLUMNS).rename(columns=str.strip)
+
+def importBhavCSV(storeDir, bhavFile, day=None):
+    '''Converts a bhavcopy CSV file into a store partition. Returns the day imported'''
+    bhavDF = readBhavCSV(bhavFile)
+    if day is None:
+        day = getBhavDay(bhavDF, bhavFile)
+    writeBhavDay(storeDir, day, bhavDF)
+    return str(day)[:10]
+
+def readBhavZip(zipSource):
+    '''Reads the bhavcopy CSV inside a zip (path or file object, Example: io.BytesIO of a
+    downloaded zip) without extracting it to disk'''
+    with zipfile.ZipFile(zipSource) as compressedFile:
+        members = [name for name in compressedFile.namelist() if name.lower().endswith('.csv')]
+        if len(members) < 1:
+            raise ValueError('No CSV file in bhavcopy zip')
+        with compressedFile.open(members[0]) as csvFile:
+            return readBhavCSV(csvFile), members[0]
+
+def importBhavZip(storeDir, zipSource, day=None):
+    '''Converts the bhavcopy zip (path or file object) into a store partition in one pass.
+    Returns the day imported'''
+    bhavDF, member = readBhavZip(zipSource)
+    if day is None:
+        day = getBhavDay(bhavDF, member)
+    writeBhavDay(storeDir, day, bhavDF)
+    return str(day)[:10]
+
+def importFolder(storeDir, folderName, bhavPrefix='cm', bhavSuffix='bhav'):
+    '''Imports the bhavcopy CSV files (and cached .csv.zip files) in folderName that are
+    not in the store yet. Returns the list of days imported'''
+    imported = []
+    pattern = re.escape(bhavPrefix) + r'(\d{2}[A-Z]{3}\d{4})' + re.escape(bhavSuffix) + r'\.csv(\.zip)?'
+    for fname in sorted(os.listdir(folderName)):
+        match = re.fullmatch(pattern, fname)
+        if not match:
+            continue
+        day = datetime.strptime(match.group(1), '%d%b%Y').strftime('%Y-%m-%d')
+        if hasDay(storeDir, day):
+            continue
+        try:
+            if match.group(2):
+                imported.append(importBhavZip(storeDir, os.path.join(folderName, fname), day))
+            else:
+                imported.append(importBhavCSV(storeDir, os.path.join(folderName, fname), day))
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            print('Could not import {0}: {1}'.format(fname, e))
+    return imported
+
+def openPartition(storeDir, day):
+    '''Returns the arrays of a day's partition as a dictionary of memory mapped arrays'''
+    path = getPartitionPath(storeDir, day)
+    partition = {}
+    for fname in os.listdir(path):
+        if fname.endswith('.npy'):
+            partition[fname[:-4]] = np.load(os.path.join(path, fname), mmap_mode='r')
+    return partition
+
+def getRows(partition, series='EQ', symbols=None):
+    '''Returns the row numbers (a slice or an index array) of the given series and symbols'''
+    seriesNames = list(partition['series'])
+    if series not in seriesNames:
+        return slice(0, 0)
+    index = seriesNames.index(series)
+    start, end = int(partition['offsets'][index]), int(partition['offsets'][index + 1])
+    if symbols is None:
+        return slice(start, end)
+    #codes are sorted within a series. Find the wanted codes with a binary search
+    symbols = np.asarray(symbols, dtype=str)
+    allSymbols = partition['symbols']
+    positions = np.searchsorted(allSymbols, symbols)
+    found = positions < len(allSymbols)
+    found[found] = allSymbols[positions[found]] == symbols[found]
+    wanted = np.unique(positions[found])
+    codes = partition['code'][start:end]
+    positions = np.searchsorted(codes, wanted)
+    found = positions < len(codes)
+    found[found] = codes[positions[found]] == wanted[found]
+    return start + positions[found]
+
+def readBhavDay(storeDir, day, series='EQ', symbols=None, fields=None):
+    '''Reads the rows of a series (and list of symbols, all if None) of a day from the store.
+    Returns a DataFrame indexed by SYMBOL with the price fields (all if None) as float64'''
+    partition = openPartition(storeDir, day)
+    rows = getRows(partition, series, symbols)
+    if fields is None:
+        fields = [field for field in PRICE_FIELDS + ['TOTTRDQTY'] if field in partition]
+    data = {}
+    for field in fields:
+        values = partition[field][rows]
+        if values.dtype == np.float32:
+            values = np.round(values.astype(np.float64), 2)
+        data[field] = values
+    index = pd.Index(partition['symbols'][partition['code'][rows]], name='SYMBOL')
+    return pd.DataFrame(data, index=index)
+
+def readBhavRange(storeDir, fromDay=None, toDay=None, series='EQ', symbols=None, fields=None):
+    '''Reads the days in the store from fromDay to toDay into one DataFrame indexed by (DATE, SYMBOL)'''
+    frames = {day: readBhavDay(storeDir, day, series, symbols, fields) for day in listDays(storeDir, fromDay, toDay)}
+    if len(frames) < 1:
+        return pd.DataFrame(columns=fields or PRICE_FIELDS, index=pd.MultiIndex.from_tuples([], names=['DATE','SYMBOL']))
+    return pd.concat(frames, names=['DATE','SYMBOL'])
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    storeConfig = config['BhavStore']
+    scannerConfig = config['CandlestickScanner']
+
+    parser = argparse.ArgumentParser(description='Columnar bhavcopy store')
+    parser.add_argument('--import', dest='importDir', default=None, metavar='DIR',
+        help='Import the bhavcopy CSV files in DIR. Default folder is the CandlestickScanner foldername', nargs='?',
+        const=scannerConfig['foldername'])
+    parser.add_argument('--from', dest='fromDate', default=None, help='First date (YYYY-MM-DD) to list')
+    parser.add_argument('--to', dest='toDate', default=None, help='Last date (YYYY-MM-DD) to list')
+    parser.add_argument('-S', '--series', default='EQ', help='Series to list. Default is %(default)s')
+    parser.add_argument('-s', '--symbol', action='append', default=None, help='Symbol to list. Can be repeated')
+    args = parser.parse_args()
+
+    storeDir = storeConfig['foldername']
+    if args.importDir:
+        imported = importFolder(storeDir, args.importDir, scannerConfig['bhavPrefix'], scannerConfig['bhavSuffix'])
+        print('Imported {0} bhavcopies into {1}'.format(len(imported), storeDir))
+        return
+    symbols = [symbol.strip().upper() for symbol in args.symbol] if args.symbol else None
+    bhavDF = readBhavRange(storeDir, args.fromDate, args.toDate, args.series, symbols)
+    if len(bhavDF) < 1:
+        print('No data found')
+        return
+    print(bhavDF.to_string())
+
+if __name__ == '__main__':
+    main()
@@ -6,7 +6,7 @@
 # ## For Equity Trades
 
 # * For all three conditions : Delivery, BTST and Intraday trades
-# * To account for holidays/weekends to determine DP charges is to be applied for Delivery trades(non BTST)
+# * Holidays/weekends are accounted with the trading calendar (tradingCalendar.py) to determine if DP charges apply (not for BTST)
 # * STT for ETFs would be different. Need to determine this too
 
 
@@ -15,6 +15,7 @@ from datetime import date, datetime, timedelta
 import sys # for commandline arguments
 import argparse
 import configparser
+import csv
 #would need to add configparser for setting constants.
 
 
@@ -73,15 +74,31 @@ def getStampCharges(buy, qty, delta = timedelta(days = 0)):
         return round( 0.015 / 100 * (buy * qty) ,2)
 
 
-def getDPCharges(delta):
+def getDPCharges(delta, sessions=None):
     '''₹13.5 + GST per scrip (irrespective of quantity), 
-    on the day, is debited when stocks are sold. '''
+    on the day, is debited when stocks are sold. 
+    sessions is the number of trading sessions the stock was held (see getHolding).
+    The BTST exemption is only applied when sessions is given'''
     if delta < timedelta(days = 1):
         return 0
-    else: #Need to add logic of previous trading day holiday/weekend for BTST
+    if sessions is not None and sessions < 2: #BTST. Sold on the next trading session before the stock reaches the demat account
+        return 0
+    else:
         return round(13.5 + (18 / 100 * 13.5 ), 2)
 
 
+def getHolding(buyDate, sellDate, calendar=None):
+    '''Returns (delta, sessions) of a trade bought on buyDate and sold on sellDate (dates or arrays
+    of YYYY-MM-DD). sessions counts the trading sessions held using the trading calendar'''
+    import tradingCalendar
+    if calendar is None:
+        config = configparser.ConfigParser()
+        config.read('config.ini')
+        calendar = tradingCalendar.getCalendar(config)
+    delta = tradingCalendar.toDays(sellDate) - tradingCalendar.toDays(buyDate)
+    return delta.astype(int), tradingCalendar.countSessions(calendar, buyDate, sellDate)
+
+
 def getTurnover(buy, sell, qty):
     '''calculates and returns the turnover'''
     # print('#Debug: buy, sell, qty :', buy, sell, qty)
@@ -94,6 +111,118 @@ def getNetPL(buy,sell,qty,charges):
     return pl - charges
 
 
+def roundArray(values, digits=0):
+    '''Rounds an array the way round() rounds a single value. np.round scales by 10**digits first, so a value
+    like 3.555 (stored as 3.55499..) would round up. Values that close to a half are rounded with round()'''
+    import numpy as np #only the batch functions need numpy. Keeps the single trade calculator quick to start
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, digits)
+    scaled = values * 10.0 ** digits
+    nearHalf = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if nearHalf.any():
+        rounded[nearHalf] = [round(value, digits) for value in values[nearHalf].tolist()]
+    return rounded
+
+
+CHARGE_COLUMNS = ['turnover','brokerage','stt','transaction','gst','sebi','stamp','charges','dp','gross','net']
+
+
+def getChargesBatch(buy, sell=None, qty=None, delta=0, isETF=False, isSTT=True, sessions=None):
+    '''Calculates the charges for many trades in one pass. Same rules as the single trade functions above.
+    buy, sell, qty are arrays (or scalars). delta is the holding period in days (array or scalar).
+    isETF and isSTT can be boolean arrays too. sessions is the trading sessions held (see getHolding),
+    which exempts BTST trades from DP charges.
+    buy can also be a DataFrame with columns buy, sell, qty and optional columns delta, etf, stt, sessions.
+    Returns a dictionary of arrays with keys in CHARGE_COLUMNS (a DataFrame if a DataFrame is given).
+    charges is the total tax and transaction charges before DP charges and net is the net PL after all charges'''
+    import numpy as np
+    frame = None
+    if hasattr(buy, 'columns'): #DataFrame of trades
+        frame = buy
+        sell = frame['sell'].to_numpy(dtype=float)
+        qty = frame['qty'].to_numpy(dtype=float)
+        if 'delta' in frame.columns: delta = frame['delta'].to_numpy(dtype=float)
+        if 'etf' in frame.columns: isETF = frame['etf'].to_numpy(dtype=bool)
+        if 'stt' in frame.columns: isSTT = frame['stt'].to_numpy(dtype=bool)
+        if 'sessions' in frame.columns: sessions = frame['sessions'].to_numpy(dtype=float)
+        buy = frame['buy'].to_numpy(dtype=float)
+    if sessions is None: #no BTST exemption without the sessions held (see getHolding)
+        sessions = np.inf
+    buy, sell, qty, delta, isETF, isSTT, sessions = np.broadcast_arrays(np.asarray(buy, dtype=float),
+        np.asarray(sell, dtype=float), np.asarray(qty, dtype=float), np.asarray(delta, dtype=float),
+        np.asarray(isETF, dtype=bool), np.asarray(isSTT, dtype=bool), np.asarray(sessions, dtype=float))
+    intraday = delta < 1
+    buyValue = buy * qty
+    sellValue = sell * qty
+    turnover = (buy + sell) * qty
+    brokerage = np.where(delta > 0, 0.0,
+        np.minimum(0.03 / 100 * buyValue, 20) + np.minimum(0.03 / 100 * sellValue, 20))
+    stt = np.where(intraday, roundArray(0.025 / 100 * sellValue),
+        np.where(isETF, roundArray(0.001 / 100 * sellValue, 2), roundArray(0.1 / 100 * turnover)))
+    stt = np.where(isSTT, stt, 0.0)
+    transaction = roundArray(0.00345 / 100 * turnover, 2)
+    gst = roundArray(18 / 100 * (brokerage + transaction), 2)
+    sebi = roundArray(10 / 10000000 * turnover, 2)
+    stamp = np.where(intraday, roundArray(0.003 / 100 * buyValue, 2), roundArray(0.015 / 100 * buyValue, 2))
+    charges = roundArray(brokerage + stt + transaction + gst + sebi + stamp, 2)
+    dp = np.where(intraday | (sessions < 2), 0.0, round(13.5 + (18 / 100 * 13.5 ), 2))
+    gross = (sell - buy) * qty
+    result = {'turnover': turnover, 'brokerage': brokerage, 'stt': stt, 'transaction': transaction,
+        'gst': gst, 'sebi': sebi, 'stamp': stamp, 'charges': charges, 'dp': dp,
+        'gross': gross, 'net': gross - charges - dp}
+    if frame is not None:
+        return frame.assign(**result)[list(frame.columns) + [c for c in CHARGE_COLUMNS if c not in frame.columns]]
+    return result
+
+
+def readTradesCSV(fname):
+    '''Reads a csv file of trades with header columns buy, sell, qty and optional columns delta, etf, stt
+    or buydate, selldate (YYYY-MM-DD) from which delta and the sessions held are found with the trading calendar.
+    Returns (trades as dictionary of arrays, list of rows as dictionaries)'''
+    import numpy as np
+    with open(fname, 'r') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    trades = {}
+    trades['buy'] = np.array([row['buy'] for row in rows], dtype=float)
+    trades['sell'] = np.array([row['sell'] for row in rows], dtype=float)
+    trades['qty'] = np.array([row['qty'] for row in rows], dtype=float)
+    if len(rows) > 0 and 'delta' in rows[0]:
+        trades['delta'] = np.array([row['delta'] or 0 for row in rows], dtype=float)
+    for key in ('etf','stt'):
+        if len(rows) > 0 and key in rows[0]:
+            trades[key] = np.array([row[key].strip().upper() in ('1','Y','YES','TRUE') for row in rows])
+    if len(rows) > 0 and 'buydate' in rows[0] and 'selldate' in rows[0]:
+        trades['delta'], trades['sessions'] = getHolding([row['buydate'] for row in rows], [row['selldate'] for row in rows])
+    return trades, rows
+
+
+def batchMain(fname, outfile=None):
+    '''Calculates charges for all trades in the csv file fname. Writes the breakdown to outfile if given'''
+    trades, rows = readTradesCSV(fname)
+    result = getChargesBatch(trades['buy'], trades['sell'], trades['qty'], trades.get('delta', 0),
+        trades.get('etf', False), trades.get('stt', True), trades.get('sessions'))
+    print('Trades:',len(rows))
+    print('Turnover:',round(result['turnover'].sum(),2))
+    print('Gross PL:',round(result['gross'].sum(),2))
+    print('Total Tax and Transaction Charges',round(result['charges'].sum(),2))
+    if result['dp'].sum() > 0:
+        print('DP charges:',round(result['dp'].sum(),2))
+    print('Net PL:',round(result['net'].sum(),2))
+    if outfile:
+        with open(outfile, 'w', newline='') as csvfile:
+            header = list(rows[0].keys()) if len(rows) > 0 else []
+            header += [column for column in CHARGE_COLUMNS if column not in header]
+            csvwriter = csv.DictWriter(csvfile, fieldnames=header)
+            csvwriter.writeheader()
+            for index, row in enumerate(rows):
+                row = dict(row)
+                for column in CHARGE_COLUMNS:
+                    row[column] = round(float(result[column][index]), 2)
+                csvwriter.writerow(row)
+        print('Charges written to CSV file:',outfile)
+    return result
+
+
 def main():
     # buyDate = None
     # sellDate = None
@@ -109,16 +238,35 @@ def main():
     
     #Common features
     parser.add_argument('-d', '--delta', action='count', default=0, help='Increase holding period. Default is %(default)s')
-    parser.add_argument('buy_price', type=float, help='The buy price', metavar='BuyPrice')
-    parser.add_argument('sell_price', type=float, help='The sell price', metavar='SellPrice')
-    parser.add_argument('quantity', type=int, help='Quantity of shares traded', metavar='QTY')
+    parser.add_argument('buy_price', type=float, nargs='?', help='The buy price', metavar='BuyPrice')
+    parser.add_argument('sell_price', type=float, nargs='?', help='The sell price', metavar='SellPrice')
+    parser.add_argument('quantity', type=int, nargs='?', help='Quantity of shares traded', metavar='QTY')
     parser.add_argument('-e', '--etf', action='store_true', help='If the stock is ETF' )
     parser.add_argument('-n', '--nostt', action='store_true', help='Sets STT as not applicable' )
+    parser.add_argument('--buydate', default=None, help='Buy date (YYYY-MM-DD). With --selldate, sets the holding period in trading sessions')
+    parser.add_argument('--selldate', default=None, help='Sell date (YYYY-MM-DD)')
+    parser.add_argument('-c', '--csv', default=None, metavar='FILE',
+        help='Calculate charges for all trades in a csv file with columns buy,sell,qty and optional delta,etf,stt or buydate,selldate')
+    parser.add_argument('-o', '--output', default=None, metavar='FILE', help='Write the charges breakdown of --csv trades to FILE')
 
     #Parse arguments
     args = parser.parse_args()
 
+    if args.csv:
+        batchMain(args.csv, args.output)
+        return
+    if args.buy_price is None or args.sell_price is None or args.quantity is None:
+        parser.error('BuyPrice, SellPrice and QTY are required unless --csv is given')
+
     delta = timedelta(days=args.delta)
+    sessions = None
+    if args.buydate and args.selldate:
+        try:
+            days, sessions = getHolding(args.buydate, args.selldate)
+        except ValueError as e:
+            parser.error(str(e))
+        delta = timedelta(days=int(days))
+        print('Holding period: {0} days, {1} trading sessions'.format(int(days), int(sessions)))
     buy = args.buy_price
     sell = args.sell_price
     qty = args.quantity
@@ -158,12 +306,13 @@ def main():
 
     print('Gross PL:',round((sell-buy)*qty, 2))
     print('Total Tax and Transaction Charges',round(taxnCharges,2))
-    dpCharges = getDPCharges(delta)
+    dpCharges = getDPCharges(delta, sessions)
     if dpCharges > 0:
         print('DP charges:',dpCharges)
         print(f'Total Charges: {round(taxnCharges + dpCharges,2)}')
     netPL = getNetPL(buy,sell,qty,taxnCharges) - dpCharges
     print('Net PL:',round(netPL,2))
 
-main()
+if __name__ == '__main__':
+    main()
 
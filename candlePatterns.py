@@ -0,0 +1,208 @@
+"""
+Candlestick pattern registry and scan engine.
+
+Every pattern is declared once with registerPattern as a rule over the candle features
+(body and shadows of the day, the previous session and, for multi-bar patterns, the last N
+sessions) computed once per scan. scanPatterns evaluates the selected patterns over a DataFrame
+of the day (with the PREV columns of the previous session) in one pass and returns a symbol x pattern
+boolean matrix. scanBars does the same over arrays of the last N sessions (see ohlcPanel.py).
+Printing is left to the caller (see nseCandlestickScanner.displayPatterns).
+
+Patterns are grouped by the command line option that selects them (hammer, marubozu, ...).
+Each group has a bullish pattern and its bearish mirror.
+"""
+import numpy as np
+import pandas as pd
+
+#pattern key -> dictionary with name, group, side, bars (number of sessions it needs) and rule
+PATTERNS = {}
+
+#default pattern parameters. Overridden from [CandlestickScanner] in config.ini
+DEFAULT_PARAMS = {'tailToBodyRatio': 3.0, 'marubozuShadow': 0.07, 'starBodyRatio': 0.3, 'soldierShadow': 0.3}
+
+BAR_FIELDS = ['OPEN','HIGH','LOW','CLOSE']
+
+def registerPattern(key, name, group, side, bars=1):
+    '''Decorator to add a pattern rule to the registry. The rule is called with the
+    candle features and the parameters and returns a boolean array'''
+    def register(rule):
+        PATTERNS[key] = {'name': name, 'group': group, 'side': side, 'bars': bars, 'rule': rule}
+        return rule
+    return register
+
+def getPatterns(groups=None, sides=('BULLISH',), maxBars=None):
+    '''Returns the keys of the registered patterns in the given groups (all if None) and sides
+    that need at most maxBars sessions'''
+    return [key for key, pattern in PATTERNS.items()
+        if (groups is None or pattern['group'] in groups) and pattern['side'] in sides
+        and (maxBars is None or pattern['bars'] <= maxBars)]
+
+def getMaxBars(patterns):
+    '''Returns the number of sessions needed by the longest of the patterns'''
+    return max([PATTERNS[key]['bars'] for key in patterns], default=1)
+
+def getColumn(df, column):
+    '''Returns a column of df as a float array. A missing column is all NaN'''
+    if column in df.columns:
+        return df[column].to_numpy(dtype=float)
+    return np.full(len(df), np.nan)
+
+def addBodyFeatures(f):
+    '''Adds the body and shadow features of the day and the previous session body'''
+    f['BODY'] = f['CLOSE'] - f['OPEN'] #positive for green candles
+    f['ABSBODY'] = np.abs(f['BODY'])
+    f['UPPER'] = f['HIGH'] - np.maximum(f['OPEN'], f['CLOSE']) #upper shadow
+    f['LOWER'] = np.minimum(f['OPEN'], f['CLOSE']) - f['LOW'] #lower shadow
+    f['PREVBODY'] = f['PREVCLOSE'] - f['PREVOPEN']
+    return f
+
+def getCandleFeatures(df):
+    '''Computes the arrays shared by the pattern rules from a DataFrame with columns OPEN, HIGH,
+    LOW, CLOSE and optionally PREVOPEN, PREVHIGH, PREVLOW, PREVCLOSE of the previous session'''
+    f = {}
+    for column in ('OPEN','HIGH','LOW','CLOSE','PREVOPEN','PREVHIGH','PREVLOW','PREVCLOSE'):
+        f[column] = getColumn(df, column)
+    #the two sessions as (symbols, 2) arrays, oldest first, for the multi-bar rules
+    for field in BAR_FIELDS:
+        f[field[0]] = np.stack([f['PREV' + field], f[field]], axis=-1)
+    f['BARS'] = 2
+    return addBodyFeatures(f)
+
+def getBarFeatures(bars):
+    '''Computes the features from a dictionary of field to array of shape (..., N) holding
+    the last N sessions, oldest first (Example: ohlcPanel.getBars). PREVCLOSE of the last session
+    is taken from a PREVCLOSE field if given, else from the close of the session before'''
+    f = {'BARS': bars['CLOSE'].shape[-1]}
+    for field in BAR_FIELDS:
+        f[field[0]] = bars[field]
+        f[field] = bars[field][..., -1]
+        if f['BARS'] > 1:
+            f['PREV' + field] = bars[field][..., -2]
+        else:
+            f['PREV' + field] = np.full(f[field].shape, np.nan)
+    if 'PREVCLOSE' in bars:
+        f['PREVCLOSE'] = bars['PREVCLOSE'][..., -1]
+    return addBodyFeatures(f)
+
+def evaluatePatterns(f, patterns, params=None):
+    '''Evaluates the patterns over the features. Patterns needing more sessions than the features
+    hold are all False. Returns a dictionary of pattern key to boolean array'''
+    settings = dict(DEFAULT_PARAMS)
+    if params is not None:
+        settings.update(params)
+    hits = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for key in patterns:
+            if PATTERNS[key]['bars'] > f['BARS']:
+                hits[key] = np.zeros(f['CLOSE'].shape, dtype=bool)
+            else:
+                hits[key] = PATTERNS[key]['rule'](f, settings)
+    return hits
+
+def scanPatterns(df, patterns=None, params=None):
+    '''Evaluates the patterns (list of keys, all registered if None) over df.
+    Returns a DataFrame indexed like df with one boolean column per pattern'''
+    if patterns is None:
+        patterns = list(PATTERNS)
+    matrix = evaluatePatterns(getCandleFeatures(df), patterns, params)
+    return pd.DataFrame(matrix, index=df.index, columns=patterns, dtype=bool)
+
+def scanBars(bars, patterns=None, params=None):
+    '''Evaluates the patterns over the last N sessions in bars (see getBarFeatures).
+    Returns a dictionary of pattern key to boolean array of shape bars[field].shape[:-1]'''
+    if patterns is None:
+        patterns = list(PATTERNS)
+    return evaluatePatterns(getBarFeatures(bars), patterns, params)
+
+@registerPattern('hammer', 'Bullish Hammer', 'hammer', 'BULLISH')
+def isBullishHammer(f, params):
+    #Both green and red hammers/dragonfly dojis: long lower shadow, short upper shadow
+    return (f['LOWER'] > f['ABSBODY'] * params['tailToBodyRatio']) & (f['UPPER'] < f['ABSBODY'])
+
+@registerPattern('shootingstar', 'Bearish Shooting Star', 'hammer', 'BEARISH')
+def isBearishShootingStar(f, params):
+    #inverted hammer/gravestone doji: long upper shadow, short lower shadow
+    return (f['UPPER'] > f['ABSBODY'] * params['tailToBodyRatio']) & (f['LOWER'] < f['ABSBODY'])
+
+@registerPattern('marubozu', 'Bullish Marubozu', 'marubozu', 'BULLISH')
+def isBullishMarubozu(f, params):
+    return ((f['BODY'] > 0) & (f['UPPER'] / f['BODY'] < params['marubozuShadow'])
+        & (f['LOWER'] / f['BODY'] < params['marubozuShadow']))
+
+@registerPattern('bearishmarubozu', 'Bearish Marubozu', 'marubozu', 'BEARISH')
+def isBearishMarubozu(f, params):
+    return ((f['BODY'] < 0) & (f['UPPER'] / f['ABSBODY'] < params['marubozuShadow'])
+        & (f['LOWER'] / f['ABSBODY'] < params['marubozuShadow']))
+
+@registerPattern('engulfing', 'Bullish Engulfing', 'engulfing', 'BULLISH', bars=2)
+def isBullishEngulfing(f, params):
+    return ((f['PREVBODY'] < 0) & (f['BODY'] > 0)
+        & (f['OPEN'] < f['PREVCLOSE']) & (f['CLOSE'] > f['PREVOPEN']))
+
+@registerPattern('bearishengulfing', 'Bearish Engulfing', 'engulfing', 'BEARISH', bars=2)
+def isBearishEngulfing(f, params):
+    return ((f['PREVBODY'] > 0) & (f['BODY'] < 0)
+        & (f['OPEN'] > f['PREVCLOSE']) & (f['CLOSE'] < f['PREVOPEN']))
+
+@registerPattern('outside', 'Bullish Outside Bar', 'outside', 'BULLISH', bars=2)
+def isBullishOutsideBar(f, params):
+    return ((f['PREVBODY'] < 0) & (f['BODY'] > 0)
+        & (f['LOW'] < f['PREVLOW']) & (f['CLOSE'] > f['PREVHIGH']))
+
+@registerPattern('bearishoutside', 'Bearish Outside Bar', 'outside', 'BEARISH', bars=2)
+def isBearishOutsideBar(f, params):
+    return ((f['PREVBODY'] > 0) & (f['BODY'] < 0)
+        & (f['HIGH'] > f['PREVHIGH']) & (f['CLOSE'] < f['PREVLOW']))
+
+@registerPattern('harami', 'Bullish Harami', 'harami', 'BULLISH', bars=2)
+def isBullishHarami(f, params):
+    return ((f['PREVBODY'] < 0) & (f['BODY'] > 0)
+        & (f['OPEN'] > f['PREVCLOSE']) & (f['CLOSE'] < f['PREVOPEN']))
+
+@registerPattern('bearishharami', 'Bearish Harami', 'harami', 'BEARISH', bars=2)
+def isBearishHarami(f, params):
+    return ((f['PREVBODY'] > 0) & (f['BODY'] < 0)
+        & (f['OPEN'] < f['PREVCLOSE']) & (f['CLOSE'] > f['PREVOPEN']))
+
+@registerPattern('morningstar', 'Bullish Morning Star', 'star', 'BULLISH', bars=3)
+def isBullishMorningStar(f, params):
+    #red candle, a small body gapping below its close, then a green candle closing above the first's midpoint
+    O, C = f['O'], f['C']
+    return ((C[..., -3] < O[..., -3])
+        & (np.abs(C[..., -2] - O[..., -2]) <= params['starBodyRatio'] * (O[..., -3] - C[..., -3]))
+        & (np.maximum(O[..., -2], C[..., -2]) < C[..., -3])
+        & (C[..., -1] > O[..., -1]) & (C[..., -1] > (O[..., -3] + C[..., -3]) / 2))
+
+@registerPattern('eveningstar', 'Bearish Evening Star', 'star', 'BEARISH', bars=3)
+def isBearishEveningStar(f, params):
+    O, C = f['O'], f['C']
+    return ((C[..., -3] > O[..., -3])
+        & (np.abs(C[..., -2] - O[..., -2]) <= params['starBodyRatio'] * (C[..., -3] - O[..., -3]))
+        & (np.minimum(O[..., -2], C[..., -2]) > C[..., -3])
+        & (C[..., -1] < O[..., -1]) & (C[..., -1] < (O[..., -3] + C[..., -3]) / 2))
+
+@registerPattern('soldiers', 'Bullish Three White Soldiers', 'soldiers', 'BULLISH', bars=3)
+def isBullishThreeWhiteSoldiers(f, params):
+    #three green candles with higher closes, each opening within the previous body, closing near the high
+    O, H, C = f['O'][..., -3:], f['H'][..., -3:], f['C'][..., -3:]
+    return (np.all(C > O, axis=-1) & np.all(H - C <= params['soldierShadow'] * (C - O), axis=-1)
+        & np.all(C[..., 1:] > C[..., :-1], axis=-1)
+        & np.all((O[..., 1:] > O[..., :-1]) & (O[..., 1:] < C[..., :-1]), axis=-1))
+
+@registerPattern('crows', 'Bearish Three Black Crows', 'soldiers', 'BEARISH', bars=3)
+def isBearishThreeBlackCrows(f, params):
+    O, L, C = f['O'][..., -3:], f['L'][..., -3:], f['C'][..., -3:]
+    return (np.all(C < O, axis=-1) & np.all(C - L <= params['soldierShadow'] * (O - C), axis=-1)
+        & np.all(C[..., 1:] < C[..., :-1], axis=-1)
+        & np.all((O[..., 1:] < O[..., :-1]) & (O[..., 1:] > C[..., :-1]), axis=-1))
+
+@registerPattern('insidebreakout', 'Bullish Inside Bar Breakout', 'insidebar', 'BULLISH', bars=3)
+def isBullishInsideBarBreakout(f, params):
+    #an inside bar within the mother bar's range, then a close above the mother bar's high
+    H, L, C = f['H'], f['L'], f['C']
+    return (H[..., -2] < H[..., -3]) & (L[..., -2] > L[..., -3]) & (C[..., -1] > H[..., -3])
+
+@registerPattern('insidebreakdown', 'Bearish Inside Bar Breakdown', 'insidebar', 'BEARISH', bars=3)
+def isBearishInsideBarBreakdown(f, params):
+    H, L, C = f['H'], f['L'], f['C']
+    return (H[..., -2] < H[..., -3]) & (L[..., -2] > L[..., -3]) & (C[..., -1] < L[..., -3])
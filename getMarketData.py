@@ -13,50 +13,73 @@
 # In[1]:
 
 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 import os
+import io
+import sys
+import time
+import argparse
+import configparser
 import requests
 import zipfile
+import profiler
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+#Bhavcopy archive. The file for a day is at {baseURL}{YYYY}/{MMM}/cm{DD}{MMM}{YYYY}bhav.csv.zip
+BHAV_BASE_URL = 'https://archives.nseindia.com/content/historical/EQUITIES/'
+
+#NSEIndia doesn't let python program to download bhavcopy unless headers are set.
+#Found this solution on stackoverflow as way to access bhavcopy via python by setting headers and session
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.190 Safari/537.36',
+       'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*,q=0.8,application/signed-exchange;v=b3;q=0.9',
+       'Accept-Encoding': 'gzip, deflate, br',
+       'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
+       'Accept-Language': 'en-IN,en;q=0.9,en-GB;q=0.8,en-US;q=0.7,hi;q=0.6',
+       'Connection': 'keep-alive','Host':'www1.nseindia.com',
+       'Cache-Control':'max-age=0',
+       'Referer':'https://www1.nseindia.com/products/content/derivatives/equities/fo.htm',
+       }
+COOKIES = {'bm_sv':'E2109FAE3F0EA09C38163BBF24DD9A7E~t53LAJFVQDcB/+q14T3amyom/sJ5dm1gV7z2R0E3DKg6WiKBpLgF0t1Mv32gad4CqvL3DIswsfAKTAHD16vNlona86iCn3267hHmZU/O7DrKPY73XE6C4p5geps7yRwXxoUOlsqqPtbPsWsxE7cyDxr6R+RFqYMoDc9XuhS7e18='}
 
 
 # In[17]:
 
 
+def getSession(poolSize=1, baseURL=BHAV_BASE_URL):
+    '''Returns a requests session with the NSE headers and cookies set and a connection pool
+    of poolSize connections, so that one session can be shared by poolSize download threads'''
+    session = requests.session()
+    session.headers.update(HEADERS)
+    if not baseURL.startswith('https://archives.nseindia.com'): #local mirror or test server
+        del session.headers['Host']
+    for cookie in COOKIES:
+        session.cookies.set(cookie,COOKIES[cookie])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
 def downloadUnzip(url,filepath, verbose=True):
     '''Download file and unzip the compressed file. If file cannot be 
     found/uncompressed it return False. Else returns True'''
     if not os.path.exists(filepath):
         if verbose: print('Downloading file from URL:',url)
         zFilePath = filepath + '.zip'
-        zfile = open(zFilePath,'wb')
-        #NSEIndia doesn't let python program to download bhavcopy unless headers are set.
-        #Found this solution on stackoverflow as way to access bhavcopy via python by setting headers and session
-        hdr = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.190 Safari/537.36',
-       'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*,q=0.8,application/signed-exchange;v=b3;q=0.9',
-       'Accept-Encoding': 'gzip, deflate, br',
-       'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
-       'Accept-Encoding': 'gzip, deflate, br',
-       'Accept-Language': 'en-IN,en;q=0.9,en-GB;q=0.8,en-US;q=0.7,hi;q=0.6',
-       'Connection': 'keep-alive','Host':'www1.nseindia.com',
-       'Cache-Control':'max-age=0',
-       'Host':'www1.nseindia.com',
-       'Referer':'https://www1.nseindia.com/products/content/derivatives/equities/fo.htm',
-       }
-        cookie_dict={'bm_sv':'E2109FAE3F0EA09C38163BBF24DD9A7E~t53LAJFVQDcB/+q14T3amyom/sJ5dm1gV7z2R0E3DKg6WiKBpLgF0t1Mv32gad4CqvL3DIswsfAKTAHD16vNlona86iCn3267hHmZU/O7DrKPY73XE6C4p5geps7yRwXxoUOlsqqPtbPsWsxE7cyDxr6R+RFqYMoDc9XuhS7e18='}
-        session = requests.session()
-        for cookie in cookie_dict:
-            session.cookies.set(cookie,cookie_dict[cookie])
-        
-        with session.get(url,headers = hdr) as response:
-            for chunks in response.iter_content(chunk_size=1024):
-                zfile.write(chunks)
-        zfile.close()
+        with profiler.stage('bhavcopy download'):
+            zfile = open(zFilePath,'wb')
+            session = getSession()
+            with session.get(url) as response:
+                for chunks in response.iter_content(chunk_size=1024):
+                    zfile.write(chunks)
+            zfile.close()
         if verbose: print('Downloading Zip File complete')
         if verbose: print('Uncompressing File:',zFilePath)
         try:
-            with zipfile.ZipFile(zFilePath,'r') as compressedFile:
-                compressedFile.extractall(Path(zFilePath).parent)
+            with profiler.stage('bhavcopy unzip'):
+                with zipfile.ZipFile(zFilePath,'r') as compressedFile:
+                    compressedFile.extractall(Path(zFilePath).parent)
         except zipfile.BadZipFile as e:
             print('Uncompression Failure! BadZipFile',e.with_traceback)
             return False
@@ -74,31 +97,160 @@ def downloadUnzip(url,filepath, verbose=True):
 def fetchBhavcopy(bhavDay, FOLDER_NAME, bhavFilePath, verbose=True):
     '''Fetches bhavcopy from NSE website for given date (bhavDay) and saves the
     uncompressed csv file at path(bhavFilepath) in given Directory(FOLDER_NAME)'''
-    year = bhavDay[5:]
-    month = bhavDay[2:5]
     if not os.path.exists(FOLDER_NAME):
         if verbose: print('Directory:',FOLDER_NAME,'does not exists')
         os.makedirs(FOLDER_NAME)
         if verbose: print('Directory:',FOLDER_NAME,'created!')
     # else:
     #     print('Directory:',FOLDER_NAME,'exists')
-    bhavURL = 'https://archives.nseindia.com/content/historical/EQUITIES/{0}/{1}/cm{2}bhav.csv.zip'.format(year,month,bhavDay)
+    bhavURL = getBhavURL(bhavDay)
     # print(bhavURL)
     return downloadUnzip(bhavURL,bhavFilePath, verbose)
-    
+
+
+# In[19]:
+
+
+def getBhavURL(bhavDay, baseURL=BHAV_BASE_URL):
+    '''Returns the download URL of the bhavcopy zip for bhavDay (string of format ddMMMyyyy)'''
+    return '{0}{1}/{2}/cm{3}bhav.csv.zip'.format(baseURL, bhavDay[5:], bhavDay[2:5], bhavDay)
+
+def extractZip(content, filepath):
+    '''Extracts the bhavcopy zip file content (bytes) into the directory of filepath.
+    Returns True if the zip could be extracted'''
+    zFilePath = filepath + '.zip'
+    with open(zFilePath,'wb') as zfile:
+        zfile.write(content)
+    try:
+        with zipfile.ZipFile(zFilePath,'r') as compressedFile:
+            compressedFile.extractall(Path(zFilePath).parent)
+    except zipfile.BadZipFile as e:
+        print('Uncompression Failure! BadZipFile',e)
+        return False
+    finally:
+        os.remove(zFilePath)
+    return os.path.exists(filepath)
+
+def getWithRetry(session, url, retries=3, backoff=1.0, timeout=30, verbose=False):
+    '''Gets url with a shared session. Connection errors and server errors (5xx, 429) are retried
+    up to retries times, waiting backoff, 2*backoff, 4*backoff... seconds.
+    Returns the response content (bytes) or None'''
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        try:
+            response = session.get(url, timeout=timeout)
+        except requests.RequestException as e:
+            if verbose: print('Attempt {0} failed for {1}: {2}'.format(attempt + 1, url, e))
+            continue
+        if response.status_code == 200:
+            return response.content
+        if verbose: print('Attempt {0} failed for {1}: HTTP {2}'.format(attempt + 1, url, response.status_code))
+        if response.status_code < 500 and response.status_code != 429:
+            return None #Example: 404 for a holiday. Retrying won't help
+    return None
+
+def downloadBhavcopy(session, bhavDay, folderName, baseURL=BHAV_BASE_URL, retries=3, backoff=1.0, timeout=30, verbose=False):
+    '''Downloads and extracts the bhavcopy of bhavDay (ddMMMyyyy) into folderName with a shared session.
+    Returns True on success'''
+    filepath = os.path.join(folderName, 'cm' + bhavDay + 'bhav.csv')
+    if os.path.exists(filepath):
+        return True
+    content = getWithRetry(session, getBhavURL(bhavDay, baseURL), retries, backoff, timeout, verbose)
+    if content is None:
+        return False
+    return extractZip(content, filepath)
+
+def downloadBhavcopyToStore(session, bhavDay, storeDir, baseURL=BHAV_BASE_URL, retries=3, backoff=1.0, timeout=30, verbose=False):
+    '''Downloads the bhavcopy of bhavDay (ddMMMyyyy) and parses the zip in memory straight
+    into the bhavcopy store (see bhavStore.py). Nothing else is written to disk. Returns True on success'''
+    import bhavStore
+    day = datetime.strptime(bhavDay, '%d%b%Y').strftime('%Y-%m-%d')
+    if bhavStore.hasDay(storeDir, day):
+        return True
+    content = getWithRetry(session, getBhavURL(bhavDay, baseURL), retries, backoff, timeout, verbose)
+    if content is None:
+        return False
+    try:
+        bhavStore.importBhavZip(storeDir, io.BytesIO(content), day)
+    except (ValueError, zipfile.BadZipFile) as e:
+        print('Bhavcopy of {0} could not be read: {1}'.format(bhavDay, e))
+        return False
+    return True
+
+def fetchBhavcopyDays(days, folderName, baseURL=BHAV_BASE_URL, session=None, workers=4, retries=3, backoff=1.0, verbose=False,
+        storeDir=None):
+    '''Downloads the bhavcopies of the given days (dates) into folderName with up to workers
+    concurrent downloads over one pooled session. If storeDir is given, the zips are parsed in
+    memory into the bhavcopy store instead. Days already downloaded are skipped.
+    Returns the list of days that could not be fetched'''
+    if session is None:
+        session = getSession(workers, baseURL)
+    if storeDir is not None:
+        download = lambda bhavDay: downloadBhavcopyToStore(session, bhavDay, storeDir, baseURL, retries, backoff, verbose=verbose)
+    else:
+        if not os.path.exists(folderName):
+            os.makedirs(folderName)
+        download = lambda bhavDay: downloadBhavcopy(session, bhavDay, folderName, baseURL, retries, backoff, verbose=verbose)
+    bhavDays = [day.strftime('%d%b%Y').upper() for day in days]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(download, bhavDays))
+    return [day for day, fetched in zip(days, results) if not fetched]
+
+def fetchBhavcopyRange(start, end, calendar, folderName='data/scanner/', baseURL=BHAV_BASE_URL, session=None,
+        workers=4, retries=3, backoff=1.0, verbose=False, storeDir=None):
+    '''Downloads the bhavcopies of the trading days in calendar (see tradingCalendar.py) from start
+    to end (dates, both inclusive), into folderName or straight into the store at storeDir.
+    Returns the list of days that could not be fetched'''
+    import tradingCalendar
+    days = list(tradingCalendar.sessionsBetween(calendar, start, end).astype(object))
+    return fetchBhavcopyDays(days, folderName, baseURL, session, workers, retries, backoff, verbose, storeDir)
+
 
 
 # In[14]:
 
 
-def main(offset=0):
+def main():
     '''For standalone testing'''
-    delta = timedelta(days = offset)
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    marketData = config['MarketData'] if config.has_section('MarketData') else {}
+
+    parser = argparse.ArgumentParser(description='Fetch NSE bhavcopies')
+    parser.add_argument('-d', '--delta', type=int, default=0, help='Fetch the bhavcopy of this many days back. Default is %(default)s')
+    parser.add_argument('--from', dest='fromDate', default=None, help='Fetch all bhavcopies from this date (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='toDate', default=None, help='Last date (YYYY-MM-DD) to fetch. Default is today')
+    parser.add_argument('-j', '--jobs', type=int, default=int(marketData.get('downloadWorkers', 4)),
+        help='Number of concurrent downloads. Default is %(default)s')
+    parser.add_argument('-u', '--url', default=marketData.get('baseURL', BHAV_BASE_URL), help='Base URL of the bhavcopy archive. Default is %(default)s')
+    parser.add_argument('-s', '--store', default=None, metavar='DIR', help='Parse the downloaded zips straight into the bhavcopy store at DIR')
+    profiler.addArgument(parser)
+    args = parser.parse_args()
+    if profiler.enableFromArgs(args):
+        module = sys.modules[__name__]
+        profiler.instrument(module, 'fetchBhavcopy', 'fetch bhavcopy')
+        profiler.instrument(module, 'fetchBhavcopyRange', 'fetch bhavcopies')
+
     FOLDER_NAME = 'data/scanner/' #The location where files will be downloaded
+    if args.fromDate:
+        start = datetime.strptime(args.fromDate, '%Y-%m-%d').date()
+        end = datetime.strptime(args.toDate, '%Y-%m-%d').date() if args.toDate else date.today()
+        import tradingCalendar
+        calendar = tradingCalendar.getCalendar(config) #only the trading days are fetched, so holidays are not failures
+        if not tradingCalendar.isCovered(calendar, [start, end]):
+            print('Dates outside the trading calendar ({0} to {1}). Add the holidays of the year to [TradingCalendar] in config.ini'.format(
+                calendar['firstDay'], calendar['lastDay']))
+            return
+        failed = fetchBhavcopyRange(start, end, calendar, FOLDER_NAME, baseURL=args.url, workers=args.jobs,
+            retries=int(marketData.get('retries', 3)), verbose=True, storeDir=args.store)
+        for day in failed:
+            print('Fetching of bhavcopy failed for date:', day)
+        return
+    delta = timedelta(days = args.delta)
     bhavDay = (datetime.today() - delta).strftime('%d%b%Y').upper() #Needs to be a valid trading day
     bhavFileName = 'cm'+bhavDay+'bhav.csv'
     bhavFilePath = os.path.join(FOLDER_NAME,bhavFileName)
-    bhavFilePath
     status = fetchBhavcopy(bhavDay, FOLDER_NAME, bhavFilePath)
     if status == False:
         print('Fetching of bhavcopy failed for date:',bhavDay)
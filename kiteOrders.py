@@ -4,26 +4,40 @@ and create a csv file with single entry for each squared-off intraday MIS trade
 segment. The entry for each row will including the strategy name in a column. This would be
 for maintaining a trade journal as csv.
 
+Squared-off trades are appended to a single trade journal (see tradeJournal.py).
+
 Future plans:
-1. Append to master csv file
-2. Options to Generate reports
-3. Visualizations on strategy/daily performance/cummilative performance.
-4. Add taxes/brokerage/charges calculation to add approximate trade costs for net P&L
+1. Options to Generate reports
+2. Visualizations on strategy/daily performance/cummilative performance.
+3. Add taxes/brokerage/charges calculation to add approximate trade costs for net P&L
 
 """
 import datetime
-import json
 import os
+import sys
 import csv
+import json
 import configparser
+import argparse
 import stockfinder
+import brokerageCalculator
+import strategyRules
+import tradeJournal
+import profiler
+from collections import Counter, deque
+from functools import lru_cache
+from itertools import groupby
 from operator import itemgetter
 
-def getConfigData(key="foldername"):
+@lru_cache(maxsize=None)
+def getKiteConfig():
+    """Reads config.ini once and returns the KiteOrders section"""
     config = configparser.ConfigParser()
     config.read("config.ini")
-    kiteConfig = config["KiteOrders"]
-    return kiteConfig[key]
+    return config["KiteOrders"]
+
+def getConfigData(key="foldername"):
+    return getKiteConfig()[key]
 
 def getDataDirectory():
     """Creates and gets the relative path to the data directory from config file"""
@@ -45,7 +59,7 @@ def getOrdersFilepath():
     # print("#Debug: Full path to orders file:", fullPath)
     return fullPath
 
-def getOrders():
+def getOrders(fills=None):
     """get Orders as dictionary
 
         Each row in CSV file will be returned as dictionary with below keys
@@ -57,46 +71,52 @@ def getOrders():
         Avg. price : 498
         Status : COMPLETE
 
+        Only orders with Status COMPLETE are considered.
         For intraday equities, 
         1. The value for key "Product" must be MIS and
         2. The value for key "Instrument" must be part of the segment we trade. 
             Example: Securities in FO, Nifty50 etc
         3. Also, for "Qty." we need to replace values like 3/3 as 3.i.e., Order fill 3 out of 3 as 3.
 
+        Orders are matched in FIFO order against open legs of the same Instrument on the
+        opposite side (see matchOrder), so scale-in and scale-out trades are split into
+        one closed trade per matched quantity.
+
+        fills, if given a list, collects the rows of today's fills (for the ingest high-water-mark).
     """
     ordersFilePath = getOrdersFilepath()
     allOrders = {}
+    openLegs = {} #FIFO queues of open order IDs keyed by (Instrument, trade)
+    lookuptable = stockfinder.loadFoJson(getConfigData("FnOListJsonFileName"))
     try:
         with open(ordersFilePath,"r") as csvfile:
-            csv_dict_reader = csv.DictReader(csvfile, delimiter=',')
-            sorted_csv_dict = sorted(csv_dict_reader,key=itemgetter('Time'))
-            for row in sorted_csv_dict:
-                if not isTodaysOrder(row):
-                    break
-                # print("#debug:",csv_dict_reader.line_num)
-                if isProductMIS(row):
-                    # print("#Debug:{} is MIS".format(row.get("Instrument")))
-                    if isInstrumentinFO(row):
-                        #if open order exisit, then squareoff
-                        openOrderID = checkIfOpenOrderExists(row, allOrders)
-                        if openOrderID:
-                            #square-off the order
-                            # print("#Debug. Open order ID {0} exists for {1}".format(openOrderID, row["Instrument"]))
-                            squareOffOrder(openOrderID, row, allOrders)
+            with profiler.stage("read orders"):
+                csv_dict_reader = csv.DictReader(csvfile, delimiter=',')
+                sorted_csv_dict = sorted(csv_dict_reader,key=itemgetter('Time'))
+                profiler.rows(len(sorted_csv_dict))
+            with profiler.stage("match orders"):
+                profiler.rows(len(sorted_csv_dict))
+                for row in sorted_csv_dict:
+                    if not isTodaysOrder(row):
+                        break
+                    if fills is not None:
+                        fills.append(row)
+                    # print("#debug:",csv_dict_reader.line_num)
+                    if not isOrderComplete(row):
+                        print("#Order for {0} is {1}. Skipping it".format(row.get("Instrument"), row.get("Status")))
+                        continue
+                    if isProductMIS(row):
+                        # print("#Debug:{} is MIS".format(row.get("Instrument")))
+                        if isInstrumentinFO(row, lookuptable):
+                            #square-off any open legs on the opposite side, else open a new leg
+                            matchOrder(row, allOrders, openLegs)
                         else:
-                            #Else create new order
-                            # print("#Debug. New order created for {}".format(row["Instrument"]))
-                            newOrder = createNewOrder(row)
-                            id = str(len(allOrders)+1)
-                            # print(type(id), id)
-                            allOrders[id] = allOrders.get(id, newOrder)
+                            print("#Intrument {} not in traded Segment. Skipping it".format(row.get("Instrument")))
+                            pass
                     else:
-                        print("#Intrument {} not in traded Segment. Skipping it".format(row.get("Instrument")))
-                        pass
-                else:
-                    # print("#debug:Line No:",csv_dict_reader.line_num)
-                    print("#Instrument {} is not intraday MIS".format(row.get("Instrument")))
-                    print("#Debug:Product type is {}".format(row.get("Product")))
+                        # print("#debug:Line No:",csv_dict_reader.line_num)
+                        print("#Instrument {} is not intraday MIS".format(row.get("Instrument")))
+                        print("#Debug:Product type is {}".format(row.get("Product")))
     except Exception as e:
         print("Exception:", e)
     if len(allOrders) < 1:
@@ -111,14 +131,20 @@ def isProductMIS(row):
     else:
         return False
 
-def isInstrumentinFO(row):
+def isOrderComplete(row):
+    """Checks if order Status is COMPLETE. Returns False for REJECTED, CANCELLED, OPEN etc."""
+    return row.get("Status", "").strip().upper() == "COMPLETE"
+
+def isInstrumentinFO(row, lookuptable=None, interactive=True):
     """Checks to see if Instrument is in the segment we use to do intraday trade. Example: F&O segment
     returns True if Instrument is in segment.
-    Else asks user input
+    Else asks user input (returns False without asking if interactive is False)
         If to update the segment list with new Instrument name and return True
-        Else return False"""
+        Else return False
+    The lookuptable is loaded from the JSON file if not given"""
     foFilename = getConfigData("FnOListJsonFileName")
-    lookuptable = stockfinder.loadFoJson(foFilename)
+    if lookuptable is None:
+        lookuptable = stockfinder.loadFoJson(foFilename)
     if lookuptable == None or len(lookuptable) < 1:
         print('Warning! No Lookup Table to search correct Stock symbols!')
         return False
@@ -128,6 +154,8 @@ def isInstrumentinFO(row):
         return True
     else:
         print("# Debug:{} is not found in the Segment we trade.".format(row["Instrument"]))
+        if not interactive:
+            return False
         choice = input("Update the Segment list with this new Instrument?(Y/N): ")
         if len(choice) < 1 or (choice.upper() == "N"):
             return False
@@ -139,10 +167,14 @@ def isInstrumentinFO(row):
                 print('JSON file',foFilename,'could not be updated with new symbol:',newInstrument)
     return True
 
+def getOrderDate(row):
+    """Returns the date of the order (row) as ISO string. Example: 2020-11-27"""
+    return row['Time'].strip().split(" ")[0]
+
 def isTodaysOrder(row):
     '''Checks if the order (row) in the csv file is today's order
     and returns True if date of order is today, else returns False.'''
-    orderDateString = row['Time'].strip().split(" ")[0]
+    orderDateString = getOrderDate(row)
     orderDate = datetime.date.fromisoformat(orderDateString)
     if orderDate == datetime.date.today():
         return True
@@ -150,8 +182,13 @@ def isTodaysOrder(row):
         print('Warning: Order date:{} in the CSV file. The data is not today\'s order. Possible old Orders.csv file'.format(orderDateString))
         return False
 
-def createNewOrder(row):
-    """Creates a new open order and returns it as a dictionary"""
+def getFilledQuantity(row):
+    """Returns the filled quantity of the order as int. Qty. of 3/5 is 3 filled out of 5"""
+    return int(row["Qty."].strip().split("/")[0])
+
+def createNewOrder(row, quantity=None):
+    """Creates a new open order and returns it as a dictionary.
+    quantity overrides the filled quantity in row when only part of the order opens a new leg"""
     newOrder = {}
     #Extract and add the "date" from row[Time] (format "2020-11-27 14:05:26")
     date_ , entry = row["Time"].strip().split(" ")
@@ -167,7 +204,9 @@ def createNewOrder(row):
     #Extract and add "name" from row[Instrument]
     newOrder["name"] = row["Instrument"].strip().upper()
     #Extract and "quantity" from row[Qty.] (format"3/3")
-    newOrder["quantity"] = row["Qty."].strip().split("/")[0]
+    if quantity is None:
+        quantity = getFilledQuantity(row)
+    newOrder["quantity"] = str(quantity)
     #Extract from row[Avg. price] and add either "sell" or "buy" price based on "trade"
     if newOrder["trade"] == "SHORT":
         newOrder["sell"] = row["Avg. price"].strip()
@@ -175,24 +214,51 @@ def createNewOrder(row):
         newOrder["buy"] = row["Avg. price"].strip() 
     return newOrder
 
-def checkIfOpenOrderExists(row, allOrders):
-    """Checks to see if the order details in row dictionary has a matching open order already created.
-    if there is a matching open order then it returns the ID (>0).
-    Else returns False"""
-    if len(allOrders) < 1:
-        return False #No open orders exist
-    for orderID in allOrders:
-        oldOrder = allOrders[orderID]
-        if "exit" in oldOrder:
-            continue #skip already squared-off trades/orders
-        #Check if the Intrument name and position size has a match in existing orders
-        if (row["Instrument"].strip() == oldOrder["name"]) and (row["Qty."].strip().split("/")[0] == oldOrder["quantity"]):
-            #Check if the matched combination has opposite order type/1st leg of the trade entered.
-            if row["Type"].strip().upper() == "SELL" and oldOrder["trade"] == "LONG":
-                return orderID #An open order exists for this combination
-            elif row["Type"].strip().upper() == "BUY" and oldOrder["trade"] == "SHORT":
-                return orderID #An open order exists for this combination
-    return False #No match found
+def matchOrder(row, allOrders, openLegs):
+    """Matches the order in row against the open legs of the same Instrument on the opposite side.
+    openLegs maps (Instrument, trade) to a FIFO queue of open order IDs in allOrders.
+    Open legs are squared-off oldest first. A leg larger than the remaining quantity is split, so
+    the squared-off part keeps its orderID and the rest stays open under a new orderID.
+    Any quantity left after all open legs are squared-off opens a new leg."""
+    name = row["Instrument"].strip().upper()
+    if row["Type"].strip().upper() == "SELL":
+        trade, opposite = "SHORT", "LONG"
+    else:
+        trade, opposite = "LONG", "SHORT"
+    remaining = getFilledQuantity(row)
+    queue = openLegs.get((name, opposite))
+    while queue and remaining > 0:
+        orderID = queue[0]
+        openQty = int(allOrders[orderID]["quantity"])
+        if openQty > remaining: #scale-out. Keep the unmatched quantity open as a new leg
+            openOrder = dict(allOrders[orderID])
+            openOrder["quantity"] = str(openQty - remaining)
+            newID = str(len(allOrders)+1)
+            allOrders[newID] = openOrder
+            allOrders[orderID]["quantity"] = str(remaining)
+            queue[0] = newID
+            openQty = remaining
+        else:
+            queue.popleft()
+        squareOffOrder(orderID, row, allOrders)
+        remaining -= openQty
+    if remaining > 0: #scale-in or a fresh entry
+        newOrder = createNewOrder(row, remaining)
+        id = str(len(allOrders)+1)
+        allOrders[id] = newOrder
+        openLegs.setdefault((name, trade), deque()).append(id)
+    return
+
+def getOpenLegs(allOrders):
+    """Rebuilds the FIFO queues of open order IDs used by matchOrder from previously
+    matched orders, so that matching can resume on a partly processed day"""
+    openLegs = {}
+    for orderID in sorted(allOrders, key=int):
+        order = allOrders[orderID]
+        if "exit" in order:
+            continue
+        openLegs.setdefault((order["name"], order["trade"]), deque()).append(orderID)
+    return openLegs
 
 def squareOffOrder(orderID, row, allOrders):
     """Squares off an open order with orderID in allOrders dictionary by getting trade details from row"""
@@ -204,9 +270,23 @@ def squareOffOrder(orderID, row, allOrders):
         allOrders[orderID]['buy'] = row['Avg. price'].strip() #buy price
     return
 
+def tagStrategies(allOrders):
+    '''Assigns Strategy names to orders in allOrders dictionary using the strategy rules in config file.
+    Returns the list of orderIDs that matched no rule'''
+    rules = strategyRules.loadStrategyRules(getKiteConfig())
+    tagged = strategyRules.tagStrategies(allOrders, rules)
+    for orderID, strategy in tagged.items():
+        allOrders[orderID]['strategy'] = strategy
+    if len(tagged) > 0:
+        print('{0} of {1} orders tagged by strategy rules'.format(len(tagged), len(allOrders)))
+    return [orderID for orderID in allOrders if orderID not in tagged]
+
 def assignStrategies(allOrders):
-    '''Assigns predefined Strategy names from config file based on user action to orders
-    present in allOrders dictionary'''
+    '''Assigns predefined Strategy names from config file to orders present in allOrders dictionary.
+    Orders are first tagged by the strategy rules. The user is asked only for orders that match no rule'''
+    untagged = tagStrategies(allOrders)
+    if len(untagged) < 1:
+        return
     strategyList = getConfigData('strategies').strip().split(",")
     strategyID = getConfigData('strategiesID').strip().split("/")
     defaultStrategy = getConfigData('strategiesDefault').strip()
@@ -215,13 +295,13 @@ def assignStrategies(allOrders):
         print(strategy)
     print('The Default Strategy is', defaultStrategy)
     #Loop through orders
-    for orderID in allOrders:
+    for orderID in untagged:
         closedOrder = allOrders[orderID]
         print(orderID,".",end=" ")
         for key, val in closedOrder.items():
             print("{0}:{1}".format(key,val),end=" ")
         print("")
-        choice = input('Assign Strategy ('+getConfigData('strategiesID').strip()+'): ')
+        choice = input('Assign Strategy ('+'/'.join(strategyID)+'): ')
         if len(choice.strip()) < 1 or choice.strip().upper() not in strategyID:
             closedOrder['strategy'] = defaultStrategy
             print('Assigning Default Strategy:',defaultStrategy)
@@ -245,10 +325,19 @@ def closedTrades(trades):
         ctr+= 1
         pnl = pnl + displayClosedTrade(trades,tradeID)
     if ctr == 0: print('No closed trades')
-    else: print('Squared-off PnL:',round(pnl,2))
+    else:
+        print('Squared-off PnL:',round(pnl,2))
+        print('Net PnL after charges:',round(getNetPnL(trades),2))
     input('Press Enter key to continue.')
     return
 
+def getNetPnL(trades):
+    """Returns the net PnL of the squared-off trades after intraday taxes and charges"""
+    closed = [trade for trade in trades.values() if 'exit' in trade]
+    charges = brokerageCalculator.getChargesBatch([trade['buy'] for trade in closed],
+        [trade['sell'] for trade in closed], [trade['quantity'] for trade in closed])
+    return float(charges['net'].sum())
+
 def displayClosedTradeHeader():
     print('{0:>4}{1:^12}{2:<5}{3:<7}{4:<10}{5:<9}{6:>5}{7:>8}{8:>8}{9:>10}'.format('ID',
     'STOCK','ALGO','TRADE','ENTRY','EXIT','QTY','BUY','SELL','P/L'))
@@ -265,45 +354,33 @@ def displayClosedTrade(trades,id):
     round(buy,2),round(sell,2),pl))
     return pl #return PnL after display.
 
-def loadJSON():
-    """Initiliazes a json or loads the already saved json from file
-    and returns the json"""
-    #Get today's date to name files for the day's operation.
-    fname = datetime.date.today().isoformat()+'.json'
-    # print('# DEBUG: today',fname)
-    dataDirectory = getDataDirectory()
-    # print('# DEBUG: pathname',pathname)
-    fullpath = os.path.join(dataDirectory,fname)
-    #if json already created for the day, then load the saved trade data from JSON
-    if os.path.exists(fullpath):
-        print('File for the day exists:',fullpath)
-        try:
-            fhandle = open(fullpath,'r')
-        except Exception as e:
-            print('Error opening file:',fhandle)
-            print(e)
-            return None
-        data = fhandle.read()
-        if len(data)<1:
-            print('0 data in file.')
-            return {}
-        trades = json.loads(data)
-        #print('# DEBUG: type(trades):',type(trades))
-        fhandle.close()
-        return trades
-    #else return empty DICT to start the day's trade entries
-    print('No file created for the day yet')
-    trades ={}
+def getJournal():
+    """Opens the trade journal database (see tradeJournal) configured for KiteOrders"""
+    return tradeJournal.openJournal(os.path.join(getDataDirectory(), getConfigData("journalFileName")))
+
+def loadTrades(journal, tradeDate=None):
+    """Loads the trades already journaled for tradeDate (ISO string, defaults to today):
+    the squared-off trades followed by the legs that are still open"""
+    if tradeDate is None:
+        tradeDate = datetime.date.today().isoformat()
+    trades = tradeJournal.queryTrades(journal, tradeDate, tradeDate)
+    for openLeg in tradeJournal.loadOpenLegs(journal, tradeDate).values():
+        trades[str(len(trades)+1)] = openLeg
     return trades
 
-def saveJSON(trades):
-    """Saves the data to be serilaized into a file with today's date as filename
-    and extension as .json"""
-    fname = datetime.date.today().isoformat()+'.json'
-    pathname = getDataDirectory()
-    fullPath = os.path.join(pathname,fname)
-    with open(fullPath,'w') as jsonfile:
-        json.dump(trades,jsonfile,indent=6)
+def saveTrades(journal, trades, tradeDate=None, fills=()):
+    """Appends the squared-off trades to the journal and saves the open legs for tradeDate.
+    The high-water-mark is moved past the fills (rows sorted by Time) the trades were matched from
+    in the same commit, so a later --ingest of the tradebook does not journal them again"""
+    if tradeDate is None:
+        tradeDate = datetime.date.today().isoformat()
+    tradeJournal.appendTrades(journal, trades, commit=False)
+    tradeJournal.saveOpenLegs(journal, tradeDate, trades, commit=False)
+    if len(fills) > 0:
+        watermark, seenFills = getWatermark(journal)
+        newWatermark, newSeenFills = advanceWatermark(watermark, seenFills, fills)
+        saveWatermark(journal, newWatermark, newSeenFills)
+    journal.commit()
     return
 
 def writeCSV(trades):
@@ -364,19 +441,153 @@ def initializeStockLookupTable():
     print('JSON file with F&O segment stock hashtable created:',os.getcwd()+'\\'+fname)
     return
 
+def getFillKey(row):
+    """Returns the key that tells fills with the same Time apart: the Order ID if the tradebook
+    has one, else the Time, Type, Instrument, Qty. and Avg. price of the fill"""
+    if row.get("Order ID"):
+        return row["Order ID"].strip()
+    return "|".join(row.get(column, "").strip() for column in ("Time","Type","Instrument","Qty.","Avg. price"))
+
+def getWatermark(journal):
+    """Returns the ingest high-water-mark: the Time of the newest fill journaled (None if nothing
+    has been journaled yet) and the keys (see getFillKey) of the fills journaled at that Time"""
+    watermark = tradeJournal.getMeta(journal, "watermark")
+    seenFills = tradeJournal.getMeta(journal, "watermarkFills")
+    return watermark, json.loads(seenFills) if seenFills else []
+
+def saveWatermark(journal, watermark, seenFills):
+    """Saves the high-water-mark (see getWatermark) without committing"""
+    tradeJournal.setMeta(journal, "watermark", watermark, commit=False)
+    tradeJournal.setMeta(journal, "watermarkFills", json.dumps(seenFills), commit=False)
+    return
+
+def getNewFills(rows, watermark, seenFills):
+    """Returns the rows (sorted by Time) after the high-water-mark. Kite times are only to the second,
+    so rows at the watermark Time are kept unless their key is in seenFills"""
+    if watermark is None:
+        return rows
+    seen = Counter(seenFills)
+    newRows = []
+    for row in rows:
+        time = row['Time'].strip()
+        if time < watermark:
+            continue
+        if time == watermark:
+            key = getFillKey(row)
+            if seen[key] > 0:
+                seen[key] -= 1
+                continue
+        newRows.append(row)
+    return newRows
+
+def advanceWatermark(watermark, seenFills, rows):
+    """Returns the high-water-mark (watermark, seenFills) moved past the rows (sorted by Time)"""
+    lastFill = rows[-1]['Time'].strip()
+    if watermark is not None and lastFill < watermark:
+        return watermark, seenFills
+    lastKeys = [getFillKey(row) for row in rows if row['Time'].strip() == lastFill]
+    if lastFill == watermark:
+        return watermark, seenFills + lastKeys
+    return lastFill, lastKeys
+
+def iterDailyOrders(ordersFilePath):
+    """Streams the orders csv file and yields (date, rows) for each trading date with the rows sorted by Time.
+    Tradebook exports from Kite are grouped by date (newest or oldest first), so only one day
+    of rows is held in memory at a time. Raises ValueError if the rows of a date are not together
+    (Example: two exports concatenated), as that date would be matched twice"""
+    seenDates = set()
+    with open(ordersFilePath,"r") as csvfile:
+        csv_dict_reader = csv.DictReader(csvfile, delimiter=',')
+        for orderDate, rows in groupby(csv_dict_reader, key=getOrderDate):
+            if orderDate in seenDates:
+                raise ValueError('Orders of {0} are not together in {1}. Sort the tradebook by Time'.format(orderDate, ordersFilePath))
+            seenDates.add(orderDate)
+            yield orderDate, sorted(rows, key=itemgetter('Time'))
+
+def ingestOrders(ordersFilePath=None):
+    """Ingests a multi-day tradebook into the journal without prompting. Fills up to the saved
+    high-water-mark are skipped, the rest are matched day by day. A day that already has journaled
+    trades is skipped, unless it is the day the high-water-mark is in. Trades are tagged by
+    the strategy rules, or assigned the default strategy if no rule matches. The trades and
+    the new high-water-mark are committed together. Returns the number of days updated"""
+    if ordersFilePath is None:
+        ordersFilePath = getOrdersFilepath()
+    journal = getJournal()
+    watermark, seenFills = getWatermark(journal)
+    newWatermark, newSeenFills = watermark, seenFills
+    defaultStrategy = getConfigData('strategiesDefault').strip()
+    lookuptable = stockfinder.loadFoJson(getConfigData("FnOListJsonFileName"))
+    daysUpdated = 0
+    for orderDate, rows in iterDailyOrders(ordersFilePath):
+        rows = getNewFills(rows, watermark, seenFills)
+        if len(rows) < 1:
+            continue
+        profiler.rows(len(rows))
+        newWatermark, newSeenFills = advanceWatermark(newWatermark, newSeenFills, rows)
+        #Resume the open legs of the day the last ingest stopped in. Any other day is matched afresh
+        if watermark is not None and orderDate == watermark.split(" ")[0]:
+            allOrders = tradeJournal.loadOpenLegs(journal, orderDate)
+        elif tradeJournal.hasTrades(journal, orderDate):
+            print('Trades for {} already in journal. Skipping it'.format(orderDate))
+            continue
+        else:
+            allOrders = {}
+        openLegs = getOpenLegs(allOrders)
+        for row in rows:
+            if isOrderComplete(row) and isProductMIS(row) and isInstrumentinFO(row, lookuptable, interactive=False):
+                matchOrder(row, allOrders, openLegs)
+        for orderID in tagStrategies(allOrders):
+            allOrders[orderID]['strategy'] = defaultStrategy
+        if len(allOrders) > 0:
+            tradeJournal.appendTrades(journal, allOrders, commit=False)
+            tradeJournal.saveOpenLegs(journal, orderDate, allOrders, commit=False)
+            daysUpdated += 1
+        print('{0}: {1} fills, {2} trades'.format(orderDate, len(rows), len(allOrders)))
+    if (newWatermark, newSeenFills) != (watermark, seenFills):
+        saveWatermark(journal, newWatermark, newSeenFills)
+        journal.commit()
+        print('Ingested fills up to', newWatermark)
+    else:
+        print('No new fills in', ordersFilePath)
+    return daysUpdated
+
 def mainloop():
     """Main loop to execute this as standalone program"""
     initializeStockLookupTable()
-    allOrders = loadJSON() #Load any previously parsed and saved data for the day
+    journal = getJournal()
+    allOrders = loadTrades(journal) #Load any previously parsed and journaled trades for the day
     if len(allOrders) < 1: #if not previously saved orders for the day is found
-        allOrders = getOrders() #Get orders for the day
-        if len(allOrders) > 0: assignStrategies(allOrders)
+        fills = []
+        allOrders = getOrders(fills) #Get orders for the day
+        if len(allOrders) > 0:
+            assignStrategies(allOrders)
+            saveTrades(journal, allOrders, fills=fills)
     closedTrades(allOrders)
-    saveJSON(allOrders)
     if len(allOrders) > 0:
         choice = input("Generate consolidated CSV file for the day(Y/N): ")
         if len(choice.strip()) < 1 or choice.strip().upper() == "Y":
             writeCSV(allOrders)
     return
 
-mainloop()
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description='Kite orders trade journal')
+    parser.add_argument('-i', '--ingest', action='store_true', default=False,
+        help='Ingest a multi-day tradebook without prompting. Only fills newer than the last ingest are processed')
+    parser.add_argument('-f', '--file', default=None, help='Tradebook csv file to ingest. Default is ordersFileName in config.ini')
+    profiler.addArgument(parser)
+    args = parser.parse_args()
+    if profiler.enableFromArgs(args):
+        module = sys.modules[__name__]
+        profiler.instrument(module, 'getOrders', 'kiteOrders.getOrders')
+        profiler.instrument(module, 'ingestOrders', 'kiteOrders.ingestOrders')
+    if args.ingest:
+        try:
+            ingestOrders(args.file)
+        except ValueError as e:
+            print('Tradebook not ingested:', e)
+    else:
+        mainloop()
+    return
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""
+Live tick pipeline for the ORB: 1-minute bars, running opening range and breakout events.
+
+Ticks are (symbol, time, price, volume) tuples, with time in seconds since the epoch (as time.time()).
+A feed is any async iterable of lists of ticks in time order, so a broker websocket only needs an
+async generator that yields the ticks it received since the last batch. Two feeds are included:
+
+replayFeed     replays a CSV of ticks (SYMBOL, TIME, PRICE and optional VOLUME) at a speed multiple
+               of real time, or as fast as possible with speed 0
+simulatedFeed  a random walk from the previous close of every stock, for testing without a feed
+
+The feed runs as a producer task putting batches on an asyncio queue, and the consumer updates the
+engine one batch at a time:
+
+* Every tick updates the current 1-minute bar of its stock. A finished bar is passed to the onBar
+  callback (Example: written to a CSV in the orbBacktest minute bar layout).
+* Ticks within the first rangeWindow minutes from sessionStart update the running opening range.
+* On the first tick after the range, the range of every stock is scanned with orbScanner.scanORB
+  (price band, ranking and PSIZE = risk / range as in NSE-ORB.py) and a RANGE event lists the
+  candidates. From then on a BREAKOUT event fires the first time a long candidate trades above its
+  range high or a short candidate below its range low.
+
+The state of a stock is one list, and a batch is processed in a single loop, which keeps up with
+hundreds of thousands of ticks per second on one core.
+
+Usage:
+    python liveTicks.py --replay ticks.csv -p data/scanner/cm23MAR2021bhav.csv [--speed 10] [--bars bars.csv]
+    python liveTicks.py --simulate [--rate 2000] [--minutes 30] [--speed 0]
+"""
+import numpy as np
+import pandas as pd
+import sys
+import csv
+import time
+import asyncio
+import argparse
+import configparser
+import orbScanner
+import openingRange
+
+#positions in the state list of a stock
+OPEN, RANGE_HIGH, RANGE_LOW, BAR_MINUTE, BAR_OPEN, BAR_HIGH, BAR_LOW, BAR_CLOSE, BAR_VOLUME = range(9)
+BAR_COLUMNS = ['SYMBOL','TIME','OPEN','HIGH','LOW','CLOSE','VOLUME']
+
+def getSessionStart(tickTime, timezone, sessionStart='09:15'):
+    '''Returns the session start (seconds since the epoch) of the day of a tick in timezone'''
+    day = pd.Timestamp(tickTime, unit='s', tz='UTC').tz_convert(timezone).strftime('%Y-%m-%d')
+    return pd.Timestamp(day + ' ' + sessionStart, tz=timezone).timestamp()
+
+def newEngine(prevClose, risk, numLongStocks, numShortStocks, rangeWindow=15, sessionStart='09:15',
+        timezone='Asia/Kolkata', lowerPriceLimit=30, upperPriceLimit=3000, onBar=None, minRangePercent=0):
+    '''Returns the engine state. prevClose is a Series of previous close prices indexed by SYMBOL.
+    onBar(symbol, minuteTime, [open, high, low, close, volume]) is called for every finished bar.
+    minRangePercent is the range filter of orbScanner.scanORB'''
+    return {'prevClose': prevClose, 'risk': risk, 'numLongStocks': numLongStocks, 'numShortStocks': numShortStocks,
+        'rangeWindow': rangeWindow, 'sessionStart': sessionStart, 'timezone': timezone,
+        'lowerPriceLimit': lowerPriceLimit, 'upperPriceLimit': upperPriceLimit, 'minRangePercent': minRangePercent, 'onBar': onBar,
+        'start': None, 'stocks': {}, 'watch': None, 'ticks': 0}
+
+def closeRange(engine, tickTime):
+    '''Scans the opening range of every stock for ORB candidates. Sets the stocks to watch for a
+    breakout and returns the RANGE event'''
+    stocks = engine['stocks']
+    symbols = [symbol for symbol in stocks if symbol in engine['prevClose'].index]
+    rangeDF = pd.DataFrame({'OPEN': [stocks[symbol][OPEN] for symbol in symbols],
+        'HIGH': [stocks[symbol][RANGE_HIGH] for symbol in symbols],
+        'LOW': [stocks[symbol][RANGE_LOW] for symbol in symbols],
+        'PREV CLOSE': engine['prevClose'].reindex(symbols).to_numpy(dtype=float)}, index=pd.Index(symbols, name='SYMBOL'))
+    longDF, shortDF = orbScanner.scanORB(rangeDF, engine['risk'], engine['numLongStocks'], engine['numShortStocks'],
+        engine['lowerPriceLimit'], engine['upperPriceLimit'], verbose=False, minRangePercent=engine['minRangePercent'])
+    #symbol -> [side, psize, range high, range low]
+    engine['watch'] = {}
+    for side, df in (('BUY', longDF), ('SELL', shortDF)):
+        for symbol, row in df.iterrows():
+            engine['watch'][symbol] = [side, int(row['PSIZE']), float(row['HIGH']), float(row['LOW'])]
+    return {'type': 'RANGE', 'time': tickTime, 'long': longDF, 'short': shortDF}
+
+def processTicks(engine, ticks):
+    '''Updates the bars, opening ranges and breakouts with a batch of ticks. Returns the events'''
+    events = []
+    stocks = engine['stocks']
+    onBar = engine['onBar']
+    rangeWindow = engine['rangeWindow']
+    start = engine['start']
+    watch = engine['watch']
+    for symbol, tickTime, price, volume in ticks:
+        if start is None:
+            start = engine['start'] = getSessionStart(tickTime, engine['timezone'], engine['sessionStart'])
+        minute = int((tickTime - start) // 60)
+        if minute < 0: #pre-open
+            continue
+        state = stocks.get(symbol)
+        if state is None:
+            state = stocks[symbol] = [price, price, price, minute, price, price, price, price, volume]
+        elif minute != state[BAR_MINUTE]:
+            if onBar is not None:
+                onBar(symbol, start + state[BAR_MINUTE] * 60, state[BAR_OPEN:])
+            state[BAR_MINUTE:] = [minute, price, price, price, price, volume]
+        else:
+            if price > state[BAR_HIGH]: state[BAR_HIGH] = price
+            elif price < state[BAR_LOW]: state[BAR_LOW] = price
+            state[BAR_CLOSE] = price
+            state[BAR_VOLUME] += volume
+
+        if minute < rangeWindow:
+            if price > state[RANGE_HIGH]: state[RANGE_HIGH] = price
+            elif price < state[RANGE_LOW]: state[RANGE_LOW] = price
+            continue
+        if watch is None:
+            events.append(closeRange(engine, tickTime))
+            watch = engine['watch']
+        candidate = watch.get(symbol)
+        if candidate is None:
+            continue
+        side, psize, rangeHigh, rangeLow = candidate
+        if (side == 'BUY' and price > rangeHigh) or (side == 'SELL' and price < rangeLow):
+            events.append({'type': 'BREAKOUT', 'time': tickTime, 'symbol': symbol, 'side': side, 'price': price,
+                'high': rangeHigh, 'low': rangeLow, 'psize': psize})
+            del watch[symbol] #one breakout per stock
+    engine['ticks'] += len(ticks)
+    return events
+
+def flushBars(engine):
+    '''Passes the bars still open (end of the feed) to onBar'''
+    if engine['onBar'] is None:
+        return
+    for symbol, state in engine['stocks'].items():
+        engine['onBar'](symbol, engine['start'] + state[BAR_MINUTE] * 60, state[BAR_OPEN:])
+
+async def pacedFeed(batches, speed=0):
+    '''Async feed of an iterable of tick batches. With speed > 0 a batch is held back until its first
+    tick is due at speed times real time. With speed 0 the batches are fed as fast as they are taken'''
+    firstTick = clockStart = None
+    for ticks in batches:
+        if len(ticks) < 1:
+            continue
+        if speed > 0:
+            if firstTick is None:
+                firstTick, clockStart = ticks[0][1], time.perf_counter()
+            delay = (ticks[0][1] - firstTick) / speed - (time.perf_counter() - clockStart)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            await asyncio.sleep(0) #let the consumer run
+        yield ticks
+
+def readTickBatches(fileName, timezone='Asia/Kolkata', batchSize=1000):
+    '''Reads a CSV of ticks with columns SYMBOL, TIME (Example: 2021-03-24 09:15:03, in timezone),
+    PRICE and optional VOLUME. Returns a list of tick batches in time order'''
+    ticksDF = pd.read_csv(fileName, thousands=',')
+    times = pd.to_datetime(ticksDF['TIME'], format='mixed')
+    if times.dt.tz is None:
+        times = times.dt.tz_localize(timezone)
+    seconds = (times.dt.tz_convert('UTC').dt.tz_localize(None) - pd.Timestamp(0)).dt.total_seconds().to_numpy()
+    order = np.argsort(seconds, kind='stable')
+    volumes = ticksDF['VOLUME'].to_numpy() if 'VOLUME' in ticksDF.columns else np.zeros(len(ticksDF), dtype=int)
+    ticks = list(zip(ticksDF['SYMBOL'].str.strip().str.upper().to_numpy()[order].tolist(), seconds[order].tolist(),
+        ticksDF['PRICE'].to_numpy(dtype=float)[order].tolist(), volumes[order].tolist()))
+    return [ticks[index:index + batchSize] for index in range(0, len(ticks), batchSize)]
+
+def replayFeed(fileName, speed=0, timezone='Asia/Kolkata'):
+    '''Feed replaying a CSV of ticks (see readTickBatches)'''
+    return pacedFeed(readTickBatches(fileName, timezone), speed)
+
+def simulateTicks(prevClose, start, minutes=30, ticksPerSecond=2000, seed=None):
+    '''Yields one batch of ticks per second from start (seconds since the epoch) for minutes: a random
+    walk of the stocks in prevClose opening with a small gap. Stocks trade at random'''
+    rng = np.random.default_rng(seed)
+    symbols = list(prevClose.index)
+    prices = prevClose.to_numpy(dtype=float) * (1 + rng.normal(0, 0.01, size=len(symbols)))
+    #about 0.1% volatility per minute whatever the tick rate
+    sigma = 0.001 / np.sqrt(max(ticksPerSecond * 60 / len(symbols), 1))
+    for second in range(minutes * 60):
+        traded = rng.integers(0, len(symbols), size=ticksPerSecond)
+        np.multiply.at(prices, traded, 1 + rng.normal(0, sigma, size=ticksPerSecond))
+        tickTimes = start + second + np.sort(rng.random(ticksPerSecond))
+        yield list(zip([symbols[index] for index in traded.tolist()], tickTimes.tolist(),
+            np.round(prices[traded], 2).tolist(), rng.integers(1, 500, size=ticksPerSecond).tolist()))
+
+def simulatedFeed(prevClose, start, minutes=30, ticksPerSecond=2000, speed=0, seed=None):
+    '''Feed of simulated ticks (see simulateTicks)'''
+    return pacedFeed(simulateTicks(prevClose, start, minutes, ticksPerSecond, seed), speed)
+
+async def runPipeline(feed, engine, onEvent, queueSize=100):
+    '''Runs the feed into the engine until the feed ends. onEvent is called with every event'''
+    queue = asyncio.Queue(maxsize=queueSize)
+
+    async def produce():
+        async for ticks in feed:
+            await queue.put(ticks)
+        await queue.put(None)
+
+    async def consume():
+        while True:
+            ticks = await queue.get()
+            if ticks is None:
+                break
+            for event in processTicks(engine, ticks):
+                onEvent(event)
+
+    await asyncio.gather(produce(), consume())
+    flushBars(engine)
+
+def getBarWriter(csvfile, timezone='Asia/Kolkata'):
+    '''Returns an onBar callback writing the bars as CSV rows with columns BAR_COLUMNS'''
+    csvwriter = csv.writer(csvfile)
+    csvwriter.writerow(BAR_COLUMNS)
+    minuteNames = {}
+    def writeBar(symbol, minuteTime, bar):
+        if minuteTime not in minuteNames:
+            minuteNames[minuteTime] = pd.Timestamp(minuteTime, unit='s', tz='UTC').tz_convert(timezone).strftime('%Y-%m-%d %H:%M:%S')
+        csvwriter.writerow([symbol, minuteNames[minuteTime]] + bar)
+    return writeBar
+
+def displayEvent(event, timezone='Asia/Kolkata'):
+    clock = pd.Timestamp(event['time'], unit='s', tz='UTC').tz_convert(timezone).strftime('%H:%M:%S')
+    if event['type'] == 'RANGE':
+        print('\n{0} OPENING RANGE CLOSED'.format(clock))
+        orbScanner.displayCandidates(event['long'], event['short'])
+        print()
+    else:
+        print('{0} {1:<4} {2:<12} PSIZE {3:>6}  price {4:.2f} range {5:.2f}-{6:.2f}'.format(clock, event['side'],
+            event['symbol'], event['psize'], event['price'], event['low'], event['high']))
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    ORBConfig = config['ORBScanner']
+    liveConfig = config['LiveTicks']
+
+    parser = argparse.ArgumentParser(description='Live ORB breakouts from a tick feed')
+    feedGroup = parser.add_mutually_exclusive_group(required=True)
+    feedGroup.add_argument('--replay', default=None, metavar='FILE', help='Replay a CSV of ticks with columns SYMBOL,TIME,PRICE[,VOLUME]')
+    feedGroup.add_argument('--simulate', action='store_true', default=False, help='Simulated ticks from the previous close')
+    parser.add_argument('-p', '--prev', default=None,
+        help='Previous trading day bhavcopy CSV file for PREV CLOSE. Default is PREV CLOSE of the latest market watch snapshot')
+    parser.add_argument('-w', '--window', type=int, default=liveConfig.getint('rangeWindow', 15), help='Opening range in minutes. Default is %(default)s')
+    parser.add_argument('--speed', type=float, default=0, help='Replay speed as a multiple of real time. 0 is as fast as possible (default)')
+    parser.add_argument('--rate', type=int, default=liveConfig.getint('simulateRate', 2000), help='Simulated ticks per second. Default is %(default)s')
+    parser.add_argument('--minutes', type=int, default=30, help='Simulated minutes from the session start. Default is %(default)s')
+    parser.add_argument('--bars', default=None, metavar='FILE', help='Write the 1-minute bars to a CSV file')
+    args = parser.parse_args()
+
+    timezone = liveConfig.get('timezone', 'Asia/Kolkata')
+    sessionStart = ORBConfig.get('sessionStart', '09:15')
+    if args.prev:
+        prevClose = openingRange.loadPrevClose(args.prev)
+    else:
+        snapshots = orbScanner.getSnapshotFiles(ORBConfig['foldername'], ORBConfig['csvfileprefix'])
+        if len(snapshots) < 1:
+            print('No market watch snapshot in {}. Give the previous bhavcopy with -p'.format(ORBConfig['foldername']))
+            sys.exit()
+        prevClose = orbScanner.loadMarketWatch(snapshots[-1])['PREV CLOSE']
+
+    barFile = open(args.bars, 'w', newline='') if args.bars else None
+    engine = newEngine(prevClose, ORBConfig.getint('risk'), ORBConfig.getint('numoflongstocks'), ORBConfig.getint('numofshortstocks'),
+        args.window, sessionStart, timezone, ORBConfig.getfloat('lowerPriceLimit', 30), ORBConfig.getfloat('upperPriceLimit', 3000),
+        getBarWriter(barFile, timezone) if barFile else None, ORBConfig.getfloat('minRangePercent', 0))
+    if args.replay:
+        feed = replayFeed(args.replay, args.speed, timezone)
+    else:
+        start = pd.Timestamp(pd.Timestamp.now(tz=timezone).strftime('%Y-%m-%d') + ' ' + sessionStart, tz=timezone).timestamp()
+        feed = simulatedFeed(prevClose, start, args.minutes, args.rate, args.speed)
+
+    clockStart = time.perf_counter()
+    try:
+        asyncio.run(runPipeline(feed, engine, lambda event: displayEvent(event, timezone), liveConfig.getint('queueSize', 100)))
+    except KeyboardInterrupt:
+        print('Stopped')
+    seconds = time.perf_counter() - clockStart
+    if barFile:
+        barFile.close()
+        print('1-minute bars written to', args.bars)
+    print('Processed {0} ticks of {1} stocks in {2:.2f}s ({3:.0f} ticks/s)'.format(engine['ticks'], len(engine['stocks']),
+        seconds, engine['ticks'] / seconds if seconds > 0 else 0))
+
+if __name__ == '__main__':
+    main()
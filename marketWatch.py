@@ -0,0 +1,117 @@
+"""
+Typed loader for the NSE live market watch CSV with a parsed cache.
+
+The market watch CSV has 14 columns whose headers carry embedded newlines ("OPEN \\n") and
+numbers with thousands separators. loadMarketWatch reads only the symbol and the price and
+volume columns by position (usecols) as float64, names them as in MARKET_WATCH_COLUMNS and
+normalises the symbols (stripped, upper case).
+
+The parsed columns are cached: in memory for the life of the process (Example: the ORB watch
+mode) and on disk next to the snapshot (<folder>/.mwcache/<file>.npz). A cache entry is used when
+the snapshot has the same size and mtime, or the same content hash (a snapshot downloaded again),
+so repeated scans of the same snapshot skip parsing completely.
+
+Usage:
+    python marketWatch.py data/scanner/MW-SECURITIES-IN-F&O-24-Mar-2021.csv
+"""
+import numpy as np
+import pandas as pd
+import os
+import hashlib
+import argparse
+
+#Column names from NSE website has \n and other characters. keeping it simple
+MARKET_WATCH_COLUMNS = ['SYMBOL','OPEN', 'HIGH', 'LOW', 'PREV CLOSE', 'LTP', 'CHNG',
+       '%CHNG', 'VOLUME', 'VALUE', '52W H', '52W L',
+       '365 D', '30 D']
+
+#columns parsed (and cached) from every snapshot. The rest are never read
+PARSED_COLUMNS = ['OPEN', 'HIGH', 'LOW', 'PREV CLOSE', 'LTP', 'VOLUME']
+
+CACHE_FOLDER = '.mwcache'
+
+#path -> (size, mtime, hash, DataFrame) of the snapshots parsed by this process
+MEMORY_CACHE = {}
+
+def getFileHash(fileName):
+    '''Returns the BLAKE2 hash of the file content as a hex string'''
+    digest = hashlib.blake2b(digest_size=16)
+    with open(fileName, 'rb') as snapshot:
+        for block in iter(lambda: snapshot.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def getCachePath(fileName):
+    '''Returns the disk cache file of a snapshot'''
+    folderName, baseName = os.path.split(os.path.abspath(fileName))
+    return os.path.join(folderName, CACHE_FOLDER, baseName + '.npz')
+
+def parseMarketWatch(fileName):
+    '''Parses the symbol and PARSED_COLUMNS of a market watch CSV. Returns a DataFrame indexed by SYMBOL'''
+    positions = [0] + [MARKET_WATCH_COLUMNS.index(column) for column in PARSED_COLUMNS]
+    dtypes = {column: np.float64 for column in PARSED_COLUMNS}
+    dtypes['SYMBOL'] = str
+    df = pd.read_csv(fileName, header=0, names=MARKET_WATCH_COLUMNS, usecols=positions, thousands=',',
+        dtype=dtypes, na_values=['-'])
+    df['SYMBOL'] = df['SYMBOL'].str.strip().str.upper()
+    return df.set_index('SYMBOL')[PARSED_COLUMNS]
+
+def readCache(cachePath):
+    '''Returns (size, mtime, hash, DataFrame) from a disk cache file, or None if it cannot be read'''
+    try:
+        with np.load(cachePath) as cache:
+            df = pd.DataFrame(cache['values'], index=pd.Index(cache['symbols'], name='SYMBOL'), columns=list(cache['columns']))
+            return int(cache['size']), int(cache['mtime']), str(cache['hash']), df
+    except (OSError, KeyError, ValueError):
+        return None
+
+def writeCache(cachePath, size, mtime, fileHash, df):
+    '''Writes the parsed snapshot to the disk cache. A cache that cannot be written is skipped'''
+    try:
+        os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+        tmpPath = cachePath + '.tmp.npz'
+        np.savez(tmpPath, symbols=df.index.to_numpy(dtype=str), values=df.to_numpy(dtype=np.float64),
+            columns=np.asarray(df.columns, dtype=str), size=size, mtime=mtime, hash=fileHash)
+        os.replace(tmpPath, cachePath)
+    except OSError as e:
+        print('Could not cache {0}: {1}'.format(cachePath, e))
+
+def getParsed(fileName, useCache=True):
+    '''Returns the parsed snapshot, from the memory or disk cache when the file is unchanged'''
+    if not useCache:
+        return parseMarketWatch(fileName)
+    path = os.path.abspath(fileName)
+    stat = os.stat(path)
+    size, mtime = stat.st_size, stat.st_mtime_ns
+    entry = MEMORY_CACHE.get(path)
+    cachePath = getCachePath(path)
+    if entry is None:
+        entry = readCache(cachePath)
+    if entry is not None and (entry[0], entry[1]) == (size, mtime):
+        MEMORY_CACHE[path] = entry
+        return entry[3]
+
+    #changed mtime or size: parse again unless the content is the same
+    fileHash = getFileHash(path)
+    if entry is not None and entry[0] == size and entry[2] == fileHash:
+        df = entry[3]
+    else:
+        df = parseMarketWatch(path)
+    MEMORY_CACHE[path] = (size, mtime, fileHash, df)
+    writeCache(cachePath, size, mtime, fileHash, df)
+    return df
+
+def loadMarketWatch(fileName, columns=('OPEN', 'HIGH', 'LOW', 'PREV CLOSE'), useCache=True):
+    '''Loads the NSE live market watch CSV file into a DataFrame indexed by SYMBOL with the
+    float columns given (any of PARSED_COLUMNS). The DataFrame is a copy the caller may change'''
+    return getParsed(fileName, useCache)[list(columns)].copy()
+
+def main():
+    parser = argparse.ArgumentParser(description='Load an NSE market watch CSV snapshot')
+    parser.add_argument('fileName', help='Market watch CSV file')
+    parser.add_argument('-n', '--nocache', action='store_true', default=False, help='Parse the file without the cache')
+    args = parser.parse_args()
+    print(loadMarketWatch(args.fileName, PARSED_COLUMNS, not args.nocache).to_string())
+
+if __name__ == '__main__':
+    main()
@@ -22,14 +22,29 @@ import pandas as pd
 import configparser
 import sys
 import os
+import zipfile
 from datetime import timedelta, datetime, date
 import getMarketData
+import candlePatterns
 import urllib3
 import argparse
+import stockfinder
+import bhavStore
+import tradingCalendar
+import ohlcPanel
+import profiler
+import marketWatch
+from concurrent.futures import ProcessPoolExecutor
 urllib3.disable_warnings()
 
 VERBOSE = False
 
+#pattern groups that can be selected from the command line. See candlePatterns.PATTERNS
+PATTERN_GROUPS = ['hammer','marubozu','engulfing','outside','harami','star','soldiers','insidebar']
+
+#the single day scan has only the day and the previous session. Longer patterns need a range scan
+SINGLE_DAY_BARS = 2
+
 def fileValidityCheck(FILE_NAME, IGNORE=False):
     '''Checks to see if a file exists. If not, asks user input for a valid name if IGNORE=True.
         returns a valid filename or None'''
@@ -53,138 +68,181 @@ def getBhavCopyData(index, BHAV):
     bhavDF = bhavDF.loc[index]
     return bhavDF[ bhavDF['SERIES'] == 'EQ' ]
 
-def isTradingHoliday(theDay,holidayList):
-    '''Checks if the theday date is in HolidayList or if it is a weekend and
+def isTradingHoliday(theDay,calendar):
+    '''Checks if the theday date is a trading session in the trading calendar (see tradingCalendar.py)
         returns True if it is a trading holiday. Else returns False'''
-    if theDay.weekday() > 4: #is it a weekend (>4)
-        if VERBOSE: print('{} is a weekend'.format(theDay.strftime('%A, %d %b %Y,')))
-        return True
-    theKeyDay = theDay.strftime('%d-%b-%Y')
-    if theKeyDay in holidayList:
-        if VERBOSE: print(theKeyDay,'is a trading holiday')
-        return True
-    else:
+    if tradingCalendar.isTradingDay(calendar, theDay):
         return False
+    if VERBOSE:
+        if theDay.weekday() > 4: print('{} is a weekend'.format(theDay.strftime('%A, %d %b %Y,')))
+        else: print(theDay.strftime('%d-%b-%Y'),'is a trading holiday')
+    return True
 
-def getPrevTradingDay(yesterday,holidayList):
+def getPrevTradingDay(yesterday,calendar):
     '''Checks if yesterday is a trading day or not. 
     Returns the valid previous trading day as a string of format ddMMMyyyy'''
-    while(isTradingHoliday(yesterday,holidayList)):
-        yesterday = yesterday - timedelta(days=1)
+    yesterday = tradingCalendar.nthTradingDay(calendar, yesterday + timedelta(days=1), -1)
     yesterdayStr = yesterday.strftime('%d%b%Y').upper()
     if VERBOSE: print('Previous trading day:', yesterdayStr)
     return yesterdayStr
 
-def getBullishHammer(df, MULTIPLIER=3):
-    '''Gets stocks that are forming Bullish Hammer pattern. Returns a DataFrame
-    containing stocks which form a bullish Hammer pattern with Multiplier as the 'tail : body' ratio'''
-    print('\nBULLISH HAMMER CANDLESTICK SCAN')
-    print('-------------------------------')
-    if VERBOSE: print('Minimum Tail/Body Ratio = \'{} : 1\''.format(MULTIPLIER))
-    #Both Green (Close>=Open) and Red (OPEN>CLOSE) Dragonfly dojis or hammer candlestick formations
-    dragonFlyDf = df[ (
-                    (df['CLOSE'] >= df['OPEN']) 
-                & ( (df['OPEN'] - df['LOW'] ) > ((df['CLOSE'] - df['OPEN']) * MULTIPLIER) )
-                & ( (df['HIGH'] - df['CLOSE']) < (df['CLOSE'] - df['OPEN']) )
-                ) |
-                (
-                    (df['OPEN'] > df['CLOSE']) 
-                & ( (df['CLOSE'] - df['LOW'] ) > ((df['OPEN'] - df['CLOSE']) * MULTIPLIER) )
-                & ( (df['HIGH'] - df['OPEN']) < (df['OPEN'] - df['CLOSE']) )
-                )
-            ]
-    if len(dragonFlyDf) > 0:
-        if VERBOSE: print('{} stocks show Hammer Candlestick pattern'.format(len(dragonFlyDf)))
-        for stock in dragonFlyDf.index:
-            print(stock)
-    else:
-        print('No stocks with Hammer pattern')
-    
+def getTradingDays(fromDay, toDay, calendar):
+    '''Returns the trading days from fromDay to toDay (both inclusive) as a list of dates'''
+    return list(tradingCalendar.sessionsBetween(calendar, fromDay, toDay).astype(object))
 
-def getBullishMarubozu(bhavcopyDF, SHADOW_RATIO = 0.07):
-    '''Gets stocks that are forming Bullish Marubozu pattern'''
-    print('\nBULLISH MARUBOZU CANDLESTICK SCAN')
-    print('---------------------------------')
-    if VERBOSE: print('Marubozu Shadow to body ratio :',SHADOW_RATIO)
-    marubozuDF = bhavcopyDF.loc[
-     ( bhavcopyDF['CLOSE'] > bhavcopyDF['OPEN'] ) &
-     ((( bhavcopyDF['HIGH'] - bhavcopyDF['CLOSE'] ) / ( bhavcopyDF['CLOSE'] - bhavcopyDF['OPEN'] )) < SHADOW_RATIO ) &
-     ((( bhavcopyDF['OPEN'] - bhavcopyDF['LOW'] ) / ( bhavcopyDF['CLOSE'] - bhavcopyDF['OPEN'] )) < SHADOW_RATIO )
-    ]
-    if len(marubozuDF) > 0:
-        if VERBOSE: print('{} stocks show Bullish Marubozu Candlestick pattern'.format(len(marubozuDF)))
-        for stock in marubozuDF.index:
-            print(stock)
-    else:
-        print('No stocks with Bullish Marubozu pattern')
-
-def getBullishEngulfing(bhavcopyDF,prevBhavFound):
-    '''Gets stocks that are forming Bullish Engulfing pattern'''
-    print('\nBULLISH ENGULFING CANDLESTICK SCAN')
-    print('----------------------------------')
-    if not prevBhavFound:
-        print('Previous trading session data file not found. Cannot scan for Bullish Engulfing pattern')
-        return
-    engulfingDF = bhavcopyDF.loc[
-            ( ( bhavcopyDF['PREVOPEN'] > bhavcopyDF['PREVCLOSE'] ) & ( bhavcopyDF['CLOSE'] > bhavcopyDF['OPEN'] ) ) &
-            ( ( bhavcopyDF['OPEN'] < bhavcopyDF['PREVCLOSE'] ) & ( bhavcopyDF['CLOSE'] > bhavcopyDF['PREVOPEN'] ) ),
-            ['OPEN','PREVCLOSE','CLOSE','PREVOPEN']
-        ]
-    if len(engulfingDF) > 0:
-        if VERBOSE: print('{} stocks show Bullish Engulfing Candlestick pattern'.format(len(engulfingDF)))
-        for stock in engulfingDF.index:
-            print(stock)
-    else:
-        print('No stocks with Bullish Engulfing pattern')
-
-def getBullishHarami(bhavcopyDF, prevBhavFound):
-    '''Gets stocks that are forming Bullish Harami pattern'''
-    print('\nBULLISH HARAMI CANDLESTICK SCAN')
-    print('-------------------------------')
-    if not prevBhavFound:
-        print('Previous trading session data file not found. Cannot scan for Bullish Harami pattern')
+def getBhavFileName(folderName, bhavPrefix, bhavSuffix, theDay):
+    '''Returns the bhavcopy CSV path for theDay. Example: data/scanner/cm24MAR2021bhav.csv'''
+    return folderName + bhavPrefix + theDay.strftime('%d%b%Y').upper() + bhavSuffix + '.csv'
+
+def importBhavDay(task):
+    '''Imports the bhavcopy CSV (or cached zip) of one day into the bhavcopy store if it is not
+    there yet. task is (day, bhavFile, storeDir). Returns True if the day is in the store'''
+    day, bhavFile, storeDir = task
+    if bhavStore.hasDay(storeDir, day):
+        return True
+    try:
+        if not os.path.exists(bhavFile) and os.path.exists(bhavFile + '.zip'):
+            bhavStore.importBhavZip(storeDir, bhavFile + '.zip', day)
+        else:
+            bhavStore.importBhavCSV(storeDir, bhavFile, day)
+        return True
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        print('Could not read bhavcopy {0}: {1}'.format(bhavFile, e))
+        return False
+
+def scanDateRange(days, bhavFiles, storeDir, symbols=None, patterns=None, params=None, lowLimit=None, upLimit=None,
+    workers=None, lookback=1, trend=None, timeframe='D'):
+    '''Scans the bhavcopies of the trading days for the patterns. days is the list of trading days
+    with the lookback trading days before the range first (used only as the earlier bars of the
+    patterns and the trend) and bhavFiles the matching bhavcopy paths. Bhavcopies not in the store
+    yet are imported in a process pool, then all the days are read into one OHLC panel
+    (see ohlcPanel.py) and scanned in a single pass. trend is an optional SMA period to take the
+    patterns only against the trend. With timeframe W or M the days are resampled into weekly or
+    monthly candles and lookback counts periods instead of days.
+    Returns the symbol x pattern matrix indexed by (DATE, SYMBOL)'''
+    tasks = [(theDay.strftime('%Y-%m-%d'), bhavFile, storeDir) for theDay, bhavFile in zip(days, bhavFiles)]
+    pending = [task for task in tasks if not bhavStore.hasDay(storeDir, task[0])]
+    with profiler.stage('import bhavcopies'):
+        profiler.rows(len(pending))
+        if workers == 1 or len(pending) < 2:
+            list(map(importBhavDay, pending))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(importBhavDay, pending))
+    with profiler.stage('load panel'):
+        if timeframe == 'D':
+            panel = ohlcPanel.buildPanel(storeDir, [task[0] for task in tasks], symbols)
+        else:
+            panel = ohlcPanel.getTimeframePanel(storeDir, tasks[0][0], tasks[-1][0], timeframe, symbols)
+        profiler.rows(panel['data'].shape[0] * panel['data'].shape[1])
+
+    with profiler.stage('patterns'):
+        #same filters as the single day scan: price band and HIGH != LOW of the day scanned
+        close = ohlcPanel.getField(panel, 'CLOSE')
+        mask = ~np.isnan(close) & (ohlcPanel.getField(panel, 'HIGH') != ohlcPanel.getField(panel, 'LOW'))
+        if lowLimit is not None and upLimit is not None:
+            mask &= (close >= lowLimit) & (close <= upLimit)
+        matrix = ohlcPanel.scanPanel(panel, patterns, params, lookback, mask, trend)
+        profiler.rows(len(matrix))
+    return matrix
+
+def displayRangeResults(matrix):
+    '''Prints one line per date and stock with the patterns it formed'''
+    found = matrix[matrix.any(axis=1)]
+    if len(found) < 1:
+        print('No stocks with the selected patterns')
         return
-    haramiDF = bhavcopyDF.loc[
-        ( ( bhavcopyDF['PREVOPEN'] > bhavcopyDF['PREVCLOSE'] ) & ( bhavcopyDF['CLOSE'] > bhavcopyDF['OPEN'] ) ) &
-        ( ( bhavcopyDF['OPEN'] > bhavcopyDF['PREVCLOSE'] ) & ( bhavcopyDF['CLOSE'] < bhavcopyDF['PREVOPEN'] ) ),
-        ['OPEN','PREVCLOSE','CLOSE','PREVOPEN']
-    ]
-    if not haramiDF.empty:
-            if VERBOSE: print('{} stocks show Bullish Harami Candlestick pattern'.format(len(haramiDF)))
-            for stock in haramiDF.index:
+    names = [candlePatterns.PATTERNS[key]['name'] for key in matrix.columns]
+    print('{0:<12}{1:<14}{2}'.format('DATE','SYMBOL','PATTERNS'))
+    print('-' * 50)
+    for (theDay, stock), row in zip(found.index, found.to_numpy()):
+        print('{0:<12}{1:<14}{2}'.format(theDay, stock, ', '.join(name for name, hit in zip(names, row) if hit)))
+    return
+
+def displayPatterns(matrix, prevBhavFound=True):
+    '''Prints the stocks found for each pattern (column) of the symbol x pattern matrix
+    returned by candlePatterns.scanPatterns'''
+    for key in matrix.columns:
+        pattern = candlePatterns.PATTERNS[key]
+        title = '{} CANDLESTICK SCAN'.format(pattern['name'].upper())
+        print('\n' + title)
+        print('-' * len(title))
+        if pattern['bars'] > 1 and not prevBhavFound:
+            print('Previous trading session data file not found. Cannot scan for {} pattern'.format(pattern['name']))
+            continue
+        stocks = matrix.index[matrix[key].to_numpy()]
+        if len(stocks) > 0:
+            if VERBOSE: print('{0} stocks show {1} Candlestick pattern'.format(len(stocks), pattern['name']))
+            for stock in stocks:
                 print(stock)
-    else:
-        print('No stocks with Bullish Harami pattern')
-
-def getBullishOutsideBar(bhavcopyDF, prevBhavFound):
-    '''Gets stocks that are forming Bullish Outside bar reversal pattern'''
-    print('\nBULLISH OUTSIDE BAR CANDLESTICK SCAN')
-    print('----------------------------------')
-    if not prevBhavFound:
-        print('Previous trading session data file not found. Cannot scan for Bullish Outside Bar pattern')
-        return
-    outsideDF = bhavcopyDF.loc[
-            ( ( bhavcopyDF['PREVOPEN'] > bhavcopyDF['PREVCLOSE'] ) & ( bhavcopyDF['CLOSE'] > bhavcopyDF['OPEN'] ) ) &
-            ( ( bhavcopyDF['LOW'] < bhavcopyDF['PREVLOW'] ) & ( bhavcopyDF['CLOSE'] > bhavcopyDF['PREVHIGH'] ) ),
-            ['OPEN','PREVCLOSE','CLOSE','PREVOPEN']
-        ]
-    if len(outsideDF) > 0:
-        if VERBOSE: print('{} stocks show Bullish Outside Bar Candlestick pattern'.format(len(outsideDF)))
-        for stock in outsideDF.index:
-            print(stock)
-    else:
-        print('No stocks with Bullish Outside Bar pattern')
+        else:
+            print('No stocks with {} pattern'.format(pattern['name']))
 
 
 def scanAllPatterns(args):
     '''Returns False if at least one pattern is specified as a commandline option.
     Else returns True'''
-    if args.hammer: return False
-    if args.marubozu: return False
-    if args.engulfing: return False
-    if args.harami: return False
-    if args.outside: return False
-    else: return True
+    for group in PATTERN_GROUPS:
+        if getattr(args, group): return False
+    return True
+
+def scanRange(args, candlestickScanner, marketData, storeDir, calendar, patterns, params):
+    '''Scans the bhavcopies of every trading day from args.fromDate to args.toDate and prints
+    the results as one table keyed by date and stock. Missing bhavcopies are downloaded
+    straight into the bhavcopy store'''
+    FOLDER_NAME = candlestickScanner['foldername']
+    BHAV_PREFIX = candlestickScanner['bhavPrefix']
+    BHAV_SUFFIX = candlestickScanner['bhavSuffix']
+    fromDay = datetime.strptime(args.fromDate, '%Y-%m-%d').date()
+    toDay = datetime.strptime(args.toDate, '%Y-%m-%d').date() if args.toDate else date.today()
+    if not tradingCalendar.isCovered(calendar, [fromDay, toDay]):
+        print('Dates outside the trading calendar ({0} to {1}). Add the holidays of the year to [TradingCalendar] in config.ini'.format(
+            calendar['firstDay'], calendar['lastDay']))
+        return
+    days = getTradingDays(fromDay, toDay, calendar)
+    if len(days) < 1:
+        print('No trading days from {0} to {1}'.format(fromDay, toDay))
+        return
+    #the trading days (or weeks/months) before the range give the earlier bars of the first days and the trend
+    lookback = max(candlePatterns.getMaxBars(patterns) - 1, args.trend or 0, 1)
+    if args.timeframe == 'D':
+        days = getTradingDays(tradingCalendar.nthTradingDay(calendar, fromDay, -lookback), toDay, calendar)
+        print('Scanning {0} trading days from {1} to {2}'.format(len(days) - lookback, days[lookback], days[-1]))
+    else:
+        firstPeriod = ohlcPanel.shiftPeriod(ohlcPanel.getPeriodStart(fromDay, args.timeframe), -lookback, args.timeframe)
+        days = getTradingDays(firstPeriod, toDay, calendar)
+        print('Scanning {0} candles from {1} to {2}'.format(ohlcPanel.TIMEFRAMES[args.timeframe], fromDay, days[-1]))
+
+    #Download the bhavcopies missing from the store. Bhavcopy of a day is available only after 6:00pm
+    now = datetime.now()
+    bhavFiles = [getBhavFileName(FOLDER_NAME, BHAV_PREFIX, BHAV_SUFFIX, theDay) for theDay in days]
+    missing = [theDay for theDay, bhavFile in zip(days, bhavFiles)
+        if not bhavStore.hasDay(storeDir, theDay) and not os.path.exists(bhavFile) and not os.path.exists(bhavFile + '.zip')
+        and not (theDay == now.date() and now.hour < 18)]
+    if len(missing) > 0:
+        if VERBOSE: print('Downloading {} bhavcopies'.format(len(missing)))
+        failed = getMarketData.fetchBhavcopyDays(missing, FOLDER_NAME, marketData.get('baseURL', getMarketData.BHAV_BASE_URL),
+            workers=marketData.getint('downloadWorkers', 4), retries=marketData.getint('retries', 3), verbose=VERBOSE,
+            storeDir=storeDir)
+        for theDay in failed:
+            print('Bhavcopy could not be fetched for', theDay)
+
+    #Restrict the scan to the F&O stocks if the list is available
+    symbols = None
+    if candlestickScanner.get('FnOListJsonFileName'):
+        stockDict = stockfinder.loadFoJson(candlestickScanner['FnOListJsonFileName'])
+        if stockDict:
+            symbols = list(stockDict.keys())
+
+    matrix = scanDateRange(days, bhavFiles, storeDir, symbols, patterns, params, candlestickScanner.getfloat('lowerpricelimit'),
+        candlestickScanner.getfloat('upperPriceLimit'), args.jobs, lookback, args.trend, args.timeframe)
+    with profiler.stage('display'):
+        displayRangeResults(matrix)
+    if args.output:
+        names = {key: candlePatterns.PATTERNS[key]['name'] for key in matrix.columns}
+        matrix[matrix.any(axis=1)].rename(columns=names).to_csv(args.output)
+        print('Results written to CSV file:', args.output)
+    return
 
 def main():
     #Load config file. The file config.ini must be in the same folder/directory as this python program
@@ -200,15 +258,52 @@ def main():
     parser.add_argument('-E','--engulfing', action='store_true', default=False, help='Engulfing pattern scan')
     parser.add_argument('-A','--harami', action='store_true', default=False, help='Harami pattern scan')
     parser.add_argument('-O','--outside', action='store_true', default=False, help='Outside Bar pattern scan')
+    parser.add_argument('-S','--star', action='store_true', default=False, help='Morning/Evening Star pattern scan (range scan only)')
+    parser.add_argument('-W','--soldiers', action='store_true', default=False, help='Three White Soldiers/Black Crows pattern scan (range scan only)')
+    parser.add_argument('-I','--insidebar', action='store_true', default=False, help='Inside Bar breakout pattern scan (range scan only)')
+    parser.add_argument('-B','--bearish', action='store_true', default=False, help='Also scan the bearish mirror of each pattern')
+    parser.add_argument('--from', dest='fromDate', default=None, help='Scan the bhavcopies from this date (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='toDate', default=None, help='Last date (YYYY-MM-DD) of the range scan. Default is today')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Number of worker processes for the range scan. Default is the number of CPUs')
+    parser.add_argument('--trend', type=int, default=None, metavar='N',
+        help='Range scan: keep bullish patterns after a close below the N session SMA and bearish ones after a close above it')
+    parser.add_argument('--timeframe', choices=list(ohlcPanel.TIMEFRAMES), default='D',
+        help='Scan daily (D), weekly (W) or monthly (M) candles. Weekly and monthly candles are dated by the first day of the period. Default is %(default)s')
+    parser.add_argument('-o', '--output', default=None, help='Write the range scan results to a CSV file')
+    profiler.addArgument(parser)
     args = parser.parse_args()
+    if profiler.enableFromArgs(args):
+        profiler.instrument(getMarketData, 'fetchBhavcopy', 'fetch bhavcopy')
+        profiler.instrument(getMarketData, 'fetchBhavcopyDays', 'download bhavcopies')
 
-    holidayList = candlestickScanner['holidays'].strip().split(',') #List of NSE trading holidays that are on weekday
+    with profiler.stage('trading calendar'):
+        calendar = tradingCalendar.getCalendar(config) #NSE trading days from the holidays in config and the bhavcopy store
     
     #setting Verbosity globally
     global VERBOSE
     VERBOSE = args.verbose
     
     SCAN_ALL = scanAllPatterns(args)
+    groups = None if SCAN_ALL else [group for group in PATTERN_GROUPS if getattr(args, group)]
+    sides = ('BULLISH','BEARISH') if args.bearish else ('BULLISH',)
+    params = {'tailToBodyRatio': candlestickScanner.getfloat('tailtobodyratio'),
+        'marubozuShadow': candlestickScanner.getfloat('marubozuShadow')}
+    for key in ('starBodyRatio', 'soldierShadow'):
+        if key in candlestickScanner:
+            params[key] = candlestickScanner.getfloat(key)
+
+    if args.timeframe != 'D' and not args.fromDate:
+        #scan the week or month (so far) of the day
+        args.fromDate = args.toDate = (date.today() - timedelta(days=args.delta)).isoformat()
+    if args.fromDate:
+        scanRange(args, candlestickScanner, config['MarketData'], config['BhavStore']['foldername'], calendar, candlePatterns.getPatterns(groups, sides), params)
+        return
+
+    patterns = candlePatterns.getPatterns(groups, sides, SINGLE_DAY_BARS)
+    if len(patterns) < len(candlePatterns.getPatterns(groups, sides)) and not SCAN_ALL:
+        print('Multi-bar patterns need the previous sessions. Use --from for a range scan')
+        if len(patterns) < 1:
+            sys.exit()
 
     #offset value for calculating date. Default is 0 days
     backDate = args.delta
@@ -221,8 +316,12 @@ def main():
     PREFIX_CSV = candlestickScanner['csvfileprefix'] #Example: 'MW-SECURITIES-IN-F&O-'
     theDay = datetime.today() - delta
 
-    #sanity check to see if the given date is a trading holiday/weekend
-    if isTradingHoliday(theDay,holidayList):
+    #sanity check to see if the given date is in the trading calendar and not a trading holiday/weekend
+    if not tradingCalendar.isCovered(calendar, theDay):
+        print('Dates outside the trading calendar ({0} to {1}). Add the holidays of the year to [TradingCalendar] in config.ini'.format(
+            calendar['firstDay'], calendar['lastDay']))
+        sys.exit()
+    if isTradingHoliday(theDay,calendar):
         print('The given date\'{}\' is a trading holiday/weekend. Select another date'.format(theDay.strftime('%d-%b-%Y')))
         sys.exit()
 
@@ -246,15 +345,12 @@ def main():
     if VERBOSE:
         print('Live market data CSV file present: ',FILE_NAME)
 
-    #Read CSV file into a dataframe.
-    df = pd.read_csv(FILE_NAME,thousands=',') 
-
-    #Rename columns to keep it clean. Column names from NSE website has \n and other characters.
-    df.columns = ['SYMBOL','OPEN', 'HIGH', 'LOW', 'PREVCLOSE', 'CLOSE', 'CHNG',
-        '%CHNG', 'VOLUME', 'VALUE', '52W H', '52W L',
-        '365 D', '30 D'] #LTP or last traded price column is set as CLOSE
-
-    df.set_index('SYMBOL',inplace=True)
+    #Read the OHLC columns of the CSV file into a dataframe indexed by SYMBOL (see marketWatch.py).
+    #LTP or last traded price column is set as CLOSE
+    with profiler.stage('read market watch'):
+        df = marketWatch.loadMarketWatch(FILE_NAME, ['OPEN','HIGH','LOW','PREV CLOSE','LTP'])
+        df.rename(columns={'PREV CLOSE': 'PREVCLOSE', 'LTP': 'CLOSE'}, inplace=True)
+        profiler.rows(len(df))
 
     now = datetime.now()
     today = date(year=now.year,month=now.month,day=now.day)
@@ -269,61 +365,55 @@ def main():
     if found:#Will use bhavcopy for analysis if available.
         if VERBOSE: print('Bhavcopy fetched successfully for date:',theDayStr)
         else: print('Date:',theDayStr)
-        df = getBhavCopyData(df.index,BHAV)
+        with profiler.stage('read bhavcopy'):
+            df = getBhavCopyData(df.index,BHAV)
+            profiler.rows(len(df))
     else:#Else use the live trade csvfile
         if VERBOSE: print('No Bhavcopy found! Proceeding with live market data CSV file for data analysis\n')
         else: print('Date:',theDayStr)
 
-    #First filteration: Eliminate stocks whose prices are lower or upper than the set price band
-    LOW_LIMIT = candlestickScanner.getint('lowerpricelimit')
-    UP_LIMIT = candlestickScanner.getint('upperPriceLimit')
-    dfToDrop = df[(df['CLOSE'] < LOW_LIMIT) | (df['CLOSE'] > UP_LIMIT)]
-    if VERBOSE: print('Dropping {0} stocks with CLOSE price > {1} or < {2}'.format(len(dfToDrop),UP_LIMIT,LOW_LIMIT))
-    df.drop(dfToDrop.index,inplace=True)
-
-    #SANITY CHECK. To drop any stocks where high == Low to avoid infinity position size.
-    if len(df[df['HIGH']==df['LOW']]) > 0:
-        bad_df = df[ df['HIGH'] == df['LOW'] ]
-        if VERBOSE: print ('ALERT: {} stock/stocks with HIGH = LOW'.format(len(bad_df)))
-        print( bad_df )
-        for stock in bad_df.index:
-            if VERBOSE: print('Dropping {} from today\'s list'.format(stock))
-        df.drop(bad_df.index, inplace = True)
+    with profiler.stage('filter'):
+        #First filteration: Eliminate stocks whose prices are lower or upper than the set price band
+        LOW_LIMIT = candlestickScanner.getfloat('lowerpricelimit')
+        UP_LIMIT = candlestickScanner.getfloat('upperPriceLimit')
+        dfToDrop = df[(df['CLOSE'] < LOW_LIMIT) | (df['CLOSE'] > UP_LIMIT)]
+        if VERBOSE: print('Dropping {0} stocks with CLOSE price > {1} or < {2}'.format(len(dfToDrop),UP_LIMIT,LOW_LIMIT))
+        df.drop(dfToDrop.index,inplace=True)
+
+        #SANITY CHECK. To drop any stocks where high == Low to avoid infinity position size.
+        if len(df[df['HIGH']==df['LOW']]) > 0:
+            bad_df = df[ df['HIGH'] == df['LOW'] ]
+            if VERBOSE: print ('ALERT: {} stock/stocks with HIGH = LOW'.format(len(bad_df)))
+            print( bad_df )
+            for stock in bad_df.index:
+                if VERBOSE: print('Dropping {} from today\'s list'.format(stock))
+            df.drop(bad_df.index, inplace = True)
+        profiler.rows(len(df))
 
     #Get Previous session bhavcopy
-    prevDay = getPrevTradingDay(theDay - timedelta(days=1),holidayList)
+    prevDay = getPrevTradingDay(theDay - timedelta(days=1),calendar)
     # print('\nPrevious Trading day is', prevDay)
     prevBhavFile = FOLDER_NAME + BHAV_PREFIX + prevDay + BHAV_SUFFIX + '.csv'
     found = getMarketData.fetchBhavcopy(prevDay,FOLDER_NAME, prevBhavFile, VERBOSE)
     if found:
-        prevDayBhavDF = getBhavCopyData(df.index, prevBhavFile)
+        with profiler.stage('read bhavcopy'):
+            prevDayBhavDF = getBhavCopyData(df.index, prevBhavFile)
+            profiler.rows(len(prevDayBhavDF))
         df['PREVOPEN'] = prevDayBhavDF['OPEN']
         df['PREVLOW'] = prevDayBhavDF['LOW']
         df['PREVHIGH'] = prevDayBhavDF['HIGH']
 
     #SCAN FOR THE CANDLESTICK PRICE ACTION PATTERNS AND DISPLAY THE RESULTS
-    #Bullish Hammer Pattern
-    if SCAN_ALL or args.hammer:
-        MULTIPLIER = candlestickScanner.getfloat('tailtobodyratio')
-        getBullishHammer(df,MULTIPLIER)
-    
-    #Bullish Marubozu Pattern
-    if SCAN_ALL or args.marubozu:
-        MARUBOZU_WICK_RATIO = candlestickScanner.getfloat('marubozuShadow')
-        getBullishMarubozu(df, MARUBOZU_WICK_RATIO)
-    
-    #Bullish Engulfing Pattern
-    if SCAN_ALL or args.engulfing:
-        getBullishEngulfing(df, found)
-
-    #Bullish Outside Bar Pattern
-    if SCAN_ALL or args.outside:
-        getBullishOutsideBar(df, found)
-
-    #Bullish Harami Pattern
-    if SCAN_ALL or args.harami:
-        getBullishHarami(df, found)
-        
+    #Patterns are listed in the order of the registry: hammer, marubozu, engulfing, outside bar, harami
+    if VERBOSE:
+        print('Minimum Tail/Body Ratio = \'{} : 1\''.format(params['tailToBodyRatio']))
+        print('Marubozu Shadow to body ratio :', params['marubozuShadow'])
+    with profiler.stage('patterns'):
+        matrix = candlePatterns.scanPatterns(df, patterns, params)
+        profiler.rows(len(matrix))
+    with profiler.stage('display'):
+        displayPatterns(matrix, found)
+
 
 if __name__  == "__main__":
     main()
\ No newline at end of file
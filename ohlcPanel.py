@@ -0,0 +1,277 @@
+"""
+Rolling multi-session OHLC panel for multi-bar candlestick patterns.
+
+The panel holds N trading sessions of the bhavcopy store as one float64 array of shape
+(symbols, sessions, fields), filled with NaN where a stock has no row on a session. The last
+bars of every session are then strided views of it (NumPy sliding_window_view, no copies),
+so a 3-bar pattern over a month of sessions is evaluated for all stocks and days in one pass
+of the candlePatterns rules. Moving averages for the trend filter are taken from the same array.
+
+Weekly (W) and monthly (M) candles are resampled from the daily panel with reduceat group
+reductions over the sessions of each period. A period is keyed by its first calendar day (the
+Monday of the week, the 1st of the month). Finished periods are cached as partitions of a
+store under <store>/W/EQ/ (or M) so only the current partial week or month is recomputed. Each
+cached period keeps the stamps of the daily partitions it was built from, and is rebuilt when a
+day of the period is added, removed or imported again.
+
+    panel = buildPanel('data/store/', ['2021-03-01', '2021-03-02', ...], symbols)
+    matrix = scanPanel(panel, ['morningstar', 'engulfing'], start=2)
+
+Usage:
+    python ohlcPanel.py --from 2021-03-01 --to 2021-03-31 -s SBIN [--timeframe W]
+"""
+import numpy as np
+import pandas as pd
+import os
+import argparse
+import configparser
+from numpy.lib.stride_tricks import sliding_window_view
+import bhavStore
+import candlePatterns
+
+PANEL_FIELDS = ['OPEN','HIGH','LOW','CLOSE','PREVCLOSE']
+
+TIMEFRAMES = {'D': 'daily', 'W': 'weekly', 'M': 'monthly'}
+
+def buildPanel(storeDir, days, symbols=None, series='EQ', fields=PANEL_FIELDS):
+    '''Reads the days (YYYY-MM-DD strings, oldest first) of a series from the bhavcopy store into a panel.
+    symbols restricts the panel to a list of stocks (all stocks found if None). Days missing from the
+    store are left as NaN. Returns a dictionary with symbols, sessions, fields and data'''
+    days = [str(day)[:10] for day in days]
+    partitions = {day: bhavStore.openPartition(storeDir, day) for day in days if bhavStore.hasDay(storeDir, day)}
+    rows = {day: bhavStore.getRows(partition, series, symbols) for day, partition in partitions.items()}
+    if symbols is None:
+        daySymbols = [partition['symbols'][partition['code'][rows[day]]] for day, partition in partitions.items()]
+        allSymbols = np.unique(np.concatenate(daySymbols)) if len(daySymbols) > 0 else np.array([], dtype=str)
+    else:
+        allSymbols = np.unique(np.asarray(symbols, dtype=str))
+
+    data = np.full((len(allSymbols), len(days), len(fields)), np.nan)
+    for session, day in enumerate(days):
+        if day not in partitions:
+            continue
+        partition = partitions[day]
+        dayRows = rows[day]
+        position = np.searchsorted(allSymbols, partition['symbols'][partition['code'][dayRows]])
+        for index, field in enumerate(fields):
+            if field in partition:
+                data[position, session, index] = np.round(partition[field][dayRows].astype(np.float64), 2)
+    return {'symbols': allSymbols, 'sessions': days, 'fields': list(fields), 'data': data}
+
+def concatPanels(panels):
+    '''Joins panels with the same fields along the sessions. Returns a panel of the union of their symbols'''
+    fields = panels[0]['fields']
+    symbols = np.unique(np.concatenate([panel['symbols'] for panel in panels]))
+    sessions = [session for panel in panels for session in panel['sessions']]
+    data = np.full((len(symbols), len(sessions), len(fields)), np.nan)
+    offset = 0
+    for panel in panels:
+        count = len(panel['sessions'])
+        data[np.searchsorted(symbols, panel['symbols']), offset:offset + count] = panel['data']
+        offset += count
+    return {'symbols': symbols, 'sessions': sessions, 'fields': list(fields), 'data': data}
+
+def getPeriodStart(days, timeframe):
+    '''Returns the first calendar day of the week (Monday) or month of the days as datetime64[D]'''
+    days = np.asarray(days, dtype='datetime64[D]')
+    if timeframe == 'W':
+        #1970-01-01, day 0, was a Thursday
+        return days - (days.astype(np.int64) + 3) % 7
+    return days.astype('datetime64[M]').astype('datetime64[D]')
+
+def shiftPeriod(period, n, timeframe):
+    '''Returns the start of the nth period after (or before if n < 0) the period starting on period'''
+    period = np.datetime64(period, 'D')
+    if timeframe == 'W':
+        return period + 7 * n
+    return (period.astype('datetime64[M]') + n).astype('datetime64[D]')
+
+def getPeriods(fromDay, toDay, timeframe):
+    '''Returns the starts (YYYY-MM-DD) of every period from the one of fromDay to the one of toDay'''
+    periods = []
+    period, last = getPeriodStart(fromDay, timeframe), getPeriodStart(toDay, timeframe)
+    while period <= last:
+        periods.append(str(period))
+        period = shiftPeriod(period, 1, timeframe)
+    return periods
+
+def resamplePanel(panel, timeframe, periods=None):
+    '''Resamples a daily panel into weekly (W) or monthly (M) candles: OPEN and PREVCLOSE of the first
+    session of the period with data, HIGH and LOW over the period, CLOSE (and other fields) of the last.
+    The result has the periods (YYYY-MM-DD starts) given, or those with sessions in the panel if None'''
+    fields = panel['fields']
+    sessions = np.asarray(panel['sessions'], dtype='datetime64[D]')
+    keys = getPeriodStart(sessions, timeframe)
+    found, bounds = np.unique(keys, return_index=True)
+    if periods is None:
+        periods = [str(period) for period in found]
+    data = np.full((len(panel['symbols']), len(periods), len(fields)), np.nan)
+    if len(sessions) < 1 or len(periods) < 1:
+        return {'symbols': panel['symbols'], 'sessions': periods, 'fields': list(fields), 'data': data}
+
+    #first and last session of each period on which a stock traded
+    valid = ~np.isnan(panel['data'][:, :, fields.index('CLOSE')])
+    position = np.arange(len(sessions))
+    first = np.minimum.reduceat(np.where(valid, position, len(sessions)), bounds, axis=1)
+    last = np.maximum.reduceat(np.where(valid, position, -1), bounds, axis=1)
+    traded = last >= 0
+    first, last = np.where(traded, first, 0), np.where(traded, last, 0)
+    resampled = np.full((len(panel['symbols']), len(found), len(fields)), np.nan)
+    for index, field in enumerate(fields):
+        values = panel['data'][:, :, index]
+        if field == 'HIGH':
+            values = np.fmax.reduceat(values, bounds, axis=1)
+        elif field == 'LOW':
+            values = np.fmin.reduceat(values, bounds, axis=1)
+        elif field in ('OPEN', 'PREVCLOSE'):
+            values = np.take_along_axis(values, first, axis=1)
+        else:
+            values = np.take_along_axis(values, last, axis=1)
+        resampled[:, :, index] = np.where(traded, values, np.nan)
+
+    periods64 = np.asarray(periods, dtype='datetime64[D]')
+    position = np.searchsorted(periods64, found)
+    inPeriods = position < len(periods64)
+    inPeriods[inPeriods] = periods64[position[inPeriods]] == found[inPeriods]
+    data[:, position[inPeriods]] = resampled[:, inPeriods]
+    return {'symbols': panel['symbols'], 'sessions': periods, 'fields': list(fields), 'data': data}
+
+def getSources(storeDir, days):
+    '''Returns the stamp (see bhavStore.getDayStamp) of each of the days in the store'''
+    return {day: bhavStore.getDayStamp(storeDir, day) for day in days}
+
+def writePeriods(cacheDir, panel, series='EQ', sources=None):
+    '''Writes every period of a resampled panel as a partition of the cache store, with the sources
+    (dictionary of period to its daily stamps) of the period if given'''
+    close = getField(panel, 'CLOSE')
+    for index, period in enumerate(panel['sessions']):
+        traded = ~np.isnan(close[:, index])
+        if not np.any(traded):
+            continue
+        periodDF = pd.DataFrame({field: panel['data'][traded, index, position] for position, field in enumerate(panel['fields'])})
+        periodDF.insert(0, 'SYMBOL', panel['symbols'][traded])
+        periodDF.insert(1, 'SERIES', series)
+        bhavStore.writeBhavDay(cacheDir, period, periodDF, None if sources is None else sources.get(period, {}))
+
+def getTimeframePanel(storeDir, fromDay, toDay, timeframe, symbols=None, series='EQ'):
+    '''Returns the weekly (W) or monthly (M) panel of every period from the one of fromDay to the one of
+    toDay, resampled from the daily sessions up to toDay. Periods ended before toDay and before the
+    latest day in the store are read from (and first written to) the cache under <store>/W/<series>/.
+    A cached period whose daily sessions changed since it was written is rebuilt.
+    The current period is recomputed from the daily store'''
+    if timeframe == 'D':
+        return buildPanel(storeDir, bhavStore.listDays(storeDir, fromDay, toDay), symbols, series)
+    cacheDir = os.path.join(storeDir, timeframe, series)
+    toDay = str(toDay)[:10]
+    days = bhavStore.listDays(storeDir, str(getPeriodStart(fromDay, timeframe)), toDay)
+    dayPeriods = [str(period) for period in getPeriodStart(days, timeframe)]
+    latest = dayPeriods[-1] if len(days) > 0 else None
+    periods = getPeriods(fromDay, toDay, timeframe)
+    #a period is finished once a later period has data and it ends on or before toDay
+    finished = [period for period in periods if latest is not None and period < latest
+        and str(shiftPeriod(period, 1, timeframe) - 1) <= toDay]
+
+    periodDays = {}
+    for day, period in zip(days, dayPeriods):
+        periodDays.setdefault(period, []).append(day)
+    sources = {period: getSources(storeDir, periodDays.get(period, [])) for period in finished}
+    #not cached yet, or a day of the period was backfilled, re-imported or removed since it was cached
+    stale = set(period for period in finished if sources[period] !=
+        (bhavStore.readSources(cacheDir, period) if bhavStore.hasDay(cacheDir, period) else {}))
+    if len(stale) > 0:
+        for period in stale:
+            bhavStore.removeDay(cacheDir, period)
+        dailyPanel = buildPanel(storeDir, [day for day, period in zip(days, dayPeriods) if period in stale], None, series)
+        writePeriods(cacheDir, resamplePanel(dailyPanel, timeframe), series, sources)
+
+    current = [period for period in periods if period not in finished]
+    dailyPanel = buildPanel(storeDir, [day for day, period in zip(days, dayPeriods) if period in current], symbols, series)
+    return concatPanels([buildPanel(cacheDir, finished, symbols, series), resamplePanel(dailyPanel, timeframe, current)])
+
+def getField(panel, field):
+    '''Returns the (symbols, sessions) array of a field'''
+    return panel['data'][:, :, panel['fields'].index(field)]
+
+def getBars(panel, bars):
+    '''Returns a dictionary of field to a (symbols, sessions - bars + 1, bars) view holding, for every
+    session from the bars-th on, the last bars sessions (oldest first)'''
+    return {field: sliding_window_view(getField(panel, field), bars, axis=1) for field in panel['fields']}
+
+def getSMA(panel, period, field='CLOSE'):
+    '''Returns the simple moving average of a field over period sessions as a (symbols, sessions)
+    array. It is NaN for the first period - 1 sessions and wherever a session in the window is missing'''
+    values = getField(panel, field)
+    sma = np.full(values.shape, np.nan)
+    if values.shape[1] >= period:
+        sma[:, period - 1:] = sliding_window_view(values, period, axis=1).mean(axis=-1)
+    return sma
+
+def getTrendFilter(panel, period, side):
+    '''Returns the (symbols, sessions) mask of sessions in a downtrend (BULLISH side: the previous close
+    is below its SMA of period sessions) or an uptrend (BEARISH side: above it). A reversal pattern is
+    only taken when it forms against the trend'''
+    close = getField(panel, 'CLOSE')
+    sma = getSMA(panel, period)
+    trend = np.zeros(close.shape, dtype=bool)
+    if side == 'BULLISH':
+        trend[:, 1:] = close[:, :-1] < sma[:, :-1]
+    else:
+        trend[:, 1:] = close[:, :-1] > sma[:, :-1]
+    return trend
+
+def scanPanel(panel, patterns=None, params=None, start=0, mask=None, trend=None):
+    '''Evaluates the patterns over every session of the panel from start on (earlier sessions are only
+    lookback for the multi-bar patterns). mask is an optional (symbols, sessions) array of the stocks to
+    keep on each session. trend is an optional SMA period for the trend filter (see getTrendFilter).
+    Returns the symbol x pattern matrix indexed by (DATE, SYMBOL) in date order'''
+    if patterns is None:
+        patterns = list(candlePatterns.PATTERNS)
+    bars = candlePatterns.getMaxBars(patterns)
+    start = max(start, bars - 1)
+    nSymbols, nSessions = len(panel['symbols']), len(panel['sessions'])
+    if nSessions <= start or nSymbols < 1:
+        return pd.DataFrame(columns=patterns, dtype=bool,
+            index=pd.MultiIndex.from_tuples([], names=['DATE','SYMBOL']))
+
+    #windows ending on the sessions from start on
+    windows = {field: view[:, start - bars + 1:] for field, view in getBars(panel, bars).items()}
+    hits = candlePatterns.scanBars(windows, patterns, params)
+    if trend is not None:
+        filters = {side: getTrendFilter(panel, trend, side)[:, start:] for side in ('BULLISH','BEARISH')}
+        for key in patterns:
+            hits[key] = hits[key] & filters[candlePatterns.PATTERNS[key]['side']]
+
+    keep = np.ones((nSymbols, nSessions - start), dtype=bool) if mask is None else np.asarray(mask)[:, start:]
+    keep = keep.T.ravel()
+    index = pd.MultiIndex.from_product([panel['sessions'][start:], panel['symbols']], names=['DATE','SYMBOL'])
+    matrix = pd.DataFrame({key: hits[key].T.ravel()[keep] for key in patterns}, index=index[keep], columns=patterns)
+    return matrix.astype(bool)
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+
+    parser = argparse.ArgumentParser(description='Multi-session OHLC panel from the bhavcopy store')
+    parser.add_argument('--from', dest='fromDate', required=True, help='First date (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='toDate', default=None, help='Last date (YYYY-MM-DD)')
+    parser.add_argument('-s', '--symbol', action='append', required=True, help='Symbol to show. Can be repeated')
+    parser.add_argument('--timeframe', choices=list(TIMEFRAMES), default='D', help='Candle timeframe. Default is %(default)s')
+    parser.add_argument('--sma', type=int, default=None, help='Also show the simple moving average of CLOSE over SMA sessions')
+    args = parser.parse_args()
+
+    storeDir = config['BhavStore']['foldername']
+    toDate = args.toDate or bhavStore.listDays(storeDir)[-1]
+    panel = getTimeframePanel(storeDir, args.fromDate, toDate, args.timeframe, [symbol.strip().upper() for symbol in args.symbol])
+    if len(panel['sessions']) < 1:
+        print('No data found')
+        return
+    sma = getSMA(panel, args.sma) if args.sma else None
+    for index, symbol in enumerate(panel['symbols']):
+        df = pd.DataFrame(panel['data'][index], index=pd.Index(panel['sessions'], name='DATE'), columns=panel['fields'])
+        if sma is not None:
+            df['SMA'] = np.round(sma[index], 2)
+        print('\n' + symbol)
+        print(df.to_string())
+
+if __name__ == '__main__':
+    main()
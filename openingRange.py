@@ -0,0 +1,119 @@
+"""
+Opening range engine over 1-minute bars.
+
+The ORB scanner (orbScanner.scanORB) takes the day's HIGH and LOW of the market watch CSV as the
+opening range, which is right only if the CSV is downloaded exactly at the end of the range.
+Here the opening range is computed from 1-minute bars of the whole segment for several windows
+(Example: 5, 15, 30 and 60 minutes from the session start) in one pass:
+
+* The bars are laid out as a symbol x minute array of highs and lows.
+* A running max of highs and running min of lows along the minute axis gives the range for
+  every window at once. The range of an N minute window is column N-1.
+
+Each window gets the columns used by orbScanner: OPEN, HIGH, LOW, PREV CLOSE, %GAP,
+%RANGE HIGH GP (range high above previous close), %RANGE LOW GD (range low below previous close)
+and PSIZE (risk / range). Unlike scanORB, the %RANGE columns are filled for every stock.
+
+Usage:
+    python openingRange.py bars.csv -p data/scanner/cm26AUG2020bhav.csv [-w 5,15,30]
+
+bars.csv has columns SYMBOL, TIME, OPEN, HIGH, LOW (TIME as "09:16" or "2020-08-27 09:16:00")
+"""
+import numpy as np
+import pandas as pd
+import argparse
+import configparser
+import orbScanner
+
+def getMinuteIndex(times, sessionStart='09:15'):
+    '''Returns the minutes from sessionStart for the bar times (strings or datetimes) as an int array'''
+    times = pd.Series(times)
+    hour, minute = [int(part) for part in sessionStart.split(':')]
+    if pd.api.types.is_datetime64_any_dtype(times):
+        return (times.dt.hour.to_numpy() * 60 + times.dt.minute.to_numpy()) - (hour * 60 + minute)
+    #a day has a few hundred distinct bar times. Parse those and map back to the rows
+    codes, uniqueTimes = pd.factorize(times.astype(str))
+    parsed = pd.to_datetime(pd.Series(uniqueTimes), format='mixed')
+    uniqueMinutes = (parsed.dt.hour.to_numpy() * 60 + parsed.dt.minute.to_numpy()) - (hour * 60 + minute)
+    return uniqueMinutes[codes]
+
+def getOpeningRanges(bars, prevClose, windows=(5, 15, 30, 60), risk=100, sessionStart='09:15'):
+    '''Computes the opening range of every symbol for each window (in minutes) from 1-minute bars.
+    bars is a DataFrame with columns SYMBOL, TIME, OPEN, HIGH, LOW. prevClose is a Series of
+    previous close prices indexed by SYMBOL. Returns a dictionary of window to DataFrame indexed
+    by SYMBOL with columns OPEN, HIGH, LOW, PREV CLOSE, %GAP, %RANGE HIGH GP, %RANGE LOW GD, PSIZE'''
+    windows = sorted(windows)
+    minutes = getMinuteIndex(bars['TIME'], sessionStart)
+    inRange = (minutes >= 0) & (minutes < windows[-1])
+    #factorize first and clean up only the unique symbols
+    codes, symbols = pd.factorize(bars['SYMBOL'])
+    cleanCodes, symbols = pd.factorize(pd.Index(symbols).str.strip().str.upper())
+    codes = cleanCodes[codes]
+    codes = codes[inRange]
+    minutes = minutes[inRange]
+
+    #symbol x minute arrays. Missing bars stay NaN and are skipped by fmax/fmin
+    shape = (len(symbols), windows[-1])
+    highs = np.full(shape, np.nan)
+    lows = np.full(shape, np.nan)
+    np.fmax.at(highs, (codes, minutes), bars['HIGH'].to_numpy(dtype=float)[inRange])
+    np.fmin.at(lows, (codes, minutes), bars['LOW'].to_numpy(dtype=float)[inRange])
+    rangeHigh = np.fmax.accumulate(highs, axis=1)
+    rangeLow = np.fmin.accumulate(lows, axis=1)
+
+    #OPEN is the open of the first bar of each symbol
+    order = np.lexsort((minutes, codes))
+    firstBar = order[np.r_[True, codes[order][1:] != codes[order][:-1]]]
+    opens = np.full(len(symbols), np.nan)
+    opens[codes[firstBar]] = bars['OPEN'].to_numpy(dtype=float)[inRange][firstBar]
+
+    prev = prevClose.reindex(symbols).to_numpy(dtype=float)
+    gap = np.round((opens - prev) / prev * 100, 2)
+    ranges = {}
+    for window in windows:
+        high = rangeHigh[:, window - 1]
+        low = rangeLow[:, window - 1]
+        spread = high - low
+        with np.errstate(divide='ignore', invalid='ignore'):
+            psize = np.where(spread > 0, np.round(risk / spread), np.nan)
+        ranges[window] = pd.DataFrame({'OPEN': opens, 'HIGH': high, 'LOW': low, 'PREV CLOSE': prev,
+            '%GAP': gap,
+            '%RANGE HIGH GP': np.round((high - prev) / prev * 100, 2),
+            '%RANGE LOW GD': np.round((prev - low) / prev * 100, 2),
+            'PSIZE': psize}, index=pd.Index(symbols, name='SYMBOL'))
+    return ranges
+
+def loadMinuteBars(fileName):
+    '''Loads 1-minute bars from a CSV file with columns SYMBOL, TIME, OPEN, HIGH, LOW'''
+    return pd.read_csv(fileName, usecols=['SYMBOL','TIME','OPEN','HIGH','LOW'], thousands=',')
+
+def loadPrevClose(bhavFile):
+    '''Returns the CLOSE of the EQ series stocks in a bhavcopy CSV file as a Series indexed by SYMBOL'''
+    bhavDF = pd.read_csv(bhavFile, usecols=['SYMBOL','SERIES','CLOSE'])
+    bhavDF = bhavDF[bhavDF['SERIES'] == 'EQ']
+    return bhavDF.set_index('SYMBOL')['CLOSE']
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    ORBConfig = config['ORBScanner']
+
+    parser = argparse.ArgumentParser(description='Opening range scan over 1-minute bars')
+    parser.add_argument('bars', help='CSV file of 1-minute bars with columns SYMBOL,TIME,OPEN,HIGH,LOW')
+    parser.add_argument('-p', '--prev', required=True, help='Previous trading day bhavcopy CSV file for PREV CLOSE')
+    parser.add_argument('-w', '--windows', default=ORBConfig.get('rangeWindows', '5,15,30,60'),
+        help='Opening range windows in minutes. Default is %(default)s')
+    args = parser.parse_args()
+
+    windows = [int(window) for window in args.windows.split(',')]
+    risk = ORBConfig.getint('risk')
+    ranges = getOpeningRanges(loadMinuteBars(args.bars), loadPrevClose(args.prev), windows, risk,
+        ORBConfig.get('sessionStart', '09:15'))
+    for window in windows:
+        print('\nOPENING RANGE: {} MINUTES'.format(window))
+        longDF, shortDF = orbScanner.scanORB(ranges[window].dropna(subset=['OPEN','HIGH','LOW','PREV CLOSE']),
+            risk, ORBConfig.getint('numoflongstocks'), ORBConfig.getint('numofshortstocks'), verbose=False)
+        orbScanner.displayCandidates(longDF, shortDF)
+
+if __name__ == '__main__':
+    main()
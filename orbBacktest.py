@@ -0,0 +1,271 @@
+"""
+Backtester for the Opening Range Breakout (ORB) stock selection and position sizing.
+
+Every day of history is replayed through orbScanner.scanORB (same price band, ranking by
+%RANGE HIGH GP / %RANGE LOW GD and %GAP, top numoflongstocks/numofshortstocks and
+PSIZE = risk / range). The selected stocks are then traded as a breakout:
+
+* ORB long enters when price crosses above the range high. The stop is the range low.
+* ORB short enters when price crosses below the range low. The stop is the range high.
+* A trade that is not stopped out is squared-off at the close (intraday MIS).
+
+Two kinds of history can be replayed:
+
+minute  One CSV of 1-minute bars per day (YYYY-MM-DD.csv with columns SYMBOL, TIME, OPEN,
+        HIGH, LOW, CLOSE) in [ORBBacktest] minutefoldername. The opening range of the
+        window (rangeWindow minutes) is computed with openingRange.getOpeningRanges and
+        the breakout is simulated bar by bar from the end of the window.
+daily   The market watch CSV snapshots (taken at the end of the opening range) in the
+        [ORBScanner] foldername and the bhavcopy of the same day. Without intraday bars the
+        order of the day's high and low is unknown, so a trade is assumed stopped out when the
+        day crossed the stop at all. This gives a conservative result.
+
+Days are spread across a process pool. Each worker loads only its own day's files.
+
+Usage:
+    python orbBacktest.py --mode minute --from 2021-01-01 --to 2021-12-31 -w 15 -j 8
+"""
+import numpy as np
+import pandas as pd
+import os
+import re
+import argparse
+import configparser
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import orbScanner
+import openingRange
+import brokerageCalculator
+
+TRADE_COLUMNS = ['DATE','SYMBOL','SIDE','PSIZE','RANGE HIGH','RANGE LOW','ENTRY','EXIT','STOPPED','PNL']
+
+def simulateBreakout(side, rangeHigh, rangeLow, opens, highs, lows, closes):
+    '''Simulates a breakout trade over the bars after the opening range.
+    Returns (entry, exit, stopped) prices or None if price never crossed the range.
+    If the entry bar also crosses the stop, the trade is taken as stopped out'''
+    if side == 'LONG':
+        crossed = np.flatnonzero(highs > rangeHigh)
+    else:
+        crossed = np.flatnonzero(lows < rangeLow)
+    if len(crossed) < 1:
+        return None
+    first = crossed[0]
+    if side == 'LONG':
+        entry = max(opens[first], rangeHigh) #a bar opening above the range gets filled at its open
+        stop = np.flatnonzero(lows[first:] < rangeLow)
+        if len(stop) > 0:
+            return entry, min(opens[first + stop[0]], rangeLow), True
+    else:
+        entry = min(opens[first], rangeLow)
+        stop = np.flatnonzero(highs[first:] > rangeHigh)
+        if len(stop) > 0:
+            return entry, max(opens[first + stop[0]], rangeHigh), True
+    return entry, closes[-1], False
+
+def getCandidates(rangeDF, params):
+    '''Runs the ORB selection on rangeDF and returns the list of (symbol, side, row) to trade'''
+    longDF, shortDF = orbScanner.scanORB(rangeDF, params['risk'], params['numLongStocks'],
+        params['numShortStocks'], params['lowerPriceLimit'], params['upperPriceLimit'], verbose=False,
+        minRangePercent=params['minRangePercent'])
+    candidates = [(symbol, 'LONG', row) for symbol, row in longDF.iterrows()]
+    candidates += [(symbol, 'SHORT', row) for symbol, row in shortDF.iterrows()]
+    return candidates
+
+def makeTrade(day, symbol, side, row, result):
+    '''Returns the trade dictionary for a simulated trade'''
+    entry, exit, stopped = result
+    qty = int(row['PSIZE'])
+    pnl = (exit - entry) * qty if side == 'LONG' else (entry - exit) * qty
+    return {'DATE': day, 'SYMBOL': symbol, 'SIDE': side, 'PSIZE': qty, 'RANGE HIGH': row['HIGH'],
+        'RANGE LOW': row['LOW'], 'ENTRY': entry, 'EXIT': exit, 'STOPPED': stopped, 'PNL': pnl}
+
+def loadLastClose(fileName, sessionStart='09:15'):
+    '''Returns the CLOSE of the last bar of each symbol in a minute bars file as a Series indexed by SYMBOL'''
+    bars = pd.read_csv(fileName, usecols=['SYMBOL','TIME','CLOSE'], thousands=',')
+    bars['MINUTE'] = openingRange.getMinuteIndex(bars['TIME'], sessionStart)
+    bars.sort_values('MINUTE', kind='stable', inplace=True)
+    bars['SYMBOL'] = bars['SYMBOL'].str.strip().str.upper()
+    return bars.groupby('SYMBOL')['CLOSE'].last()
+
+def backtestMinuteDay(task):
+    '''Backtests one day of 1-minute bars. task is (day, barsFile, prevBarsFile, params).
+    Returns the list of trades'''
+    day, barsFile, prevBarsFile, params = task
+    bars = pd.read_csv(barsFile, usecols=['SYMBOL','TIME','OPEN','HIGH','LOW','CLOSE'], thousands=',')
+    bars['SYMBOL'] = bars['SYMBOL'].str.strip().str.upper()
+    window = params['rangeWindow']
+    ranges = openingRange.getOpeningRanges(bars, loadLastClose(prevBarsFile, params['sessionStart']), [window],
+        params['risk'], params['sessionStart'])
+    rangeDF = ranges[window].dropna(subset=['OPEN','HIGH','LOW','PREV CLOSE'])
+    candidates = getCandidates(rangeDF, params)
+    if len(candidates) < 1:
+        return []
+    bars['MINUTE'] = openingRange.getMinuteIndex(bars['TIME'], params['sessionStart'])
+    bars = bars[(bars['MINUTE'] >= window) & (bars['MINUTE'] < params['squareOffMinute'])]
+    bars = bars[bars['SYMBOL'].isin([symbol for symbol, side, row in candidates])].sort_values('MINUTE')
+    groups = {symbol: frame for symbol, frame in bars.groupby('SYMBOL')}
+    trades = []
+    for symbol, side, row in candidates:
+        if symbol not in groups:
+            continue
+        frame = groups[symbol]
+        result = simulateBreakout(side, row['HIGH'], row['LOW'], frame['OPEN'].to_numpy(),
+            frame['HIGH'].to_numpy(), frame['LOW'].to_numpy(), frame['CLOSE'].to_numpy())
+        if result is not None:
+            trades.append(makeTrade(day, symbol, side, row, result))
+    return trades
+
+def loadBhavOutcome(bhavFile):
+    '''Returns the day's HIGH, LOW and CLOSE of the EQ series stocks in a bhavcopy CSV file'''
+    bhavDF = pd.read_csv(bhavFile, usecols=['SYMBOL','SERIES','HIGH','LOW','CLOSE'])
+    bhavDF = bhavDF[bhavDF['SERIES'] == 'EQ']
+    return bhavDF.set_index('SYMBOL')[['HIGH','LOW','CLOSE']]
+
+def simulateDailyBreakout(side, rangeHigh, rangeLow, dayHigh, dayLow, close):
+    '''Simulates a breakout trade with only the day's HIGH, LOW and CLOSE after the range snapshot.
+    Returns (entry, exit, stopped) or None if price never crossed the range'''
+    if side == 'LONG':
+        if not dayHigh > rangeHigh:
+            return None
+        if dayLow < rangeLow:
+            return rangeHigh, rangeLow, True
+        return rangeHigh, close, False
+    if not dayLow < rangeLow:
+        return None
+    if dayHigh > rangeHigh:
+        return rangeLow, rangeHigh, True
+    return rangeLow, close, False
+
+def backtestDailyDay(task):
+    '''Backtests one day from the market watch snapshot and the bhavcopy. task is
+    (day, snapshotFile, bhavFile, params). Returns the list of trades'''
+    day, snapshotFile, bhavFile, params = task
+    candidates = getCandidates(orbScanner.loadMarketWatch(snapshotFile), params)
+    if len(candidates) < 1:
+        return []
+    outcome = loadBhavOutcome(bhavFile)
+    trades = []
+    for symbol, side, row in candidates:
+        if symbol not in outcome.index:
+            continue
+        dayHigh, dayLow, close = outcome.loc[symbol, ['HIGH','LOW','CLOSE']]
+        result = simulateDailyBreakout(side, row['HIGH'], row['LOW'], dayHigh, dayLow, close)
+        if result is not None:
+            trades.append(makeTrade(day, symbol, side, row, result))
+    return trades
+
+def getMinuteTasks(folderName, fromDate, toDate, params):
+    '''Returns the backtest tasks for the minute bar files (YYYY-MM-DD.csv) in folderName.
+    The first file is used only for the previous close'''
+    files = sorted(fname for fname in os.listdir(folderName) if re.fullmatch(r'\d{4}-\d{2}-\d{2}\.csv', fname))
+    tasks = []
+    for prevFile, fname in zip(files, files[1:]):
+        day = fname[:10]
+        if (fromDate and day < fromDate) or (toDate and day > toDate):
+            continue
+        tasks.append((day, os.path.join(folderName, fname), os.path.join(folderName, prevFile), params))
+    return tasks
+
+def getDailyTasks(folderName, prefix, bhavPrefix, bhavSuffix, fromDate, toDate, params):
+    '''Returns the backtest tasks for the days that have both a market watch snapshot
+    (prefix + dd-Mon-YYYY.csv) and a bhavcopy in folderName'''
+    tasks = []
+    for fname in os.listdir(folderName):
+        if not (fname.startswith(prefix) and fname.endswith('.csv')):
+            continue
+        try:
+            theDay = datetime.strptime(fname[len(prefix):-4], '%d-%b-%Y')
+        except ValueError:
+            continue
+        day = theDay.strftime('%Y-%m-%d')
+        if (fromDate and day < fromDate) or (toDate and day > toDate):
+            continue
+        bhavFile = os.path.join(folderName, bhavPrefix + theDay.strftime('%d%b%Y').upper() + bhavSuffix + '.csv')
+        if not os.path.exists(bhavFile):
+            continue
+        tasks.append((day, os.path.join(folderName, fname), bhavFile, params))
+    return sorted(tasks, key=lambda task: task[0])
+
+def runBacktest(tasks, worker, workers=None):
+    '''Runs worker over the tasks (one per day) in a process pool. Returns a DataFrame of all trades
+    with the net PNL after intraday charges'''
+    if workers == 1:
+        results = list(map(worker, tasks))
+    else:
+        chunksize = max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(worker, tasks, chunksize=chunksize))
+    trades = pd.DataFrame([trade for dayTrades in results for trade in dayTrades], columns=TRADE_COLUMNS)
+    isLong = (trades['SIDE'] == 'LONG').to_numpy()
+    charges = brokerageCalculator.getChargesBatch(np.where(isLong, trades['ENTRY'], trades['EXIT']),
+        np.where(isLong, trades['EXIT'], trades['ENTRY']), trades['PSIZE'].to_numpy())
+    trades['NET'] = charges['net']
+    return trades
+
+def displaySummary(trades):
+    '''Prints the summary of the backtest trades'''
+    if len(trades) < 1:
+        print('No trades')
+        return
+    daily = trades.groupby('DATE')['NET'].sum()
+    equity = daily.cumsum()
+    print('Days traded:', len(daily))
+    print('Trades:', len(trades), '(LONG: {0}, SHORT: {1})'.format((trades['SIDE'] == 'LONG').sum(), (trades['SIDE'] == 'SHORT').sum()))
+    print('Stopped out: {:.1f}%'.format(100 * trades['STOPPED'].mean()))
+    print('Win rate: {:.1f}%'.format(100 * (trades['NET'] > 0).mean()))
+    print('Gross PL:', round(trades['PNL'].sum(), 2))
+    print('Net PL:', round(trades['NET'].sum(), 2))
+    print('Expectancy per trade:', round(trades['NET'].mean(), 2))
+    print('Max drawdown:', round(float((np.maximum.accumulate(np.maximum(equity, 0)) - equity).max()), 2))
+    return
+
+def getParams(ORBConfig, backtestConfig):
+    '''Returns the selection and sizing parameters from config'''
+    sessionStart = ORBConfig.get('sessionStart', '09:15')
+    hour, minute = [int(part) for part in sessionStart.split(':')]
+    offHour, offMinute = [int(part) for part in backtestConfig.get('squareOffTime', '15:20').split(':')]
+    return {'risk': ORBConfig.getint('risk'), 'numLongStocks': ORBConfig.getint('numoflongstocks'),
+        'numShortStocks': ORBConfig.getint('numofshortstocks'),
+        'lowerPriceLimit': ORBConfig.getfloat('lowerPriceLimit', 30),
+        'upperPriceLimit': ORBConfig.getfloat('upperPriceLimit', 3000),
+        'minRangePercent': ORBConfig.getfloat('minRangePercent', 0),
+        'rangeWindow': backtestConfig.getint('rangeWindow', 15), 'sessionStart': sessionStart,
+        'squareOffMinute': (offHour * 60 + offMinute) - (hour * 60 + minute)}
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    ORBConfig = config['ORBScanner']
+    backtestConfig = config['ORBBacktest']
+    scannerConfig = config['CandlestickScanner']
+
+    parser = argparse.ArgumentParser(description='ORB backtester')
+    parser.add_argument('-m', '--mode', choices=['minute','daily'], default='minute', help='History to replay. Default is %(default)s')
+    parser.add_argument('--from', dest='fromDate', default=None, help='First date (YYYY-MM-DD) to backtest')
+    parser.add_argument('--to', dest='toDate', default=None, help='Last date (YYYY-MM-DD) to backtest')
+    parser.add_argument('-w', '--window', type=int, default=None, help='Opening range window in minutes (minute mode)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Number of worker processes. Default is the number of CPUs')
+    parser.add_argument('-o', '--output', default=None, help='Write the trades to a CSV file')
+    args = parser.parse_args()
+
+    params = getParams(ORBConfig, backtestConfig)
+    if args.window:
+        params['rangeWindow'] = args.window
+    if args.mode == 'minute':
+        tasks = getMinuteTasks(backtestConfig['minutefoldername'], args.fromDate, args.toDate, params)
+        worker = backtestMinuteDay
+    else:
+        tasks = getDailyTasks(ORBConfig['foldername'], ORBConfig['csvfileprefix'], scannerConfig['bhavPrefix'],
+            scannerConfig['bhavSuffix'], args.fromDate, args.toDate, params)
+        worker = backtestDailyDay
+    print('Backtesting {0} days ({1} mode)'.format(len(tasks), args.mode))
+    if len(tasks) < 1:
+        return
+    trades = runBacktest(tasks, worker, args.jobs)
+    displaySummary(trades)
+    if args.output:
+        trades.to_csv(args.output, index=False)
+        print('Trades written to CSV file:', args.output)
+
+if __name__ == '__main__':
+    main()
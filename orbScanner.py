@@ -0,0 +1,128 @@
+"""
+Opening Range Breakout (ORB) stock scanner as an importable library.
+
+scanORB takes the OHLC DataFrame of a segment (Example: the NSE live market watch CSV loaded
+with loadMarketWatch) and returns the candidate stocks for ORB long and ORB short with their
+position size (PSIZE). NSE-ORB.py is the command line script over these functions.
+
+watchSnapshots keeps polling the scanner folder for new market watch CSV snapshots and
+re-scans each one in the same process, so pandas import and config parsing are paid once.
+"""
+import glob
+import os
+import time
+from datetime import datetime
+import marketWatch
+
+def loadMarketWatch(fileName):
+    '''Loads the NSE live market watch CSV file into a DataFrame indexed by SYMBOL
+    with columns OPEN, HIGH, LOW and PREV CLOSE (see marketWatch.py, parsed snapshots are cached)'''
+    return marketWatch.loadMarketWatch(fileName, ['OPEN','HIGH','LOW','PREV CLOSE'])
+
+def scanORB(df, risk, numLongStocks, numShortStocks, lowerPriceLimit=30, upperPriceLimit=3000, verbose=True, minRangePercent=0):
+    '''Scans the OHLC DataFrame (indexed by SYMBOL with columns OPEN, HIGH, LOW, PREV CLOSE)
+    for ORB candidate stocks. HIGH and LOW are taken as the opening range. Only stocks whose range high
+    (range low) is at least minRangePercent above (below) the previous close are ranked.
+    Returns (longDF, shortDF) with columns OPEN, HIGH, LOW, PREV CLOSE, %GAP, %RANGE HIGH GP,
+    %RANGE LOW GD and PSIZE (position size = risk / range)'''
+    df = df[['OPEN','HIGH','LOW','PREV CLOSE']].copy()
+
+    #drop stocks with open price < 30 or > 3000. These stocks have liquidity/slippage issues
+    df_todrop = df[(df['OPEN'] > upperPriceLimit) | (df['OPEN'] < lowerPriceLimit)]
+    if verbose: print('Dropping {0} stocks with OPEN price > {1} or < {2} '.format(len(df_todrop),upperPriceLimit,lowerPriceLimit))
+    df.drop(df_todrop.index,inplace = True)
+
+    #SANITY CHECK. To drop any stocks where high == Low to avoid infinity position size.
+    if len(df[df['HIGH']==df['LOW']]) > 0:
+        bad_df = df[ df['HIGH'] == df['LOW'] ]
+        if verbose:
+            print ('ALERT: {} stock/stocks with HIGH = LOW'.format(len(bad_df)))
+            print( bad_df )
+            for stock in bad_df.index:
+                print('Dropping {} from today\'s list'.format(stock))
+        df.drop(bad_df.index, inplace = True)
+
+    #calculate gap up/down open percentage and set a new column to store these values
+    df['%GAP'] = round((df['OPEN'] - df['PREV CLOSE']) / df['PREV CLOSE'] * 100,2)
+    if verbose:
+        print('Number of stocks Gapped Up Open for the day: {}'.format(len(df[df['%GAP'] >0])))
+        print('Number of stocks Gapped Down Open for the day: {}'.format(len(df[df['%GAP'] <0])))
+
+    #Finding range high price difference (in percentage) from previous day close price for gap-up stocks only
+    df.loc[df['%GAP'] > 0,'%RANGE HIGH GP'] = round(( df['HIGH'] - df['PREV CLOSE'] ) / df['PREV CLOSE'] * 100,2)
+    #Finding range low price difference (in percentage) from previous day close price for gap-down stocks only
+    df.loc[df['%GAP'] < 0,'%RANGE LOW GD'] = round(( df['PREV CLOSE'] - df['LOW'] ) / df['PREV CLOSE'] * 100,2)
+    df.loc[df['%GAP'] < 0,'%GAP'] = abs(df['%GAP']) #Coverting GAP down to abslute value for sorting and selecting top 5 stocks
+
+    #Ranking only the gap-up (gap-down) stocks past the range filter. nlargest over several columns also
+    #returns the NaN rows of the other side when there are fewer stocks than asked for
+    longPool = df[df['%RANGE HIGH GP'] >= minRangePercent]
+    shortPool = df[df['%RANGE LOW GD'] >= minRangePercent]
+    #find top 5(default) gapup stocks with respect to range high - prev close price change and calculate position size
+    df.loc[longPool.nlargest(numLongStocks,['%RANGE HIGH GP','%GAP']).index ,'PSIZE']= round((risk / (df['HIGH'] - df['LOW'])))
+    #find top 5(default) gapdown stocks with respect to prev close - range low price change and calculate position size
+    df.loc[shortPool.nlargest(numShortStocks,['%RANGE LOW GD','%GAP']).index,'PSIZE'] = round((risk / (df['HIGH'] - df['LOW'])))
+
+    df.dropna(thresh=7,inplace= True) #drop other stocks except for these 10 stocks to trade for the day
+    df['PSIZE']=df['PSIZE'].astype(int) #convert position size from float to int
+
+    longDF = df.loc[(df['PSIZE'] > 0) & df['%RANGE HIGH GP'].notna()]
+    shortDF = df.loc[(df['PSIZE'] > 0) & df['%RANGE LOW GD'].notna()]
+    return longDF, shortDF
+
+def displayStockPositionSize(s):
+    print('{0:<10}{1:>5}'.format('STOCKS','QTY'))
+    print('-'*15)
+    for stock in s.index:
+        qty = s[stock]
+        print('{0:<10}{1:>5}'.format(stock,qty))
+    return
+
+def displayCandidates(longDF, shortDF):
+    '''Prints the stocks and position sizes to trade for ORB long and ORB short'''
+    if len(longDF) > 0:
+        print('------BUY------')
+        displayStockPositionSize(longDF['PSIZE'])
+    else:
+        print('No Stocks for ORB Long')
+    if len(shortDF) == 0:
+        print('No Stocks for ORB SHORT Sell')
+    else:
+        print('-----SELL------')
+        displayStockPositionSize(shortDF['PSIZE'])
+    return
+
+def getSnapshotFiles(folderName, prefix):
+    '''Returns the market watch CSV snapshots in folderName as a list of paths, oldest first'''
+    pattern = os.path.join(glob.escape(folderName), glob.escape(prefix) + '*.csv')
+    return sorted(glob.glob(pattern), key=os.path.getmtime)
+
+def watchSnapshots(folderName, prefix, risk, numLongStocks, numShortStocks, interval=5,
+        lowerPriceLimit=30, upperPriceLimit=3000, minRangePercent=0):
+    '''Polls folderName every interval seconds for new or updated market watch CSV snapshots
+    and scans each one. The latest snapshot already present is scanned first. Runs until Ctrl+C'''
+    seen = {}
+    snapshots = getSnapshotFiles(folderName, prefix)
+    for path in snapshots[:-1]:
+        seen[path] = os.path.getmtime(path)
+    print('Watching {0} for {1}*.csv snapshots. Press Ctrl+C to stop'.format(folderName, prefix))
+    try:
+        while True:
+            for path in getSnapshotFiles(folderName, prefix):
+                mtime = os.path.getmtime(path)
+                if seen.get(path) == mtime:
+                    continue
+                try:
+                    df = loadMarketWatch(path)
+                except Exception as e: #snapshot may still be downloading. Retry on next poll
+                    print('Could not read {0}: {1}'.format(path, e))
+                    continue
+                seen[path] = mtime
+                print('\n{0} Scanning {1}'.format(datetime.now().strftime('%H:%M:%S'), path))
+                longDF, shortDF = scanORB(df, risk, numLongStocks, numShortStocks,
+                    lowerPriceLimit, upperPriceLimit, minRangePercent=minRangePercent)
+                displayCandidates(longDF, shortDF)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print('Stopped watching', folderName)
+    return
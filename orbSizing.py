@@ -0,0 +1,171 @@
+"""
+Portfolio-constrained position sizing for the ORB candidates.
+
+NSE-ORB.py sizes every selected stock on its own (PSIZE = risk / range) and takes the top
+numoflongstocks and numofshortstocks whatever the total exposure. sizePositions takes the whole
+ranked candidate list of orbScanner.scanORB (every gap-up stock for ORB long and gap-down stock for
+ORB short in the price band) and picks the positions under these limits:
+
+* risk per trade: QTY x range <= risk, so the stop at the other side of the range loses at most risk
+* lot size: QTY is a multiple of the lot size of the stock (1 for cash equity)
+* trade value: QTY x entry price <= maxTradeValue (no limit if 0)
+* margin: the sum of QTY x entry price / leverage over all positions <= capital (MIS leverage, per
+  stock if the lot size file has a LEVERAGE column)
+* positions: at most numLongStocks longs and numShortStocks shorts
+
+The value of a position is its ranking score (%RANGE HIGH GP for long, %RANGE LOW GD for short)
+times the share of the full risk it takes, so a position cut down to fit the margin left counts
+for less. This is a knapsack with the margin as the weight. It is solved greedily twice, in rank
+order and in order of score per rupee of margin, and the selection with the higher total score is
+kept. Each pass is one loop over the candidates after the vectorized per-stock limits, so a 2000
+stock universe is sized in a few milliseconds.
+
+Usage:
+    python orbSizing.py [MW-SECURITIES-IN-F&O-24-Mar-2021.csv] [--capital 100000] [--leverage 5]
+"""
+import numpy as np
+import pandas as pd
+import os
+import argparse
+import configparser
+import orbScanner
+
+POSITION_COLUMNS = ['SIDE','ENTRY','STOP','QTY','LOTSIZE','RISK','VALUE','MARGIN','SCORE','%GAP']
+
+def getCandidates(df, risk, lowerPriceLimit=30, upperPriceLimit=3000, minRangePercent=0):
+    '''Returns every ORB long and short candidate of the OHLC DataFrame (see orbScanner.scanORB)
+    as one DataFrame in rank order within each side, with columns SIDE, SCORE and those of scanORB'''
+    longDF, shortDF = orbScanner.scanORB(df, risk, len(df), len(df), lowerPriceLimit, upperPriceLimit, verbose=False,
+        minRangePercent=minRangePercent)
+    longDF = longDF.assign(SIDE='BUY', SCORE=longDF['%RANGE HIGH GP']).sort_values(['SCORE','%GAP'], ascending=False, kind='stable')
+    shortDF = shortDF.assign(SIDE='SELL', SCORE=shortDF['%RANGE LOW GD']).sort_values(['SCORE','%GAP'], ascending=False, kind='stable')
+    return pd.concat([longDF, shortDF])
+
+def loadLotSizes(fileName):
+    '''Loads a CSV file with columns SYMBOL, LOTSIZE and optional LEVERAGE. Returns a DataFrame indexed by SYMBOL'''
+    lotDF = pd.read_csv(fileName)
+    lotDF['SYMBOL'] = lotDF['SYMBOL'].str.strip().str.upper()
+    return lotDF.set_index('SYMBOL')
+
+def getTradeLimits(candidates, risk, leverage=5, maxTradeValue=0, lotSizes=None):
+    '''Returns the per-stock arrays (entry, stop, lot, full quantity, margin per share) of the candidates.
+    The full quantity is the largest multiple of the lot within the risk and trade value limits'''
+    isLong = (candidates['SIDE'] == 'BUY').to_numpy()
+    high, low = candidates['HIGH'].to_numpy(dtype=float), candidates['LOW'].to_numpy(dtype=float)
+    entry = np.where(isLong, high, low)
+    stop = np.where(isLong, low, high)
+    lot = np.ones(len(candidates))
+    stockLeverage = np.full(len(candidates), float(leverage))
+    if lotSizes is not None:
+        if 'LOTSIZE' in lotSizes.columns:
+            lot = lotSizes['LOTSIZE'].reindex(candidates.index).fillna(1).to_numpy(dtype=float)
+        if 'LEVERAGE' in lotSizes.columns:
+            stockLeverage = lotSizes['LEVERAGE'].reindex(candidates.index).fillna(leverage).to_numpy(dtype=float)
+    #1e-9 keeps a quantity that is exactly within the limit
+    shares = np.floor(risk / (high - low) + 1e-9)
+    if maxTradeValue > 0:
+        shares = np.minimum(shares, np.floor(maxTradeValue / entry + 1e-9))
+    fullQty = np.floor(shares / lot) * lot
+    return entry, stop, lot, fullQty, entry / stockLeverage
+
+def greedyFill(order, side, lot, fullQty, marginPerShare, capital, maxCount):
+    '''Fills the positions in the given order of the candidates. A position that does not fit the
+    margin left is cut down to the lots that fit. Returns the quantity of every candidate'''
+    qty = np.zeros(len(fullQty))
+    left = capital
+    counts = {'BUY': 0, 'SELL': 0}
+    for index in order.tolist():
+        if counts[side[index]] >= maxCount[side[index]] or fullQty[index] < 1:
+            continue
+        lotMargin = lot[index] * marginPerShare[index]
+        lots = min(fullQty[index] / lot[index], np.floor(left / lotMargin + 1e-9))
+        if lots < 1:
+            continue
+        qty[index] = lots * lot[index]
+        left -= qty[index] * marginPerShare[index]
+        counts[side[index]] += 1
+    return qty
+
+def sizePositions(candidates, risk, capital, numLongStocks, numShortStocks, leverage=5, maxTradeValue=0, lotSizes=None):
+    '''Sizes the ORB positions of the ranked candidates (see getCandidates) under the risk, lot size,
+    trade value, margin and position count limits. Returns the positions as a DataFrame indexed by
+    SYMBOL with columns POSITION_COLUMNS in the order they were picked'''
+    entry, stop, lot, fullQty, marginPerShare = getTradeLimits(candidates, risk, leverage, maxTradeValue, lotSizes)
+    side = candidates['SIDE'].to_numpy()
+    score = candidates['SCORE'].to_numpy(dtype=float)
+    maxCount = {'BUY': numLongStocks, 'SELL': numShortStocks}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        density = np.where(fullQty > 0, score / (fullQty * marginPerShare), 0)
+    #the candidates are in rank order within each side. The stable sort merges the sides by score
+    byRank = np.argsort(-score, kind='stable')
+    byDensity = np.argsort(-density, kind='stable')
+    best = None
+    for order in (byRank, byDensity):
+        qty = greedyFill(order, side, lot, fullQty, marginPerShare, capital, maxCount)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            value = np.where(qty > 0, score * qty / fullQty, 0).sum()
+        if best is None or value > best[0] + 1e-9:
+            best = (value, order, qty)
+    value, order, qty = best
+    picked = order[qty[order] > 0]
+
+    positions = pd.DataFrame({'SIDE': side[picked], 'ENTRY': entry[picked], 'STOP': stop[picked],
+        'QTY': qty[picked].astype(int), 'LOTSIZE': lot[picked].astype(int),
+        'RISK': np.round(qty[picked] * np.abs(entry[picked] - stop[picked]), 2),
+        'VALUE': np.round(qty[picked] * entry[picked], 2), 'MARGIN': np.round(qty[picked] * marginPerShare[picked], 2),
+        'SCORE': score[picked], '%GAP': candidates['%GAP'].to_numpy(dtype=float)[picked]},
+        index=pd.Index(candidates.index[picked], name='SYMBOL'))
+    return positions[POSITION_COLUMNS]
+
+def displayPositions(positions, capital):
+    print('{0:<12}{1:<6}{2:>10}{3:>10}{4:>7}{5:>9}{6:>12}{7:>11}{8:>7}'.format('STOCKS','SIDE','ENTRY','STOP','QTY',
+        'RISK','VALUE','MARGIN','SCORE'))
+    print('-' * 84)
+    for symbol, row in positions.iterrows():
+        print('{0:<12}{1:<6}{2:>10.2f}{3:>10.2f}{4:>7}{5:>9.2f}{6:>12.2f}{7:>11.2f}{8:>7.2f}'.format(symbol, row['SIDE'],
+            row['ENTRY'], row['STOP'], row['QTY'], row['RISK'], row['VALUE'], row['MARGIN'], row['SCORE']))
+    print('-' * 84)
+    print('Positions: {0}  Total risk: {1:.2f}  Exposure: {2:.2f}  Margin: {3:.2f} of {4:.2f}'.format(len(positions),
+        positions['RISK'].sum(), positions['VALUE'].sum(), positions['MARGIN'].sum(), capital))
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    ORBConfig = config['ORBScanner']
+    sizingConfig = config['ORBSizing']
+
+    parser = argparse.ArgumentParser(description='ORB position sizing under capital, margin and lot size limits')
+    parser.add_argument('fileName', nargs='?', default=None,
+        help='Market watch CSV file in the scanner folder. Default is the latest snapshot')
+    parser.add_argument('-r', '--risk', type=float, default=ORBConfig.getfloat('risk'), help='Risk per trade. Default is %(default)s')
+    parser.add_argument('-c', '--capital', type=float, default=sizingConfig.getfloat('capital'), help='Trading capital (margin available). Default is %(default)s')
+    parser.add_argument('-l', '--leverage', type=float, default=sizingConfig.getfloat('leverage', 5), help='MIS leverage. Default is %(default)s')
+    parser.add_argument('-m', '--maxvalue', type=float, default=sizingConfig.getfloat('maxTradeValue', 0),
+        help='Largest value of one position. 0 for no limit. Default is %(default)s')
+    parser.add_argument('--long', type=int, default=ORBConfig.getint('numoflongstocks'), help='Most ORB long positions. Default is %(default)s')
+    parser.add_argument('--short', type=int, default=ORBConfig.getint('numofshortstocks'), help='Most ORB short positions. Default is %(default)s')
+    parser.add_argument('--lots', default=sizingConfig.get('lotSizeFile', ''), help='CSV file of SYMBOL,LOTSIZE[,LEVERAGE]')
+    args = parser.parse_args()
+
+    folderName = ORBConfig['foldername']
+    if args.fileName:
+        fileName = os.path.join(folderName, args.fileName)
+    else:
+        snapshots = orbScanner.getSnapshotFiles(folderName, ORBConfig['csvfileprefix'])
+        if len(snapshots) < 1:
+            print('No market watch snapshot in', folderName)
+            return
+        fileName = snapshots[-1]
+    print('Sizing ORB positions of', fileName)
+    df = orbScanner.loadMarketWatch(fileName)
+    lotSizes = loadLotSizes(args.lots) if args.lots else None
+    candidates = getCandidates(df, args.risk, ORBConfig.getfloat('lowerPriceLimit', 30), ORBConfig.getfloat('upperPriceLimit', 3000),
+        ORBConfig.getfloat('minRangePercent', 0))
+    positions = sizePositions(candidates, args.risk, args.capital, args.long, args.short, args.leverage, args.maxvalue, lotSizes)
+    if len(positions) < 1:
+        print('No positions fit the limits')
+        return
+    displayPositions(positions, args.capital)
+
+if __name__ == '__main__':
+    main()
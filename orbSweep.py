@@ -0,0 +1,200 @@
+"""
+Parameter sweep of the ORB stock selection settings over historical snapshots.
+
+Runs the orbBacktest daily mode (market watch snapshot at the end of the opening range and the
+bhavcopy of the same day) for every combination of the [ORBScanner] settings given as lists:
+
+    risk, numoflongstocks, numofshortstocks, lowerPriceLimit, upperPriceLimit, minRangePercent
+
+The snapshots and bhavcopies are loaded once. The stocks of every day are ranked once per side as in
+orbScanner.scanORB (%RANGE HIGH GP or %RANGE LOW GD, then %GAP). None of the settings changes that
+order. A price band and range filter only mask stocks out of it, and the top N of the masked order is
+a prefix. So for each band and range filter the running sums of the trade results along the ranking
+give the result of every N and every risk at once. The net PL after intraday charges of every trade
+is found once per risk with brokerageCalculator.getChargesBatch.
+
+The result is one row per combination with the trades, win rate, net PL, expectancy and max drawdown,
+sorted by an outcome column.
+
+Usage:
+    python orbSweep.py --risk 100,200 --long 1:10 --short 1:10 --lower 30,50,100 --minrange 0,0.5,1 [-o sweep.csv]
+"""
+import numpy as np
+import pandas as pd
+import argparse
+import configparser
+import itertools
+import orbScanner
+import orbBacktest
+import brokerageCalculator
+
+PARAM_COLUMNS = ['RISK','LONG','SHORT','LOWER','UPPER','MINRANGE']
+RESULT_COLUMNS = PARAM_COLUMNS + ['DAYS','TRADES','WINRATE','NET','EXPECTANCY','MAXDD']
+
+def parseValues(text, convert=float):
+    '''Parses a comma separated list of values. start:stop[:step] gives a range including stop'''
+    values = []
+    for part in text.split(','):
+        part = part.strip()
+        if ':' in part:
+            bounds = [float(bound) for bound in part.split(':')]
+            step = bounds[2] if len(bounds) > 2 else 1
+            values.extend(convert(value) for value in np.arange(bounds[0], bounds[1] + step / 2, step).round(6))
+        elif part:
+            values.append(convert(part))
+    return sorted(set(values))
+
+def getDaySides(df, outcome):
+    '''Returns the long and short side of a day as dictionaries of per stock arrays in rank order:
+    eligible, OPEN, score, range, traded (price crossed the range and the stock is in the bhavcopy)
+    and the buy and sell prices of the trade (see orbBacktest.simulateDailyBreakout)'''
+    openPrice, high, low = [df[column].to_numpy(dtype=float) for column in ('OPEN','HIGH','LOW')]
+    prevClose = df['PREV CLOSE'].to_numpy(dtype=float)
+    outcome = outcome.reindex(df.index)
+    dayHigh, dayLow, close = [outcome[column].to_numpy(dtype=float) for column in ('HIGH','LOW','CLOSE')]
+    #rounded as in scanORB, so that the same stocks gap and tie
+    gap = np.round((openPrice - prevClose) / prevClose * 100, 2)
+    #a stock missing from the bhavcopy still takes its place in the ranking, it just does not trade
+    valid = high != low
+    sides = {}
+    for side in ('LONG', 'SHORT'):
+        if side == 'LONG':
+            eligible = valid & (gap > 0)
+            score = np.round((high - prevClose) / prevClose * 100, 2)
+            traded = dayHigh > high
+            stopped = dayLow < low
+            buy, sell = high, np.where(stopped, low, close)
+        else:
+            eligible = valid & (gap < 0)
+            score = np.round((prevClose - low) / prevClose * 100, 2)
+            traded = dayLow < low
+            stopped = dayHigh > high
+            buy, sell = np.where(stopped, high, close), low
+        score = np.where(eligible, score, -np.inf)
+        order = np.lexsort((np.arange(len(score)), -np.abs(gap), -score))
+        sides[side] = {'eligible': eligible[order], 'open': openPrice[order], 'score': score[order],
+            'range': (high - low)[order], 'traded': (eligible & traded)[order], 'buy': buy[order], 'sell': sell[order]}
+    return sides
+
+def stackDays(days):
+    '''Stacks the per stock arrays of the days into (days, stocks) arrays. Shorter days are padded
+    with stocks that are not eligible'''
+    width = max(len(day['eligible']) for day in days)
+    stacked = {}
+    for key in days[0]:
+        fill = False if days[0][key].dtype == bool else np.nan
+        stacked[key] = np.full((len(days), width), fill, dtype=days[0][key].dtype)
+        for index, day in enumerate(days):
+            stacked[key][index, :len(day[key])] = day[key]
+    return stacked
+
+def getTradeResults(side, risks):
+    '''Returns the net PL (risks, days, stocks) of the trade of every stock at every risk (0 if it
+    did not trade) and whether it traded. The position size is PSIZE = round(risk / range)'''
+    shape = (len(risks),) + side['eligible'].shape
+    net = np.zeros(shape)
+    isTrade = np.zeros(shape, dtype=bool)
+    for index, risk in enumerate(risks):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            psize = np.round(risk / side['range'])
+        trades = side['traded'] & (psize > 0)
+        charges = brokerageCalculator.getChargesBatch(side['buy'][trades], side['sell'][trades], psize[trades])
+        net[index][trades] = charges['net']
+        isTrade[index] = trades
+    return net, isTrade
+
+def takePrefix(values, mask, prefix):
+    '''Returns the sums (risks, counts, days) of values (risks, days, stocks) over the first prefix
+    (counts, days) stocks of every day where mask is set'''
+    running = np.cumsum(np.where(mask, values, 0), axis=2)
+    running = np.concatenate([np.zeros(running.shape[:2] + (1,)), running], axis=2)
+    return running[:, np.arange(running.shape[1])[np.newaxis, :], prefix]
+
+def sweepSide(side, risks, counts, filters):
+    '''Returns the daily net PL, trades and wins (filters, risks, counts, days) of one side for every
+    filter (lower, upper, minRange) and number of stocks'''
+    net, isTrade = getTradeResults(side, risks)
+    wins = isTrade & (net > 0)
+    shape = (len(filters), len(risks), len(counts), side['eligible'].shape[0])
+    results = {'net': np.zeros(shape), 'trades': np.zeros(shape), 'wins': np.zeros(shape)}
+    for index, (lower, upper, minRange) in enumerate(filters):
+        mask = side['eligible'] & (side['open'] >= lower) & (side['open'] <= upper) & (side['score'] >= minRange)
+        rank = np.cumsum(mask, axis=1)
+        #the top N of the masked order ends where the rank passes N
+        prefix = np.stack([np.count_nonzero(rank <= count, axis=1) for count in counts])
+        results['net'][index] = takePrefix(net, mask, prefix)
+        results['trades'][index] = takePrefix(isTrade, mask, prefix)
+        results['wins'][index] = takePrefix(wins, mask, prefix)
+    return results
+
+def sweep(days, risks, longCounts, shortCounts, lowers, uppers, minRanges):
+    '''Sweeps the grid of settings over the days (see getDaySides). Returns the results DataFrame
+    with columns RESULT_COLUMNS, one row per combination'''
+    filters = list(itertools.product(lowers, uppers, minRanges))
+    longs = sweepSide(stackDays([day['LONG'] for day in days]), risks, longCounts, filters)
+    shorts = sweepSide(stackDays([day['SHORT'] for day in days]), risks, shortCounts, filters)
+    #(filters, risks, long counts, short counts, days)
+    total = {key: longs[key][:, :, :, np.newaxis, :] + shorts[key][:, :, np.newaxis, :, :] for key in longs}
+    equity = np.cumsum(total['net'], axis=-1)
+    drawdown = (np.maximum.accumulate(np.maximum(equity, 0), axis=-1) - equity).max(axis=-1)
+    net = total['net'].sum(axis=-1)
+    trades = total['trades'].sum(axis=-1)
+    wins = total['wins'].sum(axis=-1)
+
+    grid = np.indices(net.shape).reshape(net.ndim, -1)
+    filterValues = np.array(filters, dtype=float)[grid[0]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        results = pd.DataFrame({'RISK': np.asarray(risks)[grid[1]], 'LONG': np.asarray(longCounts)[grid[2]],
+            'SHORT': np.asarray(shortCounts)[grid[3]], 'LOWER': filterValues[:, 0], 'UPPER': filterValues[:, 1],
+            'MINRANGE': filterValues[:, 2], 'DAYS': len(days), 'TRADES': trades.ravel().astype(int),
+            'WINRATE': np.round(wins.ravel() / trades.ravel() * 100, 1), 'NET': np.round(net.ravel(), 2),
+            'EXPECTANCY': np.round(net.ravel() / trades.ravel(), 2), 'MAXDD': np.round(drawdown.ravel(), 2)})
+    return results[RESULT_COLUMNS]
+
+def loadDays(tasks):
+    '''Loads the snapshot and bhavcopy of every backtest task (see orbBacktest.getDailyTasks). Returns the days'''
+    days = []
+    for day, snapshotFile, bhavFile, params in tasks:
+        days.append(getDaySides(orbScanner.loadMarketWatch(snapshotFile), orbBacktest.loadBhavOutcome(bhavFile)))
+    return days
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    ORBConfig = config['ORBScanner']
+    scannerConfig = config['CandlestickScanner']
+
+    parser = argparse.ArgumentParser(description='ORB selection parameter sweep over the market watch snapshots',
+        epilog='Values are comma separated lists or start:stop[:step] ranges. Each defaults to the [ORBScanner] setting')
+    parser.add_argument('--risk', default=ORBConfig['risk'], help='Risk per trade')
+    parser.add_argument('--long', default=ORBConfig['numoflongstocks'], help='Number of ORB long stocks')
+    parser.add_argument('--short', default=ORBConfig['numofshortstocks'], help='Number of ORB short stocks')
+    parser.add_argument('--lower', default=ORBConfig.get('lowerPriceLimit', '30'), help='Lower OPEN price limit')
+    parser.add_argument('--upper', default=ORBConfig.get('upperPriceLimit', '3000'), help='Upper OPEN price limit')
+    parser.add_argument('--minrange', default=ORBConfig.get('minRangePercent', '0'),
+        help='Least %% of the range high (low) above (below) PREV CLOSE')
+    parser.add_argument('--from', dest='fromDate', default=None, help='First date (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='toDate', default=None, help='Last date (YYYY-MM-DD)')
+    parser.add_argument('-s', '--sort', choices=['NET','EXPECTANCY','WINRATE','MAXDD','TRADES'], default='NET',
+        help='Outcome to sort by (MAXDD smallest first, others largest first). Default is %(default)s')
+    parser.add_argument('-n', '--top', type=int, default=20, help='Rows to show. Default is %(default)s')
+    parser.add_argument('-o', '--output', default=None, help='Write all the results to a CSV file')
+    args = parser.parse_args()
+
+    tasks = orbBacktest.getDailyTasks(ORBConfig['foldername'], ORBConfig['csvfileprefix'], scannerConfig['bhavPrefix'],
+        scannerConfig['bhavSuffix'], args.fromDate, args.toDate, None)
+    if len(tasks) < 1:
+        print('No days with both a market watch snapshot and a bhavcopy in', ORBConfig['foldername'])
+        return
+    grid = [parseValues(args.risk), parseValues(args.long, int), parseValues(args.short, int),
+        parseValues(args.lower), parseValues(args.upper), parseValues(args.minrange)]
+    print('Sweeping {0} combinations over {1} days'.format(int(np.prod([len(values) for values in grid])), len(tasks)))
+    results = sweep(loadDays(tasks), *grid)
+    results = results.sort_values(args.sort, ascending=(args.sort == 'MAXDD'), kind='stable')
+    print(results.head(args.top).to_string(index=False))
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print('Results written to CSV file:', args.output)
+
+if __name__ == '__main__':
+    main()
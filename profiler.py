@@ -0,0 +1,173 @@
+"""
+Lightweight stage timers and row counters for the command line tools (--profile).
+
+Code marks its stages with
+
+    with profiler.stage('parse'):
+        df = pd.read_csv(...)
+        profiler.rows(len(df))
+
+and functions of other modules can be timed as a whole with profiler.instrument(module, 'name').
+Nothing is recorded until enable() is called: stage() then returns a shared no-op context and rows()
+returns at once, and instrument() leaves the function untouched, so there is no cost when the
+flag is off.
+
+When enabled, every stage records its calls, wall time, rows processed and peak resident set
+size (RSS). The JSON report is written when the program exits (to a file, or printed):
+
+    {"command": [...], "wallTime": 1.92, "peakRSSMB": 143.2,
+     "stages": [{"name": "parse", "calls": 1, "seconds": 0.41, "rows": 150, "peakRSSMB": 98.4}, ...]}
+
+wallTime is the time from enable() to the report. On Linux the peak RSS of a stage is its own (the
+high-water mark is reset when the stage starts). Elsewhere it is the peak of the process so far.
+Stages are kept on one stack, so they are only entered from the main thread (a thread pool is timed
+as a whole by the stage around it).
+"""
+import sys
+import json
+import time
+import atexit
+import functools
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+try:
+    import resource
+except ImportError: #not available on Windows. Peak RSS is then not reported
+    resource = None
+
+#the report while profiling is enabled, else None
+REPORT = None
+NO_STAGE = nullcontext()
+
+def resetPeakRSS():
+    '''Resets the peak RSS of this process to the current RSS (Linux only)'''
+    try:
+        with open('/proc/self/clear_refs', 'w') as clearRefs:
+            clearRefs.write('5')
+    except OSError:
+        pass
+
+def getPeakRSS():
+    '''Returns the peak resident set size of this process in MB, or None if it is not available.
+    On Linux it is read from /proc as ru_maxrss also counts the parent process memory at exec'''
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def maxRSS(first, second):
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return max(first, second)
+
+def enable(fileName=None):
+    '''Starts profiling. The report is written to fileName (printed if None) when the program exits'''
+    global REPORT
+    if REPORT is not None:
+        return
+    REPORT = {'command': sys.argv, 'start': datetime.now().isoformat(timespec='seconds'),
+        'clock': time.perf_counter(), 'stages': {}, 'stack': [], 'peak': getPeakRSS(), 'fileName': fileName}
+    atexit.register(writeReport)
+
+def isEnabled():
+    return REPORT is not None
+
+@contextmanager
+def timeStage(name):
+    '''Times one run of a stage. Nested stages fold their peak RSS into the enclosing stage'''
+    entry = {'rows': 0, 'peak': None}
+    #the peak so far belongs to the enclosing stage (or the program) before it is reset
+    peak = getPeakRSS()
+    if REPORT['stack']:
+        REPORT['stack'][-1]['peak'] = maxRSS(REPORT['stack'][-1]['peak'], peak)
+    REPORT['peak'] = maxRSS(REPORT['peak'], peak)
+    resetPeakRSS()
+    REPORT['stack'].append(entry)
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        seconds = time.perf_counter() - start
+        REPORT['stack'].pop()
+        entry['peak'] = maxRSS(entry['peak'], getPeakRSS())
+        if REPORT['stack']:
+            REPORT['stack'][-1]['peak'] = maxRSS(REPORT['stack'][-1]['peak'], entry['peak'])
+        REPORT['peak'] = maxRSS(REPORT['peak'], entry['peak'])
+        record = REPORT['stages'].setdefault(name, {'name': name, 'calls': 0, 'seconds': 0.0, 'rows': 0, 'peakRSSMB': None})
+        record['calls'] += 1
+        record['seconds'] += seconds
+        record['rows'] += entry['rows']
+        record['peakRSSMB'] = maxRSS(record['peakRSSMB'], entry['peak'])
+
+def stage(name):
+    '''Returns the context to time a stage. A no-op context if profiling is off'''
+    if REPORT is None:
+        return NO_STAGE
+    return timeStage(name)
+
+def rows(count):
+    '''Adds count rows processed to the innermost running stage'''
+    if REPORT is None or not REPORT['stack']:
+        return
+    REPORT['stack'][-1]['rows'] += count
+
+def instrument(module, functionName, stageName=None):
+    '''Replaces module.functionName with a wrapper that times every call as a stage (named
+    module.functionName unless stageName is given). Does nothing if profiling is off or the
+    function is already instrumented'''
+    if REPORT is None:
+        return
+    function = getattr(module, functionName)
+    if getattr(function, 'profilerStage', None) is not None:
+        return
+    name = stageName or '{0}.{1}'.format(module.__name__, functionName)
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        with timeStage(name):
+            return function(*args, **kwargs)
+    timed.profilerStage = name
+    setattr(module, functionName, timed)
+
+def getReport():
+    '''Returns the report so far as a dictionary'''
+    stages = []
+    for record in REPORT['stages'].values():
+        record = dict(record, seconds=round(record['seconds'], 4))
+        stages.append(record)
+    return {'command': REPORT['command'], 'start': REPORT['start'],
+        'wallTime': round(time.perf_counter() - REPORT['clock'], 4),
+        'peakRSSMB': maxRSS(REPORT['peak'], getPeakRSS()), 'stages': stages}
+
+def writeReport():
+    '''Writes the report as JSON to the file given to enable(), or prints it'''
+    if REPORT is None:
+        return
+    report = json.dumps(getReport(), indent=2)
+    if REPORT['fileName']:
+        with open(REPORT['fileName'], 'w') as reportFile:
+            reportFile.write(report + '\n')
+        print('Profile written to', REPORT['fileName'])
+    else:
+        print(report)
+
+def addArgument(parser):
+    '''Adds the --profile [FILE] option to an argparse parser'''
+    parser.add_argument('--profile', nargs='?', const='', default=None, metavar='FILE',
+        help='Report the wall time, rows and peak memory of each stage as JSON (to FILE if given)')
+
+def enableFromArgs(args):
+    '''Enables profiling if --profile was given. Returns True if enabled'''
+    if getattr(args, 'profile', None) is None:
+        return False
+    enable(args.profile or None)
+    return True
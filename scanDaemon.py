@@ -0,0 +1,294 @@
+"""
+Resident scan daemon answering ORB, candlestick, position size and charges requests over localhost HTTP.
+
+The daemon keeps in memory what every run of the scanners would load again: the F&O symbol table,
+the latest market watch snapshot of the scanner folder and the last sessions of the bhavcopy store
+as an OHLC panel (see ohlcPanel.py). Every request first compares the scanner folder mtime and the
+snapshot size and mtime with the ones loaded (two stat calls). When they change, new bhavcopies are
+imported into the store and the data is loaded again. Responses are cached until the next reload,
+so a repeated scan of the same snapshot is answered without running it again.
+
+Requests are GET with query parameters and return JSON. The server handles one request at a time.
+
+    /orb?risk=100&long=5&short=5&minrange=0 ORB candidates of the snapshot with PSIZE (orbScanner.scanORB)
+    /candles?groups=hammer,star&bearish=1   patterns of the last session (the snapshot if it is newer
+                                            than the store) over the recent sessions
+    /size?symbol=SBIN&risk=100              position size RISK / (HIGH - LOW) from the snapshot range
+    /size?high=120&low=110&risk=100         or from a given range
+    /portfolio?capital=100000&leverage=5    ORB positions under the capital and margin limits (orbSizing.py)
+    /charges?buy=100&sell=101&qty=50&delta=0&etf=0&stt=1   brokerage and charges of a trade
+    /find?q=BANK                            F&O symbols matching a pattern
+    /status                                 files loaded and reload count
+
+Usage:
+    python scanDaemon.py [-p 8787]
+    curl -s 'http://127.0.0.1:8787/orb?risk=200'
+"""
+import numpy as np
+import os
+import re
+import json
+import time
+import argparse
+import configparser
+from datetime import datetime
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import bhavStore
+import ohlcPanel
+import marketWatch
+import orbScanner
+import orbSizing
+import stockfinder
+import candlePatterns
+import brokerageCalculator
+
+#loaded data. version is increased on every reload
+STATE = {'version': 0, 'signature': None}
+#(version, path, query) -> response of the data version
+RESPONSES = {}
+
+def getSnapshotDay(path, prefix):
+    '''Returns the day (YYYY-MM-DD) of a market watch snapshot from its file name, else from its mtime'''
+    name = os.path.basename(path)[len(prefix):-len('.csv')]
+    try:
+        return datetime.strptime(name[:11], '%d-%b-%Y').strftime('%Y-%m-%d')
+    except ValueError:
+        return datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y-%m-%d')
+
+def getSignature(folderName, snapshot):
+    '''Returns what identifies the loaded files: the scanner folder mtime (files added, removed
+    or renamed) and the size and mtime of the snapshot (rewritten in place)'''
+    try:
+        folderTime = os.stat(folderName).st_mtime_ns
+        stat = os.stat(snapshot) if snapshot else None
+    except OSError:
+        return None
+    return folderTime, (stat.st_size, stat.st_mtime_ns) if stat else None
+
+def getSnapshotPanel(df, day):
+    '''Returns a one session panel of the snapshot. LTP is taken as CLOSE'''
+    symbols = np.asarray(df.index, dtype=str)
+    order = np.argsort(symbols)
+    columns = {'OPEN': 'OPEN', 'HIGH': 'HIGH', 'LOW': 'LOW', 'CLOSE': 'LTP', 'PREVCLOSE': 'PREV CLOSE'}
+    data = np.stack([df[columns[field]].to_numpy(dtype=np.float64)[order] for field in ohlcPanel.PANEL_FIELDS], axis=-1)
+    return {'symbols': symbols[order], 'sessions': [day], 'fields': list(ohlcPanel.PANEL_FIELDS), 'data': data[:, np.newaxis, :]}
+
+def loadState(config, sessions):
+    '''Loads the F&O list, the latest snapshot and the last sessions of the store. Returns the state'''
+    orbConfig = config['ORBScanner']
+    candleConfig = config['CandlestickScanner']
+    folderName, prefix = orbConfig['foldername'], orbConfig['csvfileprefix']
+    storeDir = config['BhavStore']['foldername']
+    state = {'config': config, 'folderName': folderName, 'prefix': prefix, 'loaded': datetime.now().isoformat(timespec='seconds')}
+
+    imported = []
+    if os.path.isdir(candleConfig['foldername']):
+        imported = bhavStore.importFolder(storeDir, candleConfig['foldername'], candleConfig['bhavPrefix'], candleConfig['bhavSuffix'])
+    if len(imported) > 0:
+        print('Imported {} bhavcopies into the store'.format(len(imported)))
+    state['foList'] = stockfinder.loadFoJson(candleConfig['FnOListJsonFileName']) or {}
+    lotSizeFile = config['ORBSizing'].get('lotSizeFile', '')
+    state['lotSizes'] = orbSizing.loadLotSizes(lotSizeFile) if lotSizeFile else None
+
+    snapshots = orbScanner.getSnapshotFiles(folderName, prefix)
+    state['snapshot'] = snapshots[-1] if len(snapshots) > 0 else None
+    state['marketWatch'] = None
+    if state['snapshot']:
+        try:
+            state['marketWatch'] = marketWatch.loadMarketWatch(state['snapshot'], marketWatch.PARSED_COLUMNS)
+        except Exception as e: #snapshot may still be downloading. Loaded again on the next change
+            print('Could not read {0}: {1}'.format(state['snapshot'], e))
+
+    symbols = list(state['foList']) or (list(state['marketWatch'].index) if state['marketWatch'] is not None else None)
+    days = bhavStore.listDays(storeDir)[-sessions:]
+    panel = ohlcPanel.buildPanel(storeDir, days, symbols)
+    if state['marketWatch'] is not None:
+        day = getSnapshotDay(state['snapshot'], prefix)
+        if len(days) < 1 or day > days[-1]:
+            panel = ohlcPanel.concatPanels([panel, getSnapshotPanel(state['marketWatch'], day)])
+    state['panel'] = panel
+    state['params'] = {'tailToBodyRatio': candleConfig.getfloat('tailtobodyratio'),
+        'marubozuShadow': candleConfig.getfloat('marubozuShadow')}
+    for key in ('starBodyRatio', 'soldierShadow'):
+        if key in candleConfig:
+            state['params'][key] = candleConfig.getfloat(key)
+    state['signature'] = getSignature(folderName, state['snapshot'])
+    return state
+
+def getState(config, sessions):
+    '''Returns the loaded state, loading it again if the scanner folder or the snapshot changed'''
+    global STATE
+    if STATE['signature'] is not None and getSignature(STATE['folderName'], STATE['snapshot']) == STATE['signature']:
+        return STATE
+    start = time.perf_counter()
+    state = loadState(config, sessions)
+    state['version'] = STATE['version'] + 1
+    state['reloadSeconds'] = round(time.perf_counter() - start, 4)
+    STATE = state
+    RESPONSES.clear()
+    print('{0} Loaded {1} ({2} sessions) in {3}s'.format(datetime.now().strftime('%H:%M:%S'), state['snapshot'],
+        len(state['panel']['sessions']), state['reloadSeconds']))
+    return STATE
+
+def getArgument(query, name, convert=str, default=None):
+    '''Returns a query parameter converted with convert. Raises ValueError if it is missing and has no default'''
+    if name not in query:
+        if default is None:
+            raise ValueError('Missing parameter ' + name)
+        return default
+    return convert(query[name][-1])
+
+def isTrue(value):
+    return value.strip().upper() in ('1', 'Y', 'YES', 'TRUE')
+
+def toRecords(df):
+    '''Returns the rows of a DataFrame indexed by SYMBOL as a list of dictionaries. NaN is None'''
+    df = df.reset_index()
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def requireSnapshot(state):
+    if state['marketWatch'] is None:
+        raise ValueError('No market watch snapshot in ' + state['folderName'])
+    return state['marketWatch']
+
+def handleORB(state, query):
+    orbConfig = state['config']['ORBScanner']
+    risk = getArgument(query, 'risk', float, orbConfig.getfloat('risk'))
+    numLong = getArgument(query, 'long', int, orbConfig.getint('numoflongstocks'))
+    numShort = getArgument(query, 'short', int, orbConfig.getint('numofshortstocks'))
+    lowLimit = getArgument(query, 'lower', float, orbConfig.getfloat('lowerPriceLimit', 30))
+    upLimit = getArgument(query, 'upper', float, orbConfig.getfloat('upperPriceLimit', 3000))
+    minRange = getArgument(query, 'minrange', float, orbConfig.getfloat('minRangePercent', 0))
+    longDF, shortDF = orbScanner.scanORB(requireSnapshot(state), risk, numLong, numShort, lowLimit, upLimit, verbose=False,
+        minRangePercent=minRange)
+    return {'snapshot': state['snapshot'], 'long': toRecords(longDF), 'short': toRecords(shortDF)}
+
+def handleCandles(state, query):
+    groups = getArgument(query, 'groups', lambda value: [group for group in value.split(',') if group], [])
+    sides = ('BULLISH','BEARISH') if getArgument(query, 'bearish', isTrue, False) else ('BULLISH',)
+    patterns = candlePatterns.getPatterns(groups or None, sides)
+    panel = state['panel']
+    if len(patterns) < 1:
+        raise ValueError('No patterns in groups ' + ','.join(groups))
+    if len(panel['sessions']) < 1:
+        raise ValueError('No sessions in the bhavcopy store')
+    matrix = ohlcPanel.scanPanel(panel, patterns, state['params'], start=len(panel['sessions']) - 1)
+    found = {}
+    for key in patterns:
+        found[key] = list(matrix.index.get_level_values('SYMBOL')[matrix[key].to_numpy()])
+    return {'date': panel['sessions'][-1], 'sessions': len(panel['sessions']), 'patterns': found}
+
+def handleSize(state, query):
+    risk = getArgument(query, 'risk', float, state['config']['ORBScanner'].getfloat('risk'))
+    if 'symbol' in query:
+        symbol = getArgument(query, 'symbol').strip().upper()
+        df = requireSnapshot(state)
+        if symbol not in df.index:
+            raise ValueError('Symbol {} is not in the snapshot'.format(symbol))
+        high, low = float(df.at[symbol, 'HIGH']), float(df.at[symbol, 'LOW'])
+    else:
+        high, low = getArgument(query, 'high', float), getArgument(query, 'low', float)
+    if high <= low:
+        raise ValueError('HIGH must be greater than LOW')
+    return {'high': high, 'low': low, 'risk': risk, 'psize': int(round(risk / (high - low)))}
+
+def handlePortfolio(state, query):
+    orbConfig, sizingConfig = state['config']['ORBScanner'], state['config']['ORBSizing']
+    risk = getArgument(query, 'risk', float, orbConfig.getfloat('risk'))
+    candidates = orbSizing.getCandidates(requireSnapshot(state), risk, orbConfig.getfloat('lowerPriceLimit', 30),
+        orbConfig.getfloat('upperPriceLimit', 3000), getArgument(query, 'minrange', float, orbConfig.getfloat('minRangePercent', 0)))
+    positions = orbSizing.sizePositions(candidates, risk, getArgument(query, 'capital', float, sizingConfig.getfloat('capital')),
+        getArgument(query, 'long', int, orbConfig.getint('numoflongstocks')), getArgument(query, 'short', int, orbConfig.getint('numofshortstocks')),
+        getArgument(query, 'leverage', float, sizingConfig.getfloat('leverage', 5)),
+        getArgument(query, 'maxvalue', float, sizingConfig.getfloat('maxTradeValue', 0)), state['lotSizes'])
+    return {'snapshot': state['snapshot'], 'positions': toRecords(positions), 'margin': round(float(positions['MARGIN'].sum()), 2)}
+
+def handleCharges(state, query):
+    #a batch of one trade
+    charges = brokerageCalculator.getChargesBatch([getArgument(query, 'buy', float)], [getArgument(query, 'sell', float)],
+        [getArgument(query, 'qty', float)], [getArgument(query, 'delta', int, 0)], [getArgument(query, 'etf', isTrue, False)],
+        [getArgument(query, 'stt', isTrue, True)])
+    return {key: round(float(values[0]), 2) for key, values in charges.items()}
+
+def handleFind(state, query):
+    pattern = getArgument(query, 'q').strip().upper()
+    try:
+        return {'symbols': [symbol for symbol in state['foList'] if re.search(pattern, symbol)]}
+    except re.error as e:
+        raise ValueError('Bad pattern: {}'.format(e))
+
+def handleStatus(state, query):
+    panel = state['panel']
+    return {'version': state['version'], 'loaded': state['loaded'], 'reloadSeconds': state['reloadSeconds'],
+        'snapshot': state['snapshot'], 'snapshotStocks': 0 if state['marketWatch'] is None else len(state['marketWatch']),
+        'foStocks': len(state['foList']), 'sessions': panel['sessions'], 'panelStocks': len(panel['symbols'])}
+
+ROUTES = {
+    '/orb': handleORB,
+    '/candles': handleCandles,
+    '/size': handleSize,
+    '/portfolio': handlePortfolio,
+    '/charges': handleCharges,
+    '/find': handleFind,
+    '/status': handleStatus,
+}
+
+def handleRequest(config, sessions, path, query):
+    '''Returns (HTTP status, JSON body) of a request. Responses are cached for the loaded data'''
+    if path not in ROUTES:
+        return 404, json.dumps({'error': 'Unknown path {0}. Paths: {1}'.format(path, ', '.join(ROUTES))})
+    state = getState(config, sessions)
+    key = (state['version'], path, tuple(sorted((name, tuple(values)) for name, values in query.items())))
+    if key not in RESPONSES:
+        try:
+            RESPONSES[key] = 200, json.dumps(ROUTES[path](state, query))
+        except ValueError as e:
+            return 400, json.dumps({'error': str(e)})
+    return RESPONSES[key]
+
+def getHandler(config, sessions, verbose=False):
+    '''Returns the request handler class of the server'''
+    class ScanRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            try:
+                status, body = handleRequest(config, sessions, url.path.rstrip('/') or '/', parse_qs(url.query))
+            except Exception as e: #keep serving. The error is returned to the client
+                status, body = 500, json.dumps({'error': '{0}: {1}'.format(type(e).__name__, e)})
+            body = body.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if verbose:
+                BaseHTTPRequestHandler.log_message(self, format, *args)
+    return ScanRequestHandler
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    daemonConfig = config['ScanDaemon']
+
+    parser = argparse.ArgumentParser(description='Resident scan daemon on localhost HTTP')
+    parser.add_argument('--host', default=daemonConfig.get('host', '127.0.0.1'), help='Address to listen on. Default is %(default)s')
+    parser.add_argument('-p', '--port', type=int, default=daemonConfig.getint('port', 8787), help='Port to listen on. Default is %(default)s')
+    parser.add_argument('-n', '--sessions', type=int, default=daemonConfig.getint('sessions', 5),
+        help='Recent sessions of the bhavcopy store kept for the candlestick scan. Default is %(default)s')
+    parser.add_argument('-v', '--verbose', action='store_true', default=False, help='Log every request')
+    args = parser.parse_args()
+
+    getState(config, args.sessions)
+    server = HTTPServer((args.host, args.port), getHandler(config, args.sessions, args.verbose))
+    print('Serving on http://{0}:{1}/ Press Ctrl+C to stop'.format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('Stopped')
+    server.server_close()
+
+if __name__ == '__main__':
+    main()
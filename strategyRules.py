@@ -0,0 +1,90 @@
+"""
+Rule based strategy tagging for the trades matched by kiteOrders.
+
+Rules are configured in the [KiteOrders] section of config.ini. strategyRules lists the rule
+names in order of priority (the first matching rule wins) and each rule is configured with
+keys prefixed by its name. A key left empty or not set matches every trade.
+
+    strategyRules = ORB
+    ORB.strategy = ORB                       (defaults to the rule name)
+    ORB.entryWindow = 09:20:00-11:00:00      (entry time, both ends inclusive)
+    ORB.instruments = INFY,TCS
+    ORB.side = LONG,SHORT
+    ORB.quantity = 1-500                     (min-max, either end can be left out)
+
+All rules are evaluated over the arrays of the day's trades, so tagging costs one pass
+per rule irrespective of the number of trades.
+"""
+import numpy as np
+
+def toSeconds(timeString):
+    '''Converts time of format "09:50:21" (or "09:50") to seconds from midnight'''
+    parts = [int(part) for part in timeString.strip().split(':')]
+    while len(parts) < 3:
+        parts.append(0)
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+def parseRange(value, convert):
+    '''Parses "low-high" into a (low, high) tuple. Missing ends are returned as None'''
+    value = value.strip()
+    if len(value) < 1:
+        return None, None
+    if '-' not in value:
+        return convert(value), convert(value)
+    low, high = value.split('-', 1)
+    low = convert(low) if len(low.strip()) > 0 else None
+    high = convert(high) if len(high.strip()) > 0 else None
+    return low, high
+
+def parseList(value):
+    '''Parses a comma separated list into upper case values. Returns None for an empty list'''
+    values = [item.strip().upper() for item in value.split(',') if len(item.strip()) > 0]
+    if len(values) < 1:
+        return None
+    return values
+
+def loadStrategyRules(kiteConfig):
+    '''Loads the strategy rules from the KiteOrders config section. Returns a list of
+    rule dictionaries in order of priority'''
+    rules = []
+    ruleNames = parseList(kiteConfig.get('strategyRules', '')) or []
+    for name in ruleNames:
+        rule = {'name': name}
+        rule['strategy'] = kiteConfig.get(name + '.strategy', name).strip().upper()
+        rule['entry'] = parseRange(kiteConfig.get(name + '.entryWindow', ''), toSeconds)
+        rule['instruments'] = parseList(kiteConfig.get(name + '.instruments', ''))
+        rule['side'] = parseList(kiteConfig.get(name + '.side', ''))
+        rule['quantity'] = parseRange(kiteConfig.get(name + '.quantity', ''), int)
+        rules.append(rule)
+    return rules
+
+def getRuleMask(rule, entry, names, sides, quantity):
+    '''Returns the boolean array of trades that satisfy all conditions of the rule'''
+    mask = np.ones(len(entry), dtype=bool)
+    low, high = rule['entry']
+    if low is not None: mask &= entry >= low
+    if high is not None: mask &= entry <= high
+    if rule['instruments'] is not None: mask &= np.isin(names, rule['instruments'])
+    if rule['side'] is not None: mask &= np.isin(sides, rule['side'])
+    low, high = rule['quantity']
+    if low is not None: mask &= quantity >= low
+    if high is not None: mask &= quantity <= high
+    return mask
+
+def tagStrategies(trades, rules):
+    '''Matches the trades dictionary (as created by kiteOrders) against the rules.
+    Returns a dictionary of orderID to strategy for the trades matched by a rule'''
+    orderIDs = list(trades)
+    if len(orderIDs) < 1 or len(rules) < 1:
+        return {}
+    entry = np.array([toSeconds(trades[orderID]['entry']) for orderID in orderIDs])
+    names = np.array([trades[orderID]['name'].upper() for orderID in orderIDs])
+    sides = np.array([trades[orderID]['trade'].upper() for orderID in orderIDs])
+    quantity = np.array([int(trades[orderID]['quantity']) for orderID in orderIDs])
+    matchedRule = np.full(len(orderIDs), -1)
+    for index, rule in enumerate(rules):
+        matchedRule[(matchedRule < 0) & getRuleMask(rule, entry, names, sides, quantity)] = index
+    tagged = {}
+    for position in np.flatnonzero(matchedRule >= 0):
+        tagged[orderIDs[position]] = rules[matchedRule[position]]['strategy']
+    return tagged
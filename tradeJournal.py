@@ -0,0 +1,218 @@
+"""
+Trade journal store for the squared-off trades produced by kiteOrders.
+
+All trades live in a single SQLite file instead of one YYYY-MM-DD.json and .csv file per day.
+Closed trades are only ever appended, and the trades table is indexed on date, symbol (name)
+and strategy so that reading a year of trades is one indexed query.
+
+Legs that are still open at the end of an ingest are kept in the open_legs table (replaced for
+the day on every save) so the order matching can resume later. Small values like the ingest
+high-water-mark are kept in the meta table.
+
+Usage:
+    python tradeJournal.py --import data/daily/     (import the old per-day JSON files)
+    python tradeJournal.py --from 2021-01-01 --to 2021-03-31 --strategy ORB
+"""
+import sqlite3
+import os
+import re
+import json
+import argparse
+
+TRADE_COLUMNS = ['date','entry','exit','name','trade','strategy','quantity','buy','sell']
+OPEN_LEG_COLUMNS = ['date','entry','name','trade','quantity','buy','sell']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    entry TEXT,
+    exit TEXT,
+    name TEXT NOT NULL,
+    trade TEXT,
+    strategy TEXT,
+    quantity INTEGER,
+    buy REAL,
+    sell REAL
+);
+CREATE INDEX IF NOT EXISTS idx_trades_date ON trades(date);
+CREATE INDEX IF NOT EXISTS idx_trades_name ON trades(name, date);
+CREATE INDEX IF NOT EXISTS idx_trades_strategy ON trades(strategy, date);
+CREATE TABLE IF NOT EXISTS open_legs (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    entry TEXT,
+    name TEXT NOT NULL,
+    trade TEXT,
+    quantity INTEGER,
+    buy REAL,
+    sell REAL
+);
+CREATE INDEX IF NOT EXISTS idx_open_legs_date ON open_legs(date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+def openJournal(fullPath):
+    '''Opens (and creates if required) the journal database at fullPath.
+    Returns the sqlite3 connection'''
+    directory = os.path.dirname(fullPath)
+    if len(directory) > 0 and not os.path.exists(directory):
+        os.makedirs(directory)
+    conn = sqlite3.connect(fullPath)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+def tradeToRow(trade, columns):
+    '''Converts a trade dictionary (values as parsed from orders csv) to a tuple for the given columns'''
+    row = []
+    for column in columns:
+        value = trade.get(column)
+        if value is not None and column == 'quantity':
+            value = int(value)
+        elif value is not None and column in ('buy','sell'):
+            value = float(value)
+        row.append(value)
+    return tuple(row)
+
+def appendTrades(conn, trades, commit=True):
+    '''Appends the squared-off trades in the trades dictionary to the journal.
+    Trades without an exit are not written. Returns the number of trades appended'''
+    rows = [tradeToRow(trade, TRADE_COLUMNS) for trade in trades.values() if 'exit' in trade]
+    conn.executemany('INSERT INTO trades ({0}) VALUES ({1})'.format(','.join(TRADE_COLUMNS),
+        ','.join('?' * len(TRADE_COLUMNS))), rows)
+    if commit:
+        conn.commit()
+    return len(rows)
+
+def saveOpenLegs(conn, tradeDate, trades, commit=True):
+    '''Replaces the open legs saved for tradeDate with the trades that have no exit yet'''
+    rows = [tradeToRow(trade, OPEN_LEG_COLUMNS) for trade in trades.values() if 'exit' not in trade]
+    conn.execute('DELETE FROM open_legs WHERE date = ?', (tradeDate,))
+    conn.executemany('INSERT INTO open_legs ({0}) VALUES ({1})'.format(','.join(OPEN_LEG_COLUMNS),
+        ','.join('?' * len(OPEN_LEG_COLUMNS))), rows)
+    if commit:
+        conn.commit()
+    return len(rows)
+
+def rowsToTrades(cursor):
+    '''Converts the rows of a query to the trades dictionary used by kiteOrders, keyed by ID as string.
+    Columns with no value (Example: sell price of an open LONG leg) are left out'''
+    trades = {}
+    for row in cursor:
+        trade = {}
+        for key in row.keys():
+            if key != 'id' and row[key] is not None:
+                trade[key] = row[key]
+        trades[str(len(trades)+1)] = trade
+    return trades
+
+def loadOpenLegs(conn, tradeDate):
+    '''Returns the legs left open on tradeDate as a trades dictionary'''
+    cursor = conn.execute('SELECT * FROM open_legs WHERE date = ? ORDER BY id', (tradeDate,))
+    return rowsToTrades(cursor)
+
+def queryTrades(conn, fromDate=None, toDate=None, symbols=None, strategies=None):
+    '''Returns the journal trades between fromDate and toDate (ISO strings, both inclusive)
+    for the given lists of symbols and strategies as a trades dictionary ordered by date and entry.
+    Any filter left as None is not applied'''
+    conditions = []
+    params = []
+    if fromDate is not None:
+        conditions.append('date >= ?')
+        params.append(fromDate)
+    if toDate is not None:
+        conditions.append('date <= ?')
+        params.append(toDate)
+    if symbols is not None:
+        conditions.append('name IN ({})'.format(','.join('?' * len(symbols))))
+        params.extend(symbol.strip().upper() for symbol in symbols)
+    if strategies is not None:
+        conditions.append('strategy IN ({})'.format(','.join('?' * len(strategies))))
+        params.extend(strategies)
+    query = 'SELECT {} FROM trades'.format(','.join(TRADE_COLUMNS))
+    if len(conditions) > 0:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY date, entry, id'
+    return rowsToTrades(conn.execute(query, params))
+
+def queryTradesAfter(conn, lastID=0):
+    '''Returns the rows (with id) of the trades appended after the trade with id lastID, ordered by id.
+    As the journal is append-only, this is everything new since lastID was read'''
+    query = 'SELECT id,{} FROM trades WHERE id > ? ORDER BY id'.format(','.join(TRADE_COLUMNS))
+    return conn.execute(query, (lastID,)).fetchall()
+
+def hasTrades(conn, tradeDate):
+    '''Checks if the journal has any squared-off trades on tradeDate'''
+    return conn.execute('SELECT 1 FROM trades WHERE date = ? LIMIT 1', (tradeDate,)).fetchone() is not None
+
+def getMeta(conn, key, default=None):
+    '''Returns the value saved for key in the meta table'''
+    row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+    if row is None:
+        return default
+    return row['value']
+
+def setMeta(conn, key, value, commit=True):
+    '''Saves value for key in the meta table'''
+    conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+    if commit:
+        conn.commit()
+    return
+
+def importDailyJSON(conn, dataDirectory):
+    '''Imports the per-day YYYY-MM-DD.json files written by earlier versions of kiteOrders.
+    Days already present in the journal are skipped. Returns the number of trades imported'''
+    imported = 0
+    for fname in sorted(os.listdir(dataDirectory)):
+        if not re.fullmatch(r'\d{4}-\d{2}-\d{2}\.json', fname):
+            continue
+        tradeDate = fname[:10]
+        if hasTrades(conn, tradeDate):
+            print('Trades for {} already in journal. Skipping it'.format(tradeDate))
+            continue
+        with open(os.path.join(dataDirectory, fname), 'r') as jsonfile:
+            data = jsonfile.read()
+        if len(data) < 1:
+            continue
+        trades = json.loads(data)
+        imported += appendTrades(conn, trades, commit=False)
+        saveOpenLegs(conn, tradeDate, trades, commit=False)
+    conn.commit()
+    return imported
+
+def main():
+    import configparser
+    import kiteOrders
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    kiteConfig = config['KiteOrders']
+
+    parser = argparse.ArgumentParser(description='Trade journal')
+    parser.add_argument('--import', dest='importDir', default=None, metavar='DIR',
+        help='Import per-day YYYY-MM-DD.json files from DIR into the journal')
+    parser.add_argument('--from', dest='fromDate', default=None, help='First date (YYYY-MM-DD) of trades to list')
+    parser.add_argument('--to', dest='toDate', default=None, help='Last date (YYYY-MM-DD) of trades to list')
+    parser.add_argument('-s', '--symbol', action='append', default=None, help='Symbol to list. Can be repeated')
+    parser.add_argument('-S', '--strategy', action='append', default=None, help='Strategy to list. Can be repeated')
+    args = parser.parse_args()
+
+    conn = openJournal(os.path.join(kiteConfig['foldername'], kiteConfig['journalFileName']))
+    if args.importDir:
+        print('Imported {} trades into the journal'.format(importDailyJSON(conn, args.importDir)))
+        return
+    trades = queryTrades(conn, args.fromDate, args.toDate, args.symbol, args.strategy)
+    if len(trades) < 1:
+        print('No trades found')
+        return
+    kiteOrders.displayClosedTradeHeader()
+    pnl = 0.0
+    for tradeID in trades:
+        pnl += kiteOrders.displayClosedTrade(trades, tradeID)
+    print('Squared-off PnL:', round(pnl,2))
+
+if __name__ == '__main__':
+    main()
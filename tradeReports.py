@@ -0,0 +1,176 @@
+"""
+Net P&L reports over the trade journal (see tradeJournal.py).
+
+Journal trades are loaded into arrays and priced with brokerageCalculator.getChargesBatch
+as intraday trades. The net P&L is rolled up per (date, strategy, symbol) into the
+pnl_rollup table of the journal. The journal is append-only, so only trades appended after
+the last rollup (meta key rollupLastID) are priced and added on each run.
+
+Reports are computed from the rollup table:
+    NET         Net P&L after charges
+    WIN%        Percentage of trades with net P&L > 0
+    EXPECTANCY  Average net P&L per trade
+    MAXDD       Maximum drawdown of the cumulative daily net P&L
+
+Usage:
+    python tradeReports.py --by strategy --from 2021-01-01 --to 2021-12-31
+"""
+import os
+import argparse
+import configparser
+import numpy as np
+import tradeJournal
+import brokerageCalculator
+
+ROLLUP_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pnl_rollup (
+    date TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    name TEXT NOT NULL,
+    trades INTEGER,
+    wins INTEGER,
+    gross REAL,
+    charges REAL,
+    net REAL,
+    PRIMARY KEY (date, strategy, name)
+);
+'''
+
+REPORT_GROUPS = {'day': 'date', 'strategy': 'strategy', 'symbol': 'name'}
+
+def updateRollup(journal, rebuild=False):
+    '''Prices the trades appended to the journal since the last rollup and adds them to
+    the pnl_rollup table. Returns the number of trades added'''
+    journal.executescript(ROLLUP_SCHEMA)
+    if rebuild:
+        journal.execute('DELETE FROM pnl_rollup')
+        tradeJournal.setMeta(journal, 'rollupLastID', '0', commit=False)
+    lastID = int(tradeJournal.getMeta(journal, 'rollupLastID', '0'))
+    rows = tradeJournal.queryTradesAfter(journal, lastID)
+    if len(rows) < 1:
+        journal.commit()
+        return 0
+    buy = np.array([row['buy'] for row in rows], dtype=float)
+    sell = np.array([row['sell'] for row in rows], dtype=float)
+    qty = np.array([row['quantity'] for row in rows], dtype=float)
+    keys = np.array(['{0}|{1}|{2}'.format(row['date'], row['strategy'] or '', row['name']) for row in rows])
+    charges = brokerageCalculator.getChargesBatch(buy, sell, qty)
+    #Aggregate per (date, strategy, symbol) key
+    uniqueKeys, groups = np.unique(keys, return_inverse=True)
+    count = np.bincount(groups)
+    wins = np.bincount(groups, weights=charges['net'] > 0)
+    gross = np.bincount(groups, weights=charges['gross'])
+    totalCharges = np.bincount(groups, weights=charges['charges'] + charges['dp'])
+    net = np.bincount(groups, weights=charges['net'])
+    upserts = []
+    for index, key in enumerate(uniqueKeys):
+        date, strategy, name = key.split('|')
+        upserts.append((date, strategy, name, int(count[index]), int(wins[index]), float(gross[index]),
+            float(totalCharges[index]), float(net[index])))
+    journal.executemany('''INSERT INTO pnl_rollup (date, strategy, name, trades, wins, gross, charges, net)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (date, strategy, name) DO UPDATE SET
+        trades = trades + excluded.trades, wins = wins + excluded.wins, gross = gross + excluded.gross,
+        charges = charges + excluded.charges, net = net + excluded.net''', upserts)
+    tradeJournal.setMeta(journal, 'rollupLastID', str(rows[-1]['id']), commit=False)
+    journal.commit()
+    return len(rows)
+
+def getMaxDrawdown(dailyNet):
+    '''Returns the maximum drawdown (as a positive number) of the cumulative sum of dailyNet'''
+    if len(dailyNet) < 1:
+        return 0.0
+    equity = np.concatenate(([0.0], np.cumsum(dailyNet)))
+    return float(np.max(np.maximum.accumulate(equity) - equity))
+
+def getReport(journal, by='strategy', fromDate=None, toDate=None):
+    '''Returns the report rows grouped by day, strategy or symbol as a list of dictionaries with keys
+    group, trades, wins, winRate, gross, charges, net, expectancy, maxDrawdown.
+    For the day report, maxDrawdown is the drawdown from the peak as of that day'''
+    updateRollup(journal)
+    column = REPORT_GROUPS[by]
+    conditions = []
+    params = []
+    if fromDate is not None:
+        conditions.append('date >= ?')
+        params.append(fromDate)
+    if toDate is not None:
+        conditions.append('date <= ?')
+        params.append(toDate)
+    where = ' WHERE ' + ' AND '.join(conditions) if len(conditions) > 0 else ''
+    query = '''SELECT {0} AS grp, date, SUM(trades) AS trades, SUM(wins) AS wins, SUM(gross) AS gross,
+        SUM(charges) AS charges, SUM(net) AS net FROM pnl_rollup{1} GROUP BY {0}, date ORDER BY {0}, date'''
+    rows = journal.execute(query.format(column, where), params).fetchall()
+    report = []
+    if by == 'day':
+        dailyNet = np.array([row['net'] for row in rows], dtype=float)
+        equity = np.cumsum(dailyNet)
+        drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity
+        for index, row in enumerate(rows):
+            report.append(makeReportRow(row['grp'], [row], float(drawdown[index])))
+        return report
+    start = 0
+    while start < len(rows):
+        end = start
+        while end < len(rows) and rows[end]['grp'] == rows[start]['grp']:
+            end += 1
+        groupRows = rows[start:end]
+        maxDrawdown = getMaxDrawdown(np.array([row['net'] for row in groupRows], dtype=float))
+        report.append(makeReportRow(rows[start]['grp'], groupRows, maxDrawdown))
+        start = end
+    return report
+
+def makeReportRow(group, rows, maxDrawdown):
+    '''Sums up the rollup rows of a group into a report row'''
+    reportRow = {'group': group or '-', 'maxDrawdown': maxDrawdown}
+    for key in ('trades','wins','gross','charges','net'):
+        reportRow[key] = sum(row[key] for row in rows)
+    reportRow['winRate'] = 100.0 * reportRow['wins'] / reportRow['trades'] if reportRow['trades'] > 0 else 0.0
+    reportRow['expectancy'] = reportRow['net'] / reportRow['trades'] if reportRow['trades'] > 0 else 0.0
+    return reportRow
+
+def displayReport(report, by='strategy', maxDrawdown=None):
+    '''Prints the report rows with a total line. maxDrawdown is the drawdown of the combined daily P&L
+    shown in the total line. For the day report it defaults to the largest drawdown of its rows'''
+    if len(report) < 1:
+        print('No trades found')
+        return
+    header = '{0:<12}{1:>7}{2:>7}{3:>11}{4:>10}{5:>11}{6:>11}{7:>10}'
+    print(header.format(by.upper(),'TRADES','WIN%','GROSS','CHARGES','NET','EXPECTANCY','MAXDD'))
+    line = '{0:<12}{1:>7}{2:>7.1f}{3:>11.2f}{4:>10.2f}{5:>11.2f}{6:>11.2f}{7:>10.2f}'
+    for row in report:
+        print(line.format(row['group'], row['trades'], row['winRate'], row['gross'], row['charges'],
+            row['net'], row['expectancy'], row['maxDrawdown']))
+    if maxDrawdown is None:
+        maxDrawdown = max(row['maxDrawdown'] for row in report)
+    total = makeReportRow('TOTAL', report, maxDrawdown)
+    print('-' * 79)
+    print(line.format(total['group'], total['trades'], total['winRate'], total['gross'], total['charges'],
+        total['net'], total['expectancy'], total['maxDrawdown']))
+    return
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    kiteConfig = config['KiteOrders']
+
+    parser = argparse.ArgumentParser(description='Net P&L reports over the trade journal')
+    parser.add_argument('-b', '--by', choices=sorted(REPORT_GROUPS), default='strategy', help='Group the report by. Default is %(default)s')
+    parser.add_argument('--from', dest='fromDate', default=None, help='First date (YYYY-MM-DD) to report')
+    parser.add_argument('--to', dest='toDate', default=None, help='Last date (YYYY-MM-DD) to report')
+    parser.add_argument('--rebuild', action='store_true', default=False, help='Rebuild the cached rollup from all journal trades')
+    args = parser.parse_args()
+
+    journal = tradeJournal.openJournal(os.path.join(kiteConfig['foldername'], kiteConfig['journalFileName']))
+    if args.rebuild:
+        print('Rolled up {} trades'.format(updateRollup(journal, rebuild=True)))
+    dayReport = getReport(journal, 'day', args.fromDate, args.toDate)
+    maxDrawdown = max([row['maxDrawdown'] for row in dayReport], default=0.0)
+    if args.by == 'day':
+        report = dayReport
+    else:
+        report = getReport(journal, args.by, args.fromDate, args.toDate)
+    displayReport(report, args.by, maxDrawdown)
+
+if __name__ == '__main__':
+    main()
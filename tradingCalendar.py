@@ -0,0 +1,160 @@
+"""
+NSE trading calendar with constant time trading day lookups.
+
+The calendar is built once from the weekdays between firstDay and lastDay less the holidays in
+[TradingCalendar] of config.ini, plus every day found in the bhavcopy store (so special sessions
+like a Saturday budget day are included). A weekday missing from the store is not taken as a
+holiday, as the bhavcopy may just not be downloaded yet.
+
+Only the years with holidays in config are covered by default (firstDay and lastDay in config
+override it), as the weekday holidays of any other year would be taken as sessions. A date
+outside the calendar raises ValueError. Add the holidays of a new year to extend it.
+
+It is kept as a dictionary of NumPy arrays:
+    sessions   sorted trading days (datetime64[D])
+    firstDay   first calendar day covered
+    lastDay    last calendar day covered
+    count      for every calendar day from firstDay, the number of sessions on or before it
+
+With count, the previous/next/nth trading day and the sessions between two dates are array
+lookups. All functions take a date, a YYYY-MM-DD string or an array of them.
+
+Usage:
+    python tradingCalendar.py 2021-03-26 [-n 3]
+"""
+import numpy as np
+import argparse
+import configparser
+from datetime import date, datetime
+
+def toDays(days):
+    '''Converts a date, datetime, string or list of them to datetime64[D]'''
+    if isinstance(days, (list, tuple, np.ndarray)):
+        return np.asarray([np.datetime64(day, 'D') for day in np.asarray(days).ravel()]).reshape(np.shape(days))
+    return np.datetime64(days, 'D')
+
+def toResult(days):
+    '''Returns a datetime64[D] scalar as a date and arrays as they are'''
+    if np.ndim(days) == 0:
+        return days.astype(object)
+    return days
+
+def buildCalendar(firstDay, lastDay, holidays=(), observedDays=()):
+    '''Builds the calendar of the weekdays from firstDay to lastDay less the holidays,
+    plus the observedDays (days with a bhavcopy)'''
+    firstDay = toDays(firstDay)
+    lastDay = toDays(lastDay)
+    days = np.arange(firstDay, lastDay + 1, dtype='datetime64[D]')
+    isSession = np.is_busday(days)
+    if len(holidays) > 0:
+        isSession &= ~np.isin(days, toDays(list(holidays)))
+    if len(observedDays) > 0:
+        observed = toDays(list(observedDays))
+        observed = observed[(observed >= firstDay) & (observed <= lastDay)]
+        isSession[(observed - firstDay).astype(int)] = True
+    return {'sessions': days[isSession], 'firstDay': firstDay, 'lastDay': lastDay,
+        'count': np.cumsum(isSession).astype(np.int32)}
+
+def isCovered(calendar, days):
+    '''Checks if all the days are within the calendar'''
+    days = toDays(days)
+    return bool(np.all(days >= calendar['firstDay']) and np.all(days <= calendar['lastDay']))
+
+def getOffset(calendar, days):
+    '''Returns the position of the days in calendar['count']'''
+    if not isCovered(calendar, days):
+        raise ValueError('{0} outside the trading calendar ({1} to {2}). Add the holidays of the year to '
+            '[TradingCalendar] in config.ini'.format(days, calendar['firstDay'], calendar['lastDay']))
+    return (toDays(days) - calendar['firstDay']).astype(int)
+
+def isTradingDay(calendar, days):
+    '''Returns True for the days that are trading sessions'''
+    offset = getOffset(calendar, days)
+    count = calendar['count'][offset]
+    return count > np.where(offset > 0, calendar['count'][np.maximum(offset - 1, 0)], 0)
+
+def countBefore(calendar, days):
+    '''Returns the number of sessions before the days'''
+    offset = getOffset(calendar, days)
+    return calendar['count'][offset] - isTradingDay(calendar, days)
+
+def prevTradingDay(calendar, days):
+    '''Returns the trading day before each day'''
+    return nthTradingDay(calendar, days, -1)
+
+def nextTradingDay(calendar, days):
+    '''Returns the trading day after each day'''
+    return nthTradingDay(calendar, days, 1)
+
+def nthTradingDay(calendar, days, n):
+    '''Returns the nth trading day after (n > 0) or before (n < 0) each day.
+    n = 0 returns the day itself if it is a trading day, else the next trading day'''
+    if n > 0:
+        index = calendar['count'][getOffset(calendar, days)] + n - 1
+    else:
+        index = countBefore(calendar, days) + n
+    if np.any(index < 0) or np.any(index >= len(calendar['sessions'])):
+        raise ValueError('Trading day outside the trading calendar')
+    return toResult(calendar['sessions'][index])
+
+def sessionsBetween(calendar, start, end):
+    '''Returns the trading days from start to end (both inclusive) as a datetime64[D] array'''
+    return calendar['sessions'][countBefore(calendar, start):calendar['count'][getOffset(calendar, end)]]
+
+def countSessions(calendar, start, end):
+    '''Returns the number of trading sessions after start up to and including end.
+    Example: a Friday buy sold on Monday is held for 1 session'''
+    return calendar['count'][getOffset(calendar, end)] - calendar['count'][getOffset(calendar, start)]
+
+def getHolidays(calendarConfig):
+    '''Returns the holidays (comma separated dd-Mon-YYYY dates in config) as a list of dates'''
+    return [datetime.strptime(day.strip(), '%d-%b-%Y').date()
+        for day in calendarConfig.get('holidays', '').split(',') if len(day.strip()) > 0]
+
+def getCalendar(config, storeDir=None):
+    '''Builds the calendar from the [TradingCalendar] section of config and the days in the
+    bhavcopy store ([BhavStore] foldername unless storeDir is given). It covers the years
+    with holidays in config (the current year if there are none) unless firstDay and lastDay are set'''
+    calendarConfig = config['TradingCalendar'] if config.has_section('TradingCalendar') else {}
+    if storeDir is None and config.has_section('BhavStore'):
+        storeDir = config['BhavStore']['foldername']
+    observedDays = []
+    if storeDir is not None:
+        import bhavStore
+        observedDays = bhavStore.listDays(storeDir)
+    holidays = getHolidays(calendarConfig)
+    years = [day.year for day in holidays] or [date.today().year]
+    firstDay = calendarConfig.get('firstDay', '{}-01-01'.format(min(years)))
+    lastDay = calendarConfig.get('lastDay', '{}-12-31'.format(max(years)))
+    return buildCalendar(firstDay, lastDay, holidays, observedDays)
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+
+    parser = argparse.ArgumentParser(description='NSE trading calendar')
+    parser.add_argument('day', nargs='?', default=date.today().isoformat(), help='Date (YYYY-MM-DD). Default is today')
+    parser.add_argument('-n', type=int, default=None, help='Show the nth trading day after (or before if negative) the date')
+    parser.add_argument('--to', dest='toDate', default=None, help='List the trading days from the date to this date (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    calendar = getCalendar(config)
+    if not isCovered(calendar, [args.day] + ([args.toDate] if args.toDate else [])):
+        print('Dates outside the trading calendar ({0} to {1}). Add the holidays of the year to [TradingCalendar] in config.ini'.format(
+            calendar['firstDay'], calendar['lastDay']))
+        return
+    if args.toDate:
+        sessions = sessionsBetween(calendar, args.day, args.toDate)
+        for session in sessions:
+            print(session)
+        print('{} trading days'.format(len(sessions)))
+        return
+    if args.n is not None:
+        print(nthTradingDay(calendar, args.day, args.n))
+        return
+    print('{0} is {1}a trading day'.format(args.day, '' if isTradingDay(calendar, args.day) else 'not '))
+    print('Previous trading day:', prevTradingDay(calendar, args.day))
+    print('Next trading day:', nextTradingDay(calendar, args.day))
+
+if __name__ == '__main__':
+    main()
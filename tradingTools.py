@@ -0,0 +1,60 @@
+"""
+One entry point for the command line tools, with a subcommand per tool.
+
+    python tradingTools.py <command> [options of the tool]      (or ./trading-tools <command> ...)
+
+Everything after the command is passed on to the tool as its own command line, so the options are
+the same as running the tool directly. Example: `trading-tools charges -h` shows the help of
+brokerageCalculator.py and `trading-tools candles --from 2021-03-01 -m` runs the candlestick scanner.
+
+Only argparse is imported until the command is known, and each command then imports just its own
+tool. Quick commands like charges and avgprice do not load pandas, numpy or requests.
+
+Usage:
+    python tradingTools.py -h
+    python tradingTools.py charges 100 101 50
+"""
+import os
+import sys
+import argparse
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+#command -> (module, entry function, description). A module ending in .py is a script run as __main__
+COMMANDS = {
+    'orb': ('NSE-ORB.py', None, 'Opening range breakout scan of the market watch'),
+    'sizing': ('orbSizing', 'main', 'ORB position sizing under capital, margin and lot size limits'),
+    'sweep': ('orbSweep', 'main', 'ORB selection parameter sweep over the market watch snapshots'),
+    'candles': ('nseCandlestickScanner.py', None, 'Candlestick pattern scan of the bhavcopies'),
+    'fetch': ('getMarketData', 'main', 'Download the bhavcopies'),
+    'journal': ('kiteOrders', 'main', 'Trade journal of the Kite orders'),
+    'charges': ('brokerageCalculator', 'main', 'Brokerage and charges of a trade'),
+    'avgprice': ('AvgPriceCalculator', 'mainloop', 'Average price of a position bought at several prices'),
+    'find': ('stockfinder', 'mainloop', 'Find a stock in the F&O list'),
+    'live': ('liveTicks', 'main', 'Live ORB breakouts from a tick feed (replay or simulated)'),
+    'daemon': ('scanDaemon', 'main', 'Resident scan daemon answering scans over localhost HTTP'),
+}
+
+def runCommand(command, arguments):
+    '''Runs the tool of command with arguments as its command line'''
+    moduleName, functionName, description = COMMANDS[command]
+    sys.argv = ['trading-tools ' + command] + arguments
+    if moduleName.endswith('.py'):
+        import runpy
+        runpy.run_path(os.path.join(REPO_DIR, moduleName), run_name='__main__')
+        return
+    import importlib
+    getattr(importlib.import_module(moduleName), functionName)()
+
+def main(argv=None):
+    epilog = 'commands:\n' + '\n'.join('  {0:<10}{1}'.format(command, description)
+        for command, (moduleName, functionName, description) in COMMANDS.items())
+    parser = argparse.ArgumentParser(prog='trading-tools', description='Trading tools for NSE',
+        epilog=epilog, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=list(COMMANDS), metavar='command', help='Tool to run (see below)')
+    parser.add_argument('arguments', nargs=argparse.REMAINDER, help='Options of the tool. See trading-tools <command> -h')
+    args = parser.parse_args(argv)
+    runCommand(args.command, args.arguments)
+
+if __name__ == '__main__':
+    main()